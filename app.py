@@ -4,6 +4,17 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_neo4j import Neo4jGraph, GraphCypherQAChain
 from dotenv import load_dotenv
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from qa_cache import QACache
+from question_templates import REGULATION_NAMES_QUERY, TemplateMatcher, format_answer
+from graph_snapshot import GraphSnapshot, SnapshotGraph
+from name_index import NAME_INDEX_QUERY, NameIndex, question_hints
+from cas import CAS_PATTERN
+from qa_chain import cached_cypher_generation, streaming_answer
+from qa_trace import DEFAULT_TRACE_PATH, Trace, TraceLog, span, tracing
 
 st.title("🧪 CURA AI Output Test 🧪")
 
@@ -18,20 +29,227 @@ if load_status is False:
 URI = os.getenv("NEO4J_URI")
 AUTH = (os.getenv("NEO4J_USERNAME"), os.getenv("NEO4J_PASSWORD"))
 API_KEY = os.getenv("API_KEY")
+QA_CACHE_MAX_ENTRIES = int(os.getenv("QA_CACHE_MAX_ENTRIES", 256))
+QA_CACHE_TTL = float(os.getenv("QA_CACHE_TTL", 3600))  # Seconds
+TEMPLATE_FAST_PATH = os.getenv("TEMPLATE_FAST_PATH", "1") != "0"  # Answer common questions without the LLM
+TOP_K = 200
+QA_TRACE_PATH = os.getenv("QA_TRACE_PATH", DEFAULT_TRACE_PATH)  # Empty to disable the latency log
+NAME_EXPANSION = os.getenv("NAME_EXPANSION", "1") != "0"  # Add CAS numbers and synonyms of mentioned chemicals
+GRAPH_SNAPSHOT = os.getenv("GRAPH_SNAPSHOT")  # Serve template answers from a local snapshot instead of Neo4j
+
+# Streamlit re-executes this script on every message. The connection, the LLM client and the
+# chain (which holds a snapshot of the graph schema) are process-wide cached resources instead,
+# shared by all sessions. The schema is only refreshed when the load version of the graph changes.
+
+# load_neo4j_data.py bumps the (:LoadVersion) node after every load or sync that changed the graph.
+# Reading it is cheap enough to run on every rerun; it doubles as the health check of the connection
+GRAPH_VERSION_QUERY = "MATCH (v:LoadVersion) RETURN max(v.id) AS version"
+
+# Graphs loaded before the load version existed fall back to node and relationship counts
+# (from Neo4j's count store), which miss a sync that retracts and adds as many as it did
+GRAPH_COUNTS_QUERY = """
+MATCH (n) WITH count(n) AS nodes
+MATCH ()-[r]->() RETURN nodes, count(r) AS relationships
+"""
+
+
+class CachedNeo4jGraph(Neo4jGraph):
+    """Neo4jGraph that serves repeated Cypher queries of the chain from the result cache"""
+    def __init__(self, *args, qa_cache=None, **kwargs):
+        self.qa_cache = qa_cache
+        self._refreshing = False
+        super().__init__(*args, **kwargs)
+
+    def refresh_schema(self):
+        # Schema queries always go to the database
+        self._refreshing = True
+        try:
+            super().refresh_schema()
+        finally:
+            self._refreshing = False
+
+    def query(self, query, params={}, session_params={}):
+        if self.qa_cache is None or self._refreshing or session_params:
+            return super().query(query, params, session_params)
+        with span("db_query") as detail:
+            rows = self.qa_cache.get_rows(query, params)
+            detail["cached"] = rows is not None
+            if rows is None:
+                rows = super().query(query, params)
+                self.qa_cache.put_rows(query, params, rows)
+            detail["rows"] = len(rows)
+        return rows
+
+
+@st.cache_resource(show_spinner=False)
+def get_qa_cache():
+    # Shared by all users, so a question asked by someone else a minute ago is answered from the cache
+    return QACache(max_entries=QA_CACHE_MAX_ENTRIES, ttl=QA_CACHE_TTL)
+
+
+@st.cache_resource(show_spinner="Connecting to the chemical graph...")
+def connect_graph():
+    # The schema is read in build_chain, once per load version
+    return CachedNeo4jGraph(url=URI, username=AUTH[0], password=AUTH[1], refresh_schema=False, qa_cache=get_qa_cache())
+
+
+@st.cache_resource(show_spinner=False)
+def get_llm():
+    return ChatGoogleGenerativeAI(temperature=0, model="gemini-2.0-flash", google_api_key=API_KEY, allow_dangerous_requests=True)
+
+
+@st.cache_resource(show_spinner="Reading the graph schema...", max_entries=2)
+def build_chain(_graph, connection_id, load_version):
+    # Cached per connection and load version; the underscore keeps the graph out of the cache key
+    _graph.refresh_schema()
+    chain = GraphCypherQAChain.from_llm(
+        get_llm(), graph=_graph, top_k=TOP_K, verbose=True, allow_dangerous_requests=True,
+        exclude_types=["LoadVersion"]  # Bookkeeping of the loader, not chemical data
+    )
+    chain.cypher_generation_chain = cached_cypher_generation(chain.cypher_generation_chain, get_qa_cache())
+    chain.qa_chain = streaming_answer(chain.qa_chain)
+    return chain
+
+
+def graph_load_version(graph):
+    """Changes whenever a load or sync changes the graph"""
+    version = Neo4jGraph.query(graph, GRAPH_VERSION_QUERY)[0]["version"]  # Never from the result cache
+    if version is None:
+        counts = Neo4jGraph.query(graph, GRAPH_COUNTS_QUERY)[0]
+        return (counts["nodes"], counts["relationships"])
+    return version
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def build_matcher(_graph, connection_id, load_version):
+    # Regulation names for entity lookup, re-read once per load version
+    names = [row["name"] for row in Neo4jGraph.query(_graph, REGULATION_NAMES_QUERY)]
+    return TemplateMatcher(names, limit=TOP_K)
+
+
+@st.cache_resource(show_spinner=False, max_entries=2)
+def build_name_index(_graph, connection_id, load_version):
+    # Chemical names and their CAS numbers for resolving names in questions, re-read once per load version
+    index = NameIndex()
+    for row in Neo4jGraph.query(_graph, NAME_INDEX_QUERY):
+        index.add(row["name"], row["cas"])
+    return index
 
-graph = Neo4jGraph(
-    url=URI,
-    username=AUTH[0],
-    password=AUTH[1]
-)
 
-chain = GraphCypherQAChain.from_llm(
-    ChatGoogleGenerativeAI(temperature=0, model="gemini-2.0-flash", google_api_key=API_KEY, allow_dangerous_requests=True), graph=graph, top_k=200, verbose=True, allow_dangerous_requests=True
-)
+@st.cache_resource(show_spinner=False)
+def build_snapshot_name_index(path):
+    snapshot = get_snapshot_graph(path).snapshot
+    index = NameIndex()
+    for name in snapshot.names():
+        index.add(name)
+        for cas in snapshot.cas_of_name(name):
+            index.add(name, cas)
+    return index
+
+
+@st.cache_resource(show_spinner=False)
+def get_snapshot_graph(path):
+    # Memory-mapped, so all sessions share the pages of one file
+    return SnapshotGraph(GraphSnapshot(path))
+
+
+def get_graph():
+    """Return the cached connection and its load version, reconnecting if the connection dropped"""
+    graph = connect_graph()
+    try:
+        load_version = graph_load_version(graph)
+    except Exception:
+        # Health check failed (e.g. Aura closed idle connections): build a new connection once
+        connect_graph.clear()
+        graph = connect_graph()
+        load_version = graph_load_version(graph)
+    # New data invalidates cached Cypher and results
+    get_qa_cache().sync(load_version)
+    return graph, load_version
+
+
+def expand_question(question):
+    """
+    Append the CAS numbers and synonyms of chemical names mentioned in the question.
+
+    Spellings differ between regulations ("HCFC-22", "CHF2Cl (HCFC-22)", "Chlorodifluoromethane"),
+    so the LLM chain sees the CAS numbers and synonyms to query by. Only for the chain: the template
+    matcher would take a hinted CAS number for the subject of the question.
+    """
+    with span("name_lookup") as detail:
+        hints = []
+        if NAME_EXPANSION and not CAS_PATTERN.search(question):
+            hints = question_hints(question, name_index)
+        detail["names"] = len(hints)
+    return f"{question} ({'; '.join(hints)})" if hints else question
+
+
+def answer_from_template(question):
+    """Answer common question shapes with a precompiled query, or return None to use the LLM chain"""
+    with span("template_match") as detail:
+        match = matcher.match(question) if TEMPLATE_FAST_PATH else None
+        detail["intent"] = match.intent if match else None
+    if match is None:
+        return None
+    if GRAPH_SNAPSHOT:
+        with span("snapshot_query") as detail:
+            rows = get_snapshot_graph(GRAPH_SNAPSHOT).query(match.cypher, match.params)
+            detail["rows"] = len(rows)
+        return format_answer(match, rows)
+    # Goes through the result cache like the chain's queries
+    return format_answer(match, graph.query(match.cypher, match.params))
+
+
+@st.cache_resource(show_spinner=False)
+def get_trace_log():
+    return TraceLog(QA_TRACE_PATH) if QA_TRACE_PATH else None
+
+
+def show_trace(trace):
+    """Expandable latency breakdown of one answer"""
+    with st.expander(f"Latency: {trace['total']:.2f}s ({trace['path']})"):
+        st.table([
+            {
+                "stage": item["stage"],
+                "seconds": f"{item['seconds']:.3f}",
+                "details": ", ".join(f"{key}={value}" for key, value in item.items() if key not in ("stage", "seconds"))
+            }
+            for item in trace["spans"]
+        ])
+
+
+def show_cache_stats():
+    stats = get_qa_cache().stats()
+    st.sidebar.header("QA cache")
+    for label, level in (("Question → Cypher", stats["cypher"]), ("Cypher → results", stats["results"])):
+        st.sidebar.metric(
+            label, f"{level['hit_rate']:.0%}",
+            help=f"{level['hits']} hits, {level['misses']} misses, {level['entries']} entries"
+        )
+
+
+if GRAPH_SNAPSHOT:
+    # Entities have to come from the snapshot the answers come from. Neo4j is only connected
+    # once a question reaches the LLM chain, so template answers work offline and while Aura is down.
+    graph = load_version = None
+    matcher = TemplateMatcher(get_snapshot_graph(GRAPH_SNAPSHOT).snapshot.regulations(), limit=TOP_K)
+    name_index = build_snapshot_name_index(GRAPH_SNAPSHOT)
+else:
+    graph, load_version = get_graph()
+    matcher = build_matcher(graph, id(graph), load_version)
+    name_index = build_name_index(graph, id(graph), load_version)
+
+
+def get_chain():
+    """QA chain of the current load version, connecting to Neo4j on first use in snapshot mode"""
+    global graph, load_version
+    if graph is None:
+        graph, load_version = get_graph()
+    return build_chain(graph, id(graph), load_version)
 
 
 def generate_response(input_text):
-    st.info(chain.run(input_text))
+    st.info(get_chain().run(input_text))
 
 
 # with st.form("my_form"):
@@ -47,7 +265,10 @@ if "messages" not in st.session_state:
     ]
 
 for msg in st.session_state.messages:
-    st.chat_message(msg["role"]).write(msg["content"])
+    with st.chat_message(msg["role"]):
+        st.write(msg["content"])
+        if "trace" in msg:
+            show_trace(msg["trace"])
 
 if prompt := st.chat_input(placeholder="What chemicals are regulated by Apple?"):
     st.session_state.messages.append({"role": "user", "content": prompt})
@@ -59,9 +280,27 @@ if prompt := st.chat_input(placeholder="What chemicals are regulated by Apple?")
     with st.chat_message("assistant"):
         st_cb = StreamlitCallbackHandler(
             st.container(), expand_new_thoughts=False)
-        response = chain.run(
-            st.session_state.messages[-1]["content"], callbacks=[st_cb])
+        answer_placeholder = st.empty()
+        streamed = []
+
+        def on_token(token):
+            streamed.append(token)
+            answer_placeholder.markdown("".join(streamed) + "▌")
+
+        with tracing(Trace(prompt, on_token=on_token)) as trace:
+            question = st.session_state.messages[-1]["content"]
+            response = answer_from_template(question)
+            trace.path = "template"
+            if response is None:
+                trace.path = "llm"
+                response = get_chain().run(expand_question(question), callbacks=[st_cb])
         # response = search_agent.run(st.session_state.messages, callbacks=[st_cb])
+        if get_trace_log():
+            get_trace_log().append(trace)
+        record = trace.to_record()
         st.session_state.messages.append(
-            {"role": "assistant", "content": response})
-        st.write(response)
\ No newline at end of file
+            {"role": "assistant", "content": response, "trace": record})
+        answer_placeholder.markdown(response)
+        show_trace(record)
+
+show_cache_stats()
\ No newline at end of file
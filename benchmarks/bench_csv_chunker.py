@@ -0,0 +1,90 @@
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from csv_chunker import iter_csv_chunks, chunk_to_text
+
+# Benchmark of the streaming CSV chunker against the previous approach, which
+# reopened the file and skipped from row 0 to the chunk start for every chunk.
+# The time per row stays flat for the streaming chunker (linear scaling) and
+# grows with the file size for the re-scan (quadratic scaling).
+#
+# Usage:
+#   python benchmarks/bench_csv_chunker.py --sizes 1000 4000 16000 --chunk-size 15
+
+
+def write_csv(path, rows):
+    """ECHA-like export with a quoted multi-line remarks column"""
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Substance name", "EC number", "CAS number", "Remarks"])
+        for i in range(rows):
+            writer.writerow([f"Substance {i}", f"200-{i % 1000:03d}-{i % 10}", f"{50 + i}-00-0",
+                             "Restricted\nsee Annex XVII" if i % 7 == 0 else ""])
+
+
+def rescan_chunks(csv_path, chunk_size):
+    # The previous algorithm: count the lines, then re-read the file up to every chunk start
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        total_lines = sum(1 for _ in f)
+    chunk_start = 0
+    while chunk_start < total_lines:
+        chunk_lines = []
+        with open(csv_path, 'r', encoding='utf-8') as csv_file:
+            csv_reader = csv.reader(csv_file)
+            for i, _ in enumerate(csv_reader):
+                if i >= chunk_start:
+                    break
+            for i, row in enumerate(csv_reader):
+                if i >= chunk_size:
+                    break
+                chunk_lines.append(','.join(row))
+        yield '\n'.join(chunk_lines)
+        chunk_start += chunk_size
+
+
+def stream_chunks(csv_path, chunk_size):
+    for chunk in iter_csv_chunks(csv_path, chunk_size):
+        yield chunk_to_text(chunk.rows)
+
+
+def measure(chunker, csv_path, chunk_size):
+    """Return (seconds, number of chunks, peak memory in bytes)"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    count = sum(1 for _ in chunker(csv_path, chunk_size))
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, count, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark CSV chunking strategies")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 2000, 4000, 8000, 16000])
+    parser.add_argument("--chunk-size", type=int, default=15)
+    parser.add_argument("--skip-rescan-above", type=int, default=16000,
+                        help="Do not run the quadratic re-scan for files larger than this")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'method':>8} {'chunks':>8} {'seconds':>10} {'us/row':>10} {'peak KiB':>10}")
+    with tempfile.TemporaryDirectory() as folder:
+        for rows in args.sizes:
+            csv_path = os.path.join(folder, f"bench_{rows}.csv")
+            write_csv(csv_path, rows)
+            methods = [("stream", stream_chunks)]
+            if rows <= args.skip_rescan_above:
+                methods.append(("rescan", rescan_chunks))
+            for name, chunker in methods:
+                elapsed, count, peak = measure(chunker, csv_path, args.chunk_size)
+                print(f"{rows:>8} {name:>8} {count:>8} {elapsed:>10.3f} {elapsed / rows * 1e6:>10.2f} {peak / 1024:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from chemical_records import is_chemical_file, read_chemicals
+from load_neo4j_data import ChemicalDatabase, Configuration
+
+# Throughput comparison of the per-row loading path (one auto-commit query per
+# chemical) and the batched UNWIND path of ChemicalDatabase.import_json.
+#
+# Both runs load the same processed JSON files into the database configured in
+# .env. All names, CAS numbers and regulations are prefixed with a unique tag so
+# that both runs start from an empty graph and the benchmark never touches real
+# data; the tagged nodes are deleted afterwards.
+#
+# Usage:
+#   python benchmarks/bench_neo4j_import.py --folder data/processed/uploaded --batch-size 1000
+
+
+def load_rows(folder):
+    chemicals = []
+    for file in sorted(os.listdir(folder)):
+        if is_chemical_file(file):
+            chemicals.extend(read_chemicals(os.path.join(folder, file)))
+    return chemicals
+
+
+def tag_rows(chemicals, tag):
+    """Prefix every value so the benchmark writes into its own part of the graph"""
+    return {"chemicals": [
+        {key: f"{tag}{chemical[key]}" if chemical.get(key) else chemical.get(key)
+         for key in ("chemical_name", "CAS", "regulation")}
+        for chemical in chemicals
+    ]}
+
+
+def cleanup(db, tag):
+    query = """
+    MATCH (n)
+    WHERE (n:Chemical AND n.cas STARTS WITH $tag) OR ((n:ChemicalName OR n:Regulation) AND n.name STARTS WITH $tag)
+    CALL { WITH n DETACH DELETE n } IN TRANSACTIONS OF 1000 ROWS
+    """
+    with db._driver.session() as session:
+        session.run(query, tag=tag).consume()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-row and batched Neo4j loading")
+    parser.add_argument("--folder", default=os.getenv("JSON_OUTPUT_FOLDER", "data/processed/uploaded"))
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--skip-per-row", action="store_true", help="Only run the batched path")
+    args = parser.parse_args()
+
+    config = Configuration.load_environment()
+    chemicals = load_rows(args.folder)
+    db = ChemicalDatabase(config["neo4j_uri"], config["neo4j_auth"], batch_size=args.batch_size)
+    run_id = int(time.time())
+
+    methods = [("batched", db.import_json)]
+    if not args.skip_per_row:
+        methods.insert(0, ("per-row", db.import_json_per_row))
+
+    print(f"Loading {len(chemicals)} rows from {args.folder}")
+    print(f"{'method':>10} {'seconds':>10} {'rows/s':>10}")
+    try:
+        for name, method in methods:
+            tag = f"bench{run_id}-{name}:"
+            data = tag_rows(chemicals, tag)
+            try:
+                start = time.perf_counter()
+                method(data)
+                elapsed = time.perf_counter() - start
+                print(f"{name:>10} {elapsed:>10.2f} {len(chemicals) / elapsed:>10.0f}")
+            finally:
+                cleanup(db, tag)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
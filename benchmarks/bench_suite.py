@@ -0,0 +1,514 @@
+import argparse
+import contextlib
+import csv
+import io
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from chemical_records import JSONL_SUFFIX, read_chemicals
+from fake_openai_server import make_server
+from graph_snapshot import GraphSnapshot, SnapshotGraph, build_snapshot, relationships_from_files
+from llm_extraction import OPENAI_MODEL
+from load_neo4j_data import BATCH_QUERIES, ChemicalDatabase, Configuration
+from name_index import NameIndex, normalize_name, question_hints
+from pair_validation import normalize_cas
+from page_triage import PageTriage
+from question_templates import TemplateMatcher, format_answer
+from bench_neo4j_import import cleanup, load_rows, tag_rows
+
+# End-to-end benchmark of the extraction, loading and question answering paths
+# without API costs or an Aura instance.
+#
+# A synthetic corpus with known name/CAS pairs is generated first: PDFs whose
+# pages hold a ruled name/CAS/EC table, a list of pairs in running text or no
+# chemicals at all, and ECHA-like CSV exports. The corpus is then run through
+#
+#   * process_pdfs and process_csvs against src/fake_openai_server.py, started
+#     in this process with the configured latency and error rate;
+#   * ChemicalDatabase.import_json, writing into an in-process stand-in for the
+#     Neo4j driver (or into the database configured in .env with --graph neo4j,
+#     tagged and deleted afterwards like bench_neo4j_import.py);
+#   * the template fast path of app.py (template match, snapshot query, answer)
+#     over a snapshot of the loaded relationships. Questions the templates cannot
+#     answer would go to the LLM chain, which is not measured apart from their
+#     name expansion.
+#
+# Every stage reports its throughput, LLM calls per unit, the peak of Python
+# allocations (tracemalloc, so throughput is lower than without it) and its
+# recall against the ground truth. Results can be saved as the baseline of a
+# scenario and later runs checked against it; throughput baselines only compare
+# across runs on the same machine.
+#
+# Usage:
+#   python benchmarks/bench_suite.py --pdfs 3 --pages 12 --csvs 2 --rows 400
+#   python benchmarks/bench_suite.py --latency 0.05 --error-rate 0.1 --concurrency 8 --scenario flaky
+#   python benchmarks/bench_suite.py --save-baseline
+#   python benchmarks/bench_suite.py --check
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+PREFIXES = ["Chloro", "Bromo", "Fluoro", "Iodo", "Methyl", "Ethyl", "Nitro", "Amino", "Hydroxy", "Dimethyl",
+            "Trichloro", "Tetrafluoro", "Pentabromo", "Hexachloro", "Isopropyl", "Phenyl"]
+CORES = ["benzene", "phenol", "toluene", "aniline", "ethane", "propanol", "acetate", "furan", "pyridine",
+         "naphthalene", "biphenyl", "cyclohexane", "butadiene", "styrene", "xylene", "anthracene"]
+FILLER = [
+    "Member States shall ensure that the competent authorities carry out official controls.",
+    "This Regulation shall enter into force on the twentieth day following its publication.",
+    "The Commission shall review the list of substances in the light of new scientific information.",
+    "Articles placed on the market before that date may continue to be made available.",
+    "Exemptions shall be reviewed at the latest five years after the date of application."
+]
+
+# Metric -> 1 if higher is better, -1 if lower is better; recall metrics are compared absolutely
+METRICS = {
+    "pdf.pages_per_s": 1, "pdf.llm_calls_per_page": -1, "pdf.peak_mib": -1, "pdf.cas_recall": 1, "pdf.pair_recall": 1,
+    "csv.rows_per_s": 1, "csv.llm_calls_per_row": -1, "csv.peak_mib": -1, "csv.cas_recall": 1, "csv.pair_recall": 1,
+    "graph.rows_per_s": 1, "graph.peak_mib": -1,
+    "qa.questions_per_s": 1, "qa.template_share": 1, "qa.answer_recall": 1, "qa.peak_mib": -1,
+}
+
+
+def cas_number(rng):
+    """Random CAS number with a correct check digit"""
+    digits = f"{rng.randint(50, 999999)}{rng.randint(0, 99):02d}"
+    check = sum(position * int(digit) for position, digit in enumerate(reversed(digits), start=1)) % 10
+    return f"{digits[:-2]}-{digits[-2:]}-{check}"
+
+
+def make_chemicals(count, rng, taken):
+    """`count` (name, CAS) pairs with names and CAS numbers not in `taken`"""
+    chemicals = []
+    while len(chemicals) < count:
+        name = f"{rng.randint(2, 9)}-{rng.choice(PREFIXES)}{rng.choice(CORES)}"
+        cas = cas_number(rng)
+        if name.lower() not in taken and cas not in taken:
+            taken.update((name.lower(), cas))
+            chemicals.append((name, cas))
+    return chemicals
+
+
+def draw_table(page, chemicals, top=90):
+    """Ruled name/CAS/EC table, which PyMuPDF's table detection finds"""
+    columns = [56, 300, 400, 520]
+    row_height = 16
+    rows = [("Chemical name", "CAS No", "EC No")] + [(name, cas, f"2{index:02d}-{index:03d}-1") for index, (name, cas) in enumerate(chemicals)]
+    bottom = top + row_height * len(rows)
+    for index in range(len(rows) + 1):
+        page.draw_line((columns[0], top + index * row_height), (columns[-1], top + index * row_height))
+    for x in columns:
+        page.draw_line((x, top), (x, bottom))
+    for index, row in enumerate(rows):
+        for column, cell in enumerate(row):
+            page.insert_text((columns[column] + 3, top + index * row_height + 12), cell, fontsize=9)
+
+
+def write_pdf(path, title, pages, pairs_per_page, rng, taken):
+    """
+    PDF cycling through table pages, pages listing pairs in running text and pages
+    without chemicals; returns the (name, CAS) pairs it contains
+    """
+    import fitz  # PyMuPDF for PDF handling
+
+    document = fitz.open()
+    expected = []
+    for page_number in range(pages):
+        page = document.new_page()
+        page.insert_text((56, 60), f"{title} - Annex {page_number + 1}", fontsize=12)
+        kind = page_number % 3
+        if kind == 0:
+            chemicals = make_chemicals(pairs_per_page, rng, taken)
+            draw_table(page, chemicals)
+        elif kind == 1:
+            chemicals = make_chemicals(pairs_per_page, rng, taken)
+            for index, (name, cas) in enumerate(chemicals):
+                page.insert_text((56, 90 + index * 14), f"{name}, {cas}: restricted in articles supplied to the general public.", fontsize=9)
+        else:
+            chemicals = []
+            for index in range(12):
+                page.insert_text((56, 90 + index * 14), rng.choice(FILLER), fontsize=9)
+        expected.extend(chemicals)
+    document.save(path)
+    document.close()
+    return expected
+
+
+def write_csv(path, rows, rng, taken):
+    """ECHA-like export with a quoted multi-line remarks column; returns its (name, CAS) pairs"""
+    chemicals = make_chemicals(rows, rng, taken)
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["Substance name", "CAS number", "EC number", "Remarks"])
+        for index, (name, cas) in enumerate(chemicals):
+            writer.writerow([name, cas, f"200-{index % 1000:03d}-{index % 10}",
+                             "Restricted\nsee Annex XVII" if index % 7 == 0 else ""])
+    return chemicals
+
+
+def make_corpus(folder, args):
+    """Write the synthetic PDFs and CSVs; returns {"pdf": {regulation: pairs}, "csv": {...}}"""
+    rng = random.Random(args.seed)
+    taken = set()
+    truth = {"pdf": {}, "csv": {}}
+    for kind in truth:
+        os.makedirs(os.path.join(folder, kind))
+    for index in range(args.pdfs):
+        regulation = f"synthetic_annex_{101 + index}"  # Tokens of three or more characters identify a regulation
+        path = os.path.join(folder, "pdf", regulation + ".pdf")
+        truth["pdf"][regulation] = write_pdf(path, f"Synthetic regulation {101 + index}", args.pages, args.pairs_per_page, rng, taken)
+    for index in range(args.csvs):
+        regulation = f"synthetic_registry_{101 + index}"
+        path = os.path.join(folder, "csv", regulation + ".csv")
+        truth["csv"][regulation] = write_csv(path, args.rows, rng, taken)
+    return truth
+
+
+def recall(truth, output_folder):
+    """Share of the expected CAS numbers and of the expected (name, CAS) pairs found in the outputs"""
+    expected_cas = expected_pairs = found_cas = found_pairs = 0
+    for regulation, chemicals in truth.items():
+        path = os.path.join(output_folder, regulation + JSONL_SUFFIX)
+        outputs = list(read_chemicals(path)) if os.path.exists(path) else []
+        cas_numbers = {normalize_cas(chemical.get("CAS")) for chemical in outputs}
+        pairs = {(normalize_name(chemical.get("chemical_name") or ""), normalize_cas(chemical.get("CAS"))) for chemical in outputs}
+        expected_cas += len(chemicals)
+        expected_pairs += len(chemicals)
+        found_cas += sum(1 for _, cas in chemicals if cas in cas_numbers)
+        found_pairs += sum(1 for name, cas in chemicals if (normalize_name(name), cas) in pairs)
+    return (found_cas / expected_cas if expected_cas else 1.0), (found_pairs / expected_pairs if expected_pairs else 1.0)
+
+
+class InMemoryDriver:
+    """
+    Stand-in for the Neo4j driver: applies the UNWIND batches of ChemicalDatabase to a set of
+    relationships, sleeping `latency` seconds per transaction to model the round trip
+    """
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.relationships = set()
+        self.transactions = 0
+        self._shapes = {" ".join(query.split()): shape for shape, query in BATCH_QUERIES.items()}
+        self._lock = threading.Lock()
+
+    def session(self):
+        return _InMemorySession(self)
+
+    def run(self, query, rows):
+        shape = self._shapes.get(" ".join(query.split()))
+        if shape is None:
+            raise ValueError("Query not supported by the in-memory graph")
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.transactions += 1
+            for row in rows:
+                self.relationships |= ChemicalDatabase.row_relationships((shape, row["name"] or "", row["cas"] or "", row["regulation"]))
+
+    def close(self):
+        pass
+
+
+class _InMemorySession:
+    def __init__(self, driver):
+        self._driver = driver
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute_write(self, transaction_function, *args):
+        return transaction_function(_InMemoryTransaction(self._driver), *args)
+
+
+class _InMemoryTransaction:
+    def __init__(self, driver):
+        self._driver = driver
+
+    def run(self, query, rows=None, **params):
+        self._driver.run(query, rows)
+        return self
+
+    def consume(self):
+        return None
+
+
+def measure(function):
+    """Return (result, seconds, peak memory in MiB) of a call"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = function()
+    finally:
+        elapsed = time.perf_counter() - start
+        peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def run_pdfs(args, input_folder, output_folder, truth, server, client):
+    import preprocess_pdfs
+    from pdf_text import PageTextExtractor
+    from table_extraction import TableExtractor
+
+    preprocess_pdfs.configure(client, None)
+    extractor = make_extractor(args, server, preprocess_pdfs.system_prompt)
+    triage = PageTriage(threshold=args.triage_threshold) if args.triage_threshold > 0 else None
+    text_extractor = PageTextExtractor(workers=args.text_workers, tables=args.tables)  # No page text cache: always extract
+    tables = TableExtractor() if args.tables else None
+    requests = server.stats["requests"]
+    try:
+        _, seconds, peak = measure(lambda: preprocess_pdfs.process_pdfs(
+            input_folder, output_folder, args.max_tokens, extractor, args.token_budget, triage, NameIndex(), text_extractor, tables
+        ))
+    finally:
+        text_extractor.close()
+    pages = args.pdfs * args.pages
+    cas_recall, pair_recall = recall(truth, output_folder)
+    return {
+        "pages": pages, "seconds": seconds, "pages_per_s": pages / seconds,
+        "llm_calls_per_page": (server.stats["requests"] - requests) / pages if pages else 0.0,
+        "peak_mib": peak, "cas_recall": cas_recall, "pair_recall": pair_recall
+    }
+
+
+def run_csvs(args, input_folder, output_folder, truth, server, client):
+    import preprocess_csvs
+
+    preprocess_csvs.configure(client, None)
+    triage = PageTriage(threshold=args.triage_threshold) if args.triage_threshold > 0 else None
+    requests = server.stats["requests"]
+    _, seconds, peak = measure(lambda: preprocess_csvs.process_csvs(
+        input_folder, output_folder, args.chunk_size, args.max_tokens, args.token_budget, triage, NameIndex()
+    ))
+    rows = args.csvs * args.rows
+    cas_recall, pair_recall = recall(truth, output_folder)
+    return {
+        "rows": rows, "seconds": seconds, "rows_per_s": rows / seconds,
+        "llm_calls_per_row": (server.stats["requests"] - requests) / rows if rows else 0.0,
+        "peak_mib": peak, "cas_recall": cas_recall, "pair_recall": pair_recall
+    }
+
+
+def make_extractor(args, server, system_prompt):
+    if args.concurrency <= 1:
+        return None
+    from async_extraction import AsyncExtractor
+
+    return AsyncExtractor(
+        api_key="bench", model=OPENAI_MODEL, system_prompt=system_prompt, max_tokens=args.max_tokens,
+        max_concurrency=args.concurrency, requests_per_minute=10 ** 6, tokens_per_minute=10 ** 9,
+        base_url=f"http://127.0.0.1:{server.server_port}/v1"
+    )
+
+
+def run_graph(args, output_folder):
+    """Load all outputs with import_json; returns the metrics and the loaded relationships (None for Neo4j)"""
+    chemicals = load_rows(output_folder)
+    if args.graph == "neo4j":
+        config = Configuration.load_environment()
+        db = ChemicalDatabase(config["neo4j_uri"], config["neo4j_auth"], batch_size=args.batch_size)
+        tag = f"bench_suite_{int(time.time())}_"
+        try:
+            written, seconds, peak = measure(lambda: db.import_json(tag_rows(chemicals, tag)))
+        finally:
+            cleanup(db, tag)
+            db.close()
+        return {"rows": written, "seconds": seconds, "rows_per_s": written / seconds, "peak_mib": peak}, None
+
+    driver = InMemoryDriver(args.graph_latency)
+    db = ChemicalDatabase("bolt://localhost:7687", None, batch_size=args.batch_size)  # Connects lazily, never used
+    db._driver.close()
+    db._driver = driver
+    written, seconds, peak = measure(lambda: db.import_json({"chemicals": chemicals}))
+    return {
+        "rows": written, "seconds": seconds, "rows_per_s": written / seconds, "peak_mib": peak,
+        "transactions": driver.transactions, "relationships": len(driver.relationships)
+    }, driver.relationships
+
+
+def make_questions(truth, count, rng):
+    """(question, text the answer must contain) pairs covering the template intents and, by name, the LLM chain"""
+    chemicals = [(regulation, name, cas) for documents in truth.values()
+                 for regulation, pairs in documents.items() for name, cas in pairs]
+    regulations = sorted(regulation for documents in truth.values() for regulation in documents)
+    questions = []
+    for index in range(count):
+        regulation, name, cas = rng.choice(chemicals)
+        kind = index % 4
+        if kind == 0:
+            questions.append((f"Which regulations cover CAS {cas}?", regulation))
+        elif kind == 1:
+            questions.append((f"What names does CAS {cas} have?", name))
+        elif kind == 2:
+            regulation = rng.choice(regulations)
+            words = regulation.replace("_", " ")
+            questions.append((f"Which chemicals are regulated by the {words}?", regulation))
+        else:
+            questions.append((f"Which regulations list {name}?", regulation))
+    return questions
+
+
+def run_qa(args, folder, output_folder, truth, relationships):
+    """Answer generated questions like app.py's template fast path, from a snapshot of the graph"""
+    path = os.path.join(folder, "graph.snap")
+    build_snapshot(relationships if relationships is not None else relationships_from_files(output_folder), path)
+    questions = make_questions(truth, args.questions, random.Random(args.seed))
+    with GraphSnapshot(path) as snapshot:
+        graph = SnapshotGraph(snapshot)
+
+        def answer_all():
+            # Name index and matcher are built once per load version in app.py
+            name_index = NameIndex()
+            for name in snapshot.names():
+                for cas in snapshot.cas_of_name(name) or [None]:
+                    name_index.add(name, cas)
+            matcher = TemplateMatcher(snapshot.regulations(), limit=200)
+            answers = []
+            for question, _ in questions:
+                match = matcher.match(question)
+                if match is None:
+                    # Falls through to the LLM chain, which gets the expanded question
+                    question_hints(question, name_index)
+                answers.append(format_answer(match, graph.query(match.cypher, match.params)) if match else None)
+            return answers
+
+        answers, seconds, peak = measure(answer_all)
+    answered = [(answer, expected) for answer, (_, expected) in zip(answers, questions) if answer is not None]
+    return {
+        "questions": len(questions), "seconds": seconds, "questions_per_s": len(questions) / seconds,
+        "template_share": len(answered) / len(questions) if questions else 0.0,
+        "answer_recall": sum(1 for answer, expected in answered if expected.lower() in answer.lower()) / len(questions) if questions else 0.0,
+        "peak_mib": peak
+    }
+
+
+def flatten(results):
+    return {f"{stage}.{key}": value for stage, metrics in results.items() for key, value in metrics.items()}
+
+
+def compare(results, baseline, tolerance, recall_tolerance):
+    """Return the regressions of `results` against a baseline as messages"""
+    regressions = []
+    current = flatten(results)
+    for metric, direction in METRICS.items():
+        if metric not in current or metric not in baseline:
+            continue
+        value, reference = current[metric], baseline[metric]
+        if "recall" in metric or "share" in metric:
+            worse = (reference - value) * direction > recall_tolerance
+        else:
+            worse = (reference - value) * direction > tolerance * abs(reference)
+        if worse:
+            regressions.append(f"{metric}: {value:.4g} (baseline {reference:.4g})")
+    return regressions
+
+
+def print_results(results):
+    print(f"{'stage':>6} {'units':>9} {'seconds':>9} {'units/s':>10} {'LLM/unit':>9} {'peak MiB':>9} {'recall':>7} {'pairs':>7}")
+    for stage, unit in (("pdf", "pages"), ("csv", "rows"), ("graph", "rows"), ("qa", "questions")):
+        if stage not in results:
+            continue
+        metrics = results[stage]
+        calls = metrics.get("llm_calls_per_page", metrics.get("llm_calls_per_row"))
+        recall_value = metrics.get("cas_recall", metrics.get("answer_recall"))
+        pair_recall = metrics.get("pair_recall")
+        print(f"{stage:>6} {metrics[unit]:>9} {metrics['seconds']:>9.2f} {metrics[unit + '_per_s']:>10.1f} "
+              f"{'-' if calls is None else f'{calls:.3f}':>9} {metrics['peak_mib']:>9.1f} "
+              f"{'-' if recall_value is None else f'{recall_value:.3f}':>7} {'-' if pair_recall is None else f'{pair_recall:.3f}':>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark extraction, loading and QA on a synthetic corpus")
+    parser.add_argument("--pdfs", type=int, default=3, help="Number of synthetic PDFs")
+    parser.add_argument("--pages", type=int, default=12, help="Pages per PDF")
+    parser.add_argument("--pairs-per-page", type=int, default=15)
+    parser.add_argument("--csvs", type=int, default=2, help="Number of synthetic CSV files")
+    parser.add_argument("--rows", type=int, default=400, help="Rows per CSV file")
+    parser.add_argument("--questions", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the fake LLM server sleeps per request")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of LLM requests answered with 429/5xx")
+    parser.add_argument("--concurrency", type=int, default=1, help="In-flight requests of process_pdfs, 1 is sequential")
+    parser.add_argument("--text-workers", type=int, default=1)
+    parser.add_argument("--tables", action="store_true", help="Read table pages without the LLM")
+    parser.add_argument("--max-tokens", type=int, default=4000)
+    parser.add_argument("--token-budget", type=int, default=2000)
+    parser.add_argument("--chunk-size", type=int, default=15)
+    parser.add_argument("--triage-threshold", type=float, default=1.0)
+    parser.add_argument("--graph", choices=["memory", "neo4j"], default="memory",
+                        help="In-process graph stand-in, or the Neo4j database configured in .env")
+    parser.add_argument("--graph-latency", type=float, default=0.0, help="Seconds per transaction of the in-process graph")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--scenario", default="default", help="Name of the baseline to save or check")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="Store the results as the scenario's baseline")
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 if a metric regressed against the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative change of throughput, LLM calls and memory")
+    parser.add_argument("--recall-tolerance", type=float, default=0.01, help="Allowed absolute drop of recall and template share")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline logs")
+    args = parser.parse_args()
+
+    # load_neo4j_data configures the root logger on import
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+    from openai import OpenAI
+
+    server = make_server("127.0.0.1", 0, args.latency, args.error_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = OpenAI(api_key="bench", base_url=f"http://127.0.0.1:{server.server_port}/v1")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        truth = make_corpus(folder, args)
+        output_folder = os.path.join(folder, "processed")
+        os.makedirs(output_folder)
+        # The response parser prints its progress
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else io.StringIO()):
+            if args.pdfs:
+                results["pdf"] = run_pdfs(args, os.path.join(folder, "pdf"), output_folder, truth["pdf"], server, client)
+            if args.csvs:
+                results["csv"] = run_csvs(args, os.path.join(folder, "csv"), output_folder, truth["csv"], server, client)
+        results["graph"], relationships = run_graph(args, output_folder)
+        if args.questions:
+            results["qa"] = run_qa(args, folder, output_folder, truth, relationships)
+    server.shutdown()
+    print_results(results)
+    print(f"Fake LLM server: {server.stats['requests']} requests, {server.stats['errors']} injected errors")
+
+    baselines = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            baselines = json.load(f)
+    config = {key: value for key, value in vars(args).items()
+              if key not in ("scenario", "baseline", "save_baseline", "check", "tolerance", "recall_tolerance", "verbose")}
+    if args.save_baseline:
+        baselines[args.scenario] = {"config": config, "metrics": {metric: round(value, 6) for metric, value in flatten(results).items()}}
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(baselines, f, indent=4, sort_keys=True)
+            f.write("\n")
+        print(f"Saved baseline {args.scenario} to {args.baseline}")
+    if args.check:
+        baseline = baselines.get(args.scenario)
+        if baseline is None:
+            parser.error(f"No baseline {args.scenario} in {args.baseline}, run with --save-baseline first")
+        if baseline["config"] != config:
+            print(f"Warning: the options differ from the baseline's: {baseline['config']}")
+        regressions = compare(results, baseline["metrics"], args.tolerance, args.recall_tolerance)
+        for regression in regressions:
+            print(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions against baseline {args.scenario}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import random
+import time
+
+import openai
+from openai import AsyncOpenAI
+
+# Concurrent extraction engine used by the preprocessing scripts.
+# Pages are sent to the OpenAI API with a bounded number of in-flight requests,
+# a token bucket for requests/min and tokens/min, and retries with exponential
+# backoff and jitter on 429/5xx. Results are always returned in page order.
+
+
+class TokenBucket:
+    """Token bucket that refills continuously at `rate_per_minute`"""
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0  # Refill rate per second
+        self.capacity = capacity or rate_per_minute  # Allow a full minute of burst by default
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        """Wait until `amount` tokens are available and take them"""
+        amount = min(amount, self.capacity)  # A single oversized request must still be able to pass
+        while True:
+            self._refill()
+            if self.tokens >= amount:
+                self.tokens -= amount
+                return
+            await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class RateLimiter:
+    """Combined requests/min and tokens/min limiter"""
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    async def acquire(self, tokens):
+        await self.requests.acquire(1)
+        await self.tokens.acquire(tokens)
+
+
+def estimate_tokens(text, max_tokens):
+    # Rough prompt size (~4 characters per token) plus the completion budget, as counted by OpenAI's TPM limits
+    return len(text) // 4 + max_tokens
+
+
+def is_retryable(exc):
+    """Return True for rate limits, server errors and connection problems"""
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status == 429 or status >= 500
+    return isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError))
+
+
+class AsyncExtractor:
+    """Runs the extraction and validation prompts for many pages concurrently"""
+    def __init__(self, api_key, model, system_prompt, max_tokens=4000, max_concurrency=8,
+                 requests_per_minute=500, tokens_per_minute=200000, max_retries=6,
+                 base_delay=1.0, max_delay=60.0, base_url=None, cache=None):
+        self.api_key = api_key
+        self.base_url = base_url  # Point at a local OpenAI-compatible server for testing
+        self.model = model
+        self.system_prompt = system_prompt
+        self.max_tokens = max_tokens
+        self.max_concurrency = max_concurrency
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.cache = cache  # Optional LLMCache shared with the sequential mode
+
+    async def query(self, client, semaphore, context, human_prompt):
+        """Send a single chat completion request with rate limiting and retries"""
+        if self.cache:
+            cached = self.cache.get(self.model, self.system_prompt, human_prompt, context, self.max_tokens)
+            if cached is not None:
+                return cached
+
+        prompt = human_prompt + context
+        for attempt in range(self.max_retries + 1):
+            await self.limiter.acquire(estimate_tokens(self.system_prompt + prompt, self.max_tokens))
+            try:
+                async with semaphore:
+                    response = await client.chat.completions.create(
+                        model=self.model,
+                        messages=[
+                            {"role": "system", "content": self.system_prompt},
+                            {"role": "user", "content": prompt}
+                        ],
+                        max_tokens=self.max_tokens,
+                    )
+                logging.debug(f"Raw API response: {response}")
+                content = response.choices[0].message.content
+                if self.cache:
+                    self.cache.put(self.model, self.system_prompt, human_prompt, context, self.max_tokens, content)
+                return content
+            except Exception as e:
+                if not is_retryable(e) or attempt == self.max_retries:
+                    logging.error(f"Error in API response: {e}")
+                    return f"Error in API response: {e}"
+                # Exponential backoff with full jitter
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                logging.warning(f"Retryable API error ({e}), retrying in {delay:.1f}s (attempt {attempt + 1}/{self.max_retries})")
+                await asyncio.sleep(delay)
+
+    async def extract(self, client, semaphore, text, extraction_prompt, validation_prompt):
+        """Extraction followed by validation for a single page; validation_prompt=None skips validation"""
+        response = await self.query(client, semaphore, text, extraction_prompt)
+        if validation_prompt is None or response.startswith("Error in API response"):
+            return response  # Nothing to validate
+        return await self.query(client, semaphore, response, validation_prompt)
+
+    async def _extract_one(self, client, semaphore, index, text, extraction_prompt, validation_prompt, on_result):
+        result = await self.extract(client, semaphore, text, extraction_prompt, validation_prompt)
+        if on_result:
+            on_result(index, result)  # Lets callers checkpoint each page as soon as it is done
+        return result
+
+    async def run_async(self, texts, extraction_prompt, validation_prompt, on_result=None):
+        # The client and semaphore are bound to the running event loop, so they are created per run
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0) as client:
+            tasks = [
+                self._extract_one(client, semaphore, index, text, extraction_prompt, validation_prompt, on_result)
+                for index, text in enumerate(texts)
+            ]
+            # gather keeps the input order, so the results line up with the page numbers
+            return await asyncio.gather(*tasks)
+
+    def run(self, texts, extraction_prompt, validation_prompt, on_result=None):
+        """
+        Process all texts and return the validated responses in input order.
+
+        `on_result(index, response)` is called as soon as each text is done, in completion order.
+        """
+        start = time.monotonic()
+        results = asyncio.run(self.run_async(texts, extraction_prompt, validation_prompt, on_result))
+        logging.info(f"Processed {len(texts)} pages in {time.monotonic() - start:.1f}s "
+                     f"with up to {self.max_concurrency} concurrent requests")
+        return results
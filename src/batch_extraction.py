@@ -0,0 +1,423 @@
+import argparse
+import hashlib
+import itertools
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+
+from chemical_records import ChemicalWriter, JSONL_SUFFIX, read_chemicals
+from chunk_packer import attribute_sources, get_token_counter, pack_segments
+from csv_chunker import iter_csv_segments
+from llm_extraction import (
+    ERROR_PREFIX, OPENAI_MODEL, is_error_response, parse_gpt_response_to_json, repair_pairs, repair_texts
+)
+from manifest import Manifest, STATE_FOLDER, _atomic_write_json
+from name_index import resolve_pairs
+from pipeline import PROMPTS, Pipeline, input_plan
+from table_extraction import in_page_order
+
+# OpenAI Batch API mode for bulk offline extraction, e.g. a nightly re-extraction
+# of the whole corpus. Batch requests cost half as much as synchronous ones and
+# do not count against the per-minute rate limits, but complete within 24 hours.
+#
+# A run has two phases, each a single batch (or more, for more than
+# `max_requests` requests):
+#   1. the extraction requests of all pending packs of all input files;
+#   2. the validation requests for the pairs that failed local validation.
+# Requests are written as a JSONL batch input file (one {"custom_id", "method",
+# "url", "body"} line per request), uploaded, and polled until the batch is done.
+# Custom ids ("<regulation>#<pack index>", "<regulation>#repair<n>") map the
+# results back to files and packs, which are parsed, checkpointed and written
+# exactly like the synchronous results.
+#
+# Requests that failed or are missing from the output (expired batches) are
+# resubmitted in a new batch, up to `max_attempts` times. Submitted batches are
+# recorded in <output>/.preprocess/batches/batches.json, so a run that was
+# interrupted while polling picks the batch up again instead of resubmitting it.
+# The LLM cache is shared with the other modes in both directions.
+#
+# Usage:
+#   python src/batch_extraction.py --poll-interval 60
+#   python src/fake_openai_server.py --port 8089 --error-rate 0.1
+#   OPENAI_BASE_URL=http://127.0.0.1:8089/v1 python src/batch_extraction.py --poll-interval 1
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+# custom_id: unique within a run, context: page or pair text appended to the prompt
+BatchRequest = namedtuple("BatchRequest", ["custom_id", "system_prompt", "human_prompt", "context"])
+
+
+class BatchRunner:
+    """
+    Runs chat completion requests through the OpenAI Batch API.
+
+    Args:
+        client (OpenAI): OpenAI client; its files and batches endpoints are used.
+        folder (str): Folder for the batch input files and the state of submitted batches.
+        cache (LLMCache): Optional response cache; cached requests are not submitted.
+        poll_interval (float): Seconds between status checks of a running batch.
+        max_attempts (int): Submissions of a request before it is reported as failed.
+        max_requests (int): Requests per batch input file (the API allows 50,000).
+    """
+    def __init__(self, client, folder, cache=None, model=OPENAI_MODEL, max_tokens=4000,
+                 poll_interval=60.0, max_attempts=3, max_requests=50000):
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        self.client = client
+        self.folder = folder
+        self.cache = cache
+        self.model = model
+        self.max_tokens = max_tokens
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.max_requests = max_requests
+        self.state_path = os.path.join(folder, "batches.json")
+        self.batches = {}  # batch id -> {"input": path, "keys": {custom_id: request key}}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                self.batches = json.load(f).get("batches", {})
+        self.stats = {"requests": 0, "cached": 0, "submitted": 0, "resubmitted": 0, "failed": 0, "batches": 0}
+
+    def _save(self):
+        _atomic_write_json(self.state_path, {"batches": self.batches})
+
+    def request_line(self, request):
+        """Batch input line of a request, with the same messages as llm_extraction.query_openai"""
+        return {
+            "custom_id": request.custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {
+                "model": self.model,
+                "messages": [
+                    {"role": "system", "content": request.system_prompt},
+                    {"role": "user", "content": request.human_prompt + request.context}
+                ],
+                "max_tokens": self.max_tokens
+            }
+        }
+
+    @staticmethod
+    def request_key(line):
+        # Identifies the request content, so a recorded batch is only reused for unchanged requests
+        return hashlib.sha256(json.dumps(line["body"], sort_keys=True).encode("utf-8")).hexdigest()
+
+    def submit(self, lines):
+        """Write, upload and start one batch; returns its id"""
+        path = os.path.join(self.folder, f"batch_{time.strftime('%Y%m%d_%H%M%S')}_{self.stats['batches']}.jsonl")
+        with open(path, 'w', encoding='utf-8') as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        with open(path, 'rb') as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(input_file_id=input_file.id, endpoint=BATCH_ENDPOINT, completion_window="24h")
+        self.batches[batch.id] = {"input": path, "keys": {line["custom_id"]: self.request_key(line) for line in lines}}
+        self._save()
+        self.stats["batches"] += 1
+        logging.info(f"Submitted batch {batch.id} with {len(lines)} requests ({path})")
+        return batch.id
+
+    def wait(self, batch_id):
+        """Poll a batch until it reaches a final status; returns the batch"""
+        while True:
+            batch = self.client.batches.retrieve(batch_id)
+            if batch.status in FINAL_STATUSES:
+                return batch
+            counts = batch.request_counts
+            if counts:
+                logging.info(f"Batch {batch_id} {batch.status}: {counts.completed + counts.failed}/{counts.total} requests done")
+            time.sleep(self.poll_interval)
+
+    def results(self, batch):
+        """custom_id -> response content for the successful requests of a finished batch"""
+        results = {}
+        errors = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            for line in self.client.files.content(file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                response = result.get("response") or {}
+                if response.get("status_code") == 200:
+                    results[result["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+                else:
+                    error = result.get("error") or (response.get("body") or {}).get("error") or {}
+                    errors[result["custom_id"]] = error.get("message", f"status {response.get('status_code')}")
+        if batch.status != "completed":
+            logging.warning(f"Batch {batch.id} ended with status {batch.status}")
+        for custom_id, message in list(errors.items())[:5]:
+            logging.warning(f"Batch request {custom_id} failed: {message}")
+        return results
+
+    def run(self, requests):
+        """custom_id -> response content of every request; failed requests get an llm_extraction error response"""
+        self.stats["requests"] += len(requests)
+        responses = {}
+        lines = {}
+        for request in requests:
+            if self.cache:
+                cached = self.cache.get(self.model, request.system_prompt, request.human_prompt, request.context, self.max_tokens)
+                if cached is not None:
+                    responses[request.custom_id] = cached
+                    self.stats["cached"] += 1
+                    continue
+            lines[request.custom_id] = self.request_line(request)
+        by_id = {request.custom_id: request for request in requests}
+
+        def collect(batch_id):
+            batch = self.wait(batch_id)
+            for custom_id, content in self.results(batch).items():
+                if custom_id in lines:
+                    responses[custom_id] = content
+                    request = by_id[custom_id]
+                    if self.cache:
+                        self.cache.put(self.model, request.system_prompt, request.human_prompt, request.context, self.max_tokens, content)
+                    del lines[custom_id]
+            del self.batches[batch_id]
+            self._save()
+
+        # Batches submitted by an interrupted run for the same requests
+        for batch_id, recorded in list(self.batches.items()):
+            if recorded["keys"] and all(custom_id in lines and self.request_key(lines[custom_id]) == key
+                                        for custom_id, key in recorded["keys"].items()):
+                logging.info(f"Resuming batch {batch_id} of an earlier run")
+                collect(batch_id)
+
+        for attempt in range(self.max_attempts):
+            if not lines:
+                break
+            if attempt:
+                logging.warning(f"Resubmitting {len(lines)} failed batch requests (attempt {attempt + 1}/{self.max_attempts})")
+                self.stats["resubmitted"] += len(lines)
+            else:
+                self.stats["submitted"] += len(lines)
+            pending = list(lines.values())
+            batch_ids = [self.submit(pending[start:start + self.max_requests]) for start in range(0, len(pending), self.max_requests)]
+            for batch_id in batch_ids:
+                collect(batch_id)
+
+        self.stats["failed"] += len(lines)
+        for custom_id in lines:
+            responses[custom_id] = f"{ERROR_PREFIX}: batch request {custom_id} failed after {self.max_attempts} attempts"
+        return responses
+
+    def discard_recorded(self):
+        """Forget the batches of earlier runs that no request of this run matched, e.g. of changed files"""
+        for batch_id in self.batches:
+            logging.info(f"Discarding batch {batch_id} of an earlier run")
+        self.batches = {}
+        self._save()
+
+
+class BatchFile:
+    """One input file of a batch run"""
+    def __init__(self, path, kind, name, json_path, fingerprint):
+        self.path = path
+        self.kind = kind
+        self.name = name
+        self.json_path = json_path
+        self.fingerprint = fingerprint
+        self.checkpoint = None
+        self.packs = []
+        self.completed = {}  # Chemicals of the packs completed in an earlier run, by pack index
+        self.table_chemicals = []
+        self.to_repair = []
+        self.failed = 0
+
+
+class BatchExtraction:
+    """Extracts the pairs of all pending input files with two rounds of batch requests"""
+    def __init__(self, output_folder, runner, token_budget=2000, chunk_size=15, triage=None, name_index=None,
+                 text_extractor=None, tables=None):
+        self.output_folder = output_folder
+        self.runner = runner
+        self.token_budget = token_budget
+        self.chunk_size = chunk_size
+        self.triage = triage
+        self.name_index = name_index
+        self.text_extractor = text_extractor
+        self.tables = tables
+        self.count_tokens = get_token_counter(runner.model)
+        self.manifest = Manifest(output_folder)
+
+    def plan(self, input_folders):
+        """Pack the pending input files the same way as the preprocessing scripts"""
+        files = []
+        for path, kind, name in Pipeline.list_inputs(input_folders):
+            json_path = os.path.join(self.output_folder, name + JSONL_SUFFIX)
+            fingerprint = self.manifest.fingerprint(path)
+            if self.manifest.is_complete(path, fingerprint, json_path):
+                logging.info(f"Skipping unchanged file: {os.path.basename(path)}")
+                continue
+            file = BatchFile(path, kind, name, json_path, fingerprint)
+            if kind == "pdf":
+                segments = self.text_extractor.extract(path, fingerprint)
+                if self.tables:
+                    segments = self.tables.filter(segments, name, file.table_chemicals)
+            else:
+                segments = iter_csv_segments(path, self.chunk_size, self.token_budget, self.count_tokens)
+            selected = self.triage.filter(segments, name) if self.triage else segments
+            file.packs = list(pack_segments(selected, self.token_budget, self.count_tokens))
+            if kind == "pdf" and self.tables:
+                self.tables.report(name)
+            plan = input_plan(kind, self.token_budget, self.chunk_size, self.triage, self.tables)
+            file.checkpoint = self.manifest.start(path, fingerprint, name, len(file.packs), plan)
+            file.completed = dict(file.checkpoint.records())
+            files.append(file)
+        return files
+
+    def extract(self, files):
+        """Phase 1: one extraction request per pending pack; pairs are written as in the scripts"""
+        requests = []
+        for file in files:
+            system_prompt, extraction_prompt, _ = PROMPTS[file.kind]
+            requests.extend(BatchRequest(f"{file.name}#{pack.index}", system_prompt, extraction_prompt, pack.text)
+                            for pack in file.packs if pack.index not in file.completed)
+        logging.info(f"Extraction: {len(requests)} requests for {len(files)} files")
+        responses = self.runner.run(requests)
+
+        for file in files:
+            with ChemicalWriter(file.json_path, file.name) as writer:
+                def emit(chemicals):
+                    if self.name_index is not None:
+                        self.name_index.add_chemicals(chemical for chemical in chemicals if "repair" not in chemical)
+                    file.to_repair.extend(chemical for chemical in chemicals if "repair" in chemical)
+                    writer.write(chemical for chemical in chemicals if "repair" not in chemical)
+
+                # Table pages in page order with the requests, see table_extraction.py
+                for pack, table_chemicals in in_page_order(file.packs, file.table_chemicals):
+                    if pack is None:
+                        emit(table_chemicals)
+                        continue
+                    if pack.index in file.completed:
+                        emit(file.completed[pack.index])
+                        continue
+                    response_content = responses[f"{file.name}#{pack.index}"]
+                    if is_error_response(response_content):
+                        file.failed += 1  # Not checkpointed, retried on the next run
+                        continue
+                    chemicals = parse_gpt_response_to_json(response_content, file.name, [])
+                    attribute_sources(chemicals, pack)
+                    file.checkpoint.append(pack.index, chemicals)
+                    emit(chemicals)
+
+    def repair(self, files):
+        """Phase 2: validation requests for the pairs of all files that failed local validation"""
+        texts = {}
+        for file in files:
+            if self.name_index is not None and file.to_repair:
+                resolved = resolve_pairs(file.to_repair, self.name_index)
+                logging.info(f"Resolved {resolved} of {len(file.to_repair)} pairs of {file.name} from the name index")
+            if self.triage:
+                self.triage.report_audit(file.name, itertools.chain(read_chemicals(file.json_path), file.to_repair))
+            # Same packing as repair_pairs, which looks the answers up by text below
+            to_repair = [chemical for chemical in file.to_repair if "repair" in chemical]
+            texts[file.name] = repair_texts(to_repair, self.count_tokens, self.token_budget)
+
+        requests = []
+        for file in files:
+            system_prompt, _, validation_prompt = PROMPTS[file.kind]
+            requests.extend(BatchRequest(f"{file.name}#repair{n}", system_prompt, validation_prompt, text)
+                            for n, text in enumerate(texts[file.name]))
+        logging.info(f"Validation: {len(requests)} requests for {sum(1 for file in files if texts[file.name])} files")
+        responses = self.runner.run(requests)
+
+        for file in files:
+            answers = {text: responses[f"{file.name}#repair{n}"] for n, text in enumerate(texts[file.name])}
+            missing = f"{ERROR_PREFIX}: no validation request for this text"  # Not expected, fails the repair instead of mixing up answers
+            repaired_list, repaired = repair_pairs(file.to_repair, file.name, lambda text: answers.get(text, missing),
+                                                   self.count_tokens, self.token_budget)
+            with ChemicalWriter(file.json_path, file.name, append=True) as writer:
+                writer.write(repaired_list)
+            if file.failed or not repaired:
+                logging.warning(f"{file.failed} requests of {file.name} failed and will be retried on the next run")
+            else:
+                self.manifest.finish(file.path, file.name, file.json_path)
+            logging.info(f"Processed {file.name}: {len(file.packs)} requests, {len(repaired_list)} repaired pairs")
+
+    def run(self, input_folders):
+        files = self.plan(input_folders)
+        if files:
+            self.extract(files)
+            self.repair(files)
+        self.runner.discard_recorded()
+        logging.info(f"Batch statistics: {self.runner.stats}")
+        return files
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from openai import OpenAI
+    from llm_cache import LLMCache, DEFAULT_CACHE_PATH
+    from name_index import NameIndex
+    from page_triage import PageTriage
+    from pdf_text import DEFAULT_TEXT_CACHE_PATH, PageTextCache, PageTextExtractor
+    from table_extraction import TableExtractor
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Extract chemicals from all pending PDFs and CSVs with the OpenAI Batch API")
+    parser.add_argument("--input", nargs="+", default=[
+        folder for folder in (os.getenv('PDF_INPUT_FOLDER'), os.getenv('CSV_INPUT_FOLDER')) if folder
+    ], help="Folders with PDF and CSV files")
+    parser.add_argument("--output", default=os.getenv('JSON_OUTPUT_FOLDER'))
+    parser.add_argument("--poll-interval", type=float, default=float(os.getenv('BATCH_POLL_INTERVAL', 60)), help="Seconds between status checks")
+    parser.add_argument("--max-attempts", type=int, default=int(os.getenv('BATCH_MAX_ATTEMPTS', 3)), help="Submissions of a failing request")
+    parser.add_argument("--max-requests", type=int, default=50000, help="Requests per batch")
+    parser.add_argument("--text-workers", type=int, default=int(os.getenv('PDF_TEXT_WORKERS', 1)), help="Processes extracting PDF page texts")
+    parser.add_argument("--tables", action="store_true", default=os.getenv('PDF_TABLES', '0') != '0', help="Read PDF pages with name/CAS tables without the LLM")
+    args = parser.parse_args()
+    if not args.input or not args.output:
+        parser.error("Set --input/--output or PDF_INPUT_FOLDER/CSV_INPUT_FOLDER and JSON_OUTPUT_FOLDER")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if not os.path.exists(args.output):
+        os.makedirs(args.output)
+
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv('OPENAI_BASE_URL'), max_retries=6)
+    cache = None
+    if os.getenv('LLM_CACHE', '1') != '0':
+        cache = LLMCache(
+            os.getenv('LLM_CACHE_PATH', DEFAULT_CACHE_PATH),
+            max_bytes=int(os.getenv('LLM_CACHE_MAX_MB', 512)) * 1024 * 1024,
+            version_label=os.getenv('PROMPT_VERSION'),
+        )
+    triage = None
+    triage_threshold = float(os.getenv('TRIAGE_THRESHOLD', 1.0))
+    if triage_threshold > 0:
+        triage = PageTriage(
+            threshold=triage_threshold,
+            audit_rate=float(os.getenv('TRIAGE_AUDIT_RATE', 0)),
+            audit_path=os.path.join(args.output, STATE_FOLDER, 'triage_audit.jsonl'),
+        )
+    name_index = NameIndex.from_files(args.output) if os.getenv('NAME_INDEX', '1') != '0' else None
+    text_cache = None
+    if os.getenv('PDF_TEXT_CACHE', '1') != '0':
+        text_cache = PageTextCache(os.getenv('PDF_TEXT_CACHE_PATH', DEFAULT_TEXT_CACHE_PATH))
+    text_extractor = PageTextExtractor(workers=args.text_workers, cache=text_cache, tables=args.tables)
+
+    runner = BatchRunner(
+        client, os.path.join(args.output, STATE_FOLDER, "batches"), cache,
+        max_tokens=int(os.getenv('MAX_TOKENS', 4000)),
+        poll_interval=args.poll_interval,
+        max_attempts=args.max_attempts,
+        max_requests=args.max_requests,
+    )
+    try:
+        BatchExtraction(
+            args.output, runner,
+            token_budget=int(os.getenv('INPUT_TOKEN_BUDGET', 2000)),
+            chunk_size=int(os.getenv('CSV_CHUNK_SIZE', 15)),
+            triage=triage,
+            name_index=name_index,
+            text_extractor=text_extractor,
+            tables=TableExtractor() if args.tables else None,
+        ).run(args.input)
+    finally:
+        text_extractor.close()
+        if cache:
+            logging.info(f"LLM cache statistics: {cache.stats()}")
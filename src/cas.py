@@ -0,0 +1,23 @@
+import re
+
+# Helpers for CAS Registry Numbers.
+# A CAS number has the form NNNNNNN-NN-N: two to seven digits, two digits and a
+# check digit. The check digit is the sum of all other digits, weighted by their
+# position counted from the right, modulo 10.
+
+CAS_PATTERN = re.compile(r"(?<![\d-])(\d{2,7})-(\d{2})-(\d)(?![\d-])")
+
+
+def is_valid_cas(cas):
+    """True if `cas` is a syntactically valid CAS number with a correct check digit"""
+    match = CAS_PATTERN.fullmatch(cas.strip()) if cas else None
+    if not match:
+        return False
+    digits = match.group(1) + match.group(2)
+    checksum = sum(position * int(digit) for position, digit in enumerate(reversed(digits), start=1))
+    return checksum % 10 == int(match.group(3))
+
+
+def find_cas_numbers(text):
+    """Return all CAS numbers with a valid check digit found in a text"""
+    return [match.group(0) for match in CAS_PATTERN.finditer(text) if is_valid_cas(match.group(0))]
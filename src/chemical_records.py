@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+
+# JSON Lines format for extracted chemicals.
+# The preprocessing scripts append the pairs of every page or record group as
+# soon as it is parsed, so a file is usable (and loadable) while it is still
+# being written and neither side has to hold the whole document in memory.
+#
+# The first line is a header with the regulation, every further line one
+# compact record:
+#   {"format": "cura-chemicals", "version": 1, "regulation": "montreal_2020"}
+#   {"n": "Trichlorofluoromethane", "c": "75-69-4", "s": "page 3"}
+#   {"n": "Halon-1211", "s": "page 4"}
+# n: chemical name, c: CAS number, s: source; missing values are omitted.
+# "r" overrides the regulation of the header for a single record.
+#
+# Legacy {"chemicals": [...]} JSON documents remain readable.
+
+FORMAT = "cura-chemicals"
+VERSION = 1
+JSONL_SUFFIX = ".jsonl"
+JSON_SUFFIX = ".json"
+MISSING_VALUES = (None, "", "N/A", "NA")
+
+
+def is_chemical_file(filename):
+    """True for processed files in either format"""
+    return filename.endswith(JSONL_SUFFIX) or filename.endswith(JSON_SUFFIX)
+
+
+def to_record(chemical, regulation):
+    """Compact record of a chemical dictionary"""
+    record = {}
+    for key, field in (("n", "chemical_name"), ("c", "CAS"), ("s", "source")):
+        value = chemical.get(field)
+        if value not in MISSING_VALUES:
+            record[key] = value
+    if chemical.get("regulation") not in (None, regulation):
+        record["r"] = chemical["regulation"]
+    return record
+
+
+def from_record(record, regulation):
+    """Chemical dictionary (as used by the loader) of a compact record"""
+    chemical = {
+        "chemical_name": record.get("n", "N/A"),
+        "CAS": record.get("c", "N/A"),
+        "regulation": record.get("r", regulation)
+    }
+    if "s" in record:
+        chemical["source"] = record["s"]
+    return chemical
+
+
+class ChemicalWriter:
+    """
+    Writes the chemicals of one document to a JSON Lines file, flushed after every write.
+
+    With `append=True` an existing file of the same regulation is continued instead of replaced.
+    """
+    def __init__(self, path, regulation, append=False):
+        self.path = path
+        self.regulation = regulation
+        self.count = 0
+        if append and os.path.exists(path):
+            self._file = open(path, 'a', encoding='utf-8')
+            return
+        self._file = open(path, 'w', encoding='utf-8')
+        self._file.write(json.dumps({"format": FORMAT, "version": VERSION, "regulation": regulation}) + "\n")
+        self._file.flush()
+
+    def write(self, chemicals):
+        for chemical in chemicals:
+            self._file.write(json.dumps(to_record(chemical, self.regulation), ensure_ascii=False) + "\n")
+            self.count += 1
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_chemicals(path):
+    """
+    Yield the chemical dictionaries of a processed file.
+
+    JSON Lines files are streamed with bounded memory; legacy JSON documents are loaded whole.
+    """
+    if not path.endswith(JSONL_SUFFIX):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if not isinstance(data, dict) or not isinstance(data.get("chemicals"), list):
+            raise ValueError("Invalid chemicals data format. Expected a dictionary with a 'chemicals' list.")
+        yield from data["chemicals"]
+        return
+
+    # Files without a header fall back to the file name as regulation
+    regulation = os.path.splitext(os.path.basename(path))[0]
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # The last line may be incomplete while the file is still being written
+                logging.warning(f"Ignoring incomplete record in {path} line {line_number}")
+                continue
+            if line_number == 1 and record.get("format") == FORMAT:
+                regulation = record.get("regulation", regulation)
+                continue
+            yield from_record(record, regulation)
@@ -0,0 +1,130 @@
+import logging
+from collections import namedtuple
+
+# Token-budget-aware packing of pages and CSV row groups into LLM requests.
+# Consecutive small segments (e.g. cover pages) are merged into one request and
+# oversized segments (e.g. dense annex tables) are split, so that every request
+# stays within a configurable input-token budget. Extracted pairs are attributed
+# back to the segment they came from.
+
+# label: human readable source, e.g. "page 3" or "records 16-30"
+Segment = namedtuple("Segment", ["label", "text"])
+
+# index: position of the pack, segments: the segments it contains, text: the prompt context
+Pack = namedtuple("Pack", ["index", "segments", "text", "tokens"])
+
+SEGMENT_SEPARATOR = "\n\n"
+
+
+def get_token_counter(model):
+    """
+    Return a function counting the tokens of a text for the given model.
+
+    Uses tiktoken if it is available and falls back to ~4 characters per token otherwise.
+    """
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")  # Encoding of the current GPT-4 family models
+    except ImportError:
+        logging.warning("tiktoken is not installed, estimating token counts from text length")
+        return lambda text: len(text) // 4 + 1
+    except Exception as e:
+        # tiktoken downloads the encoding on first use, which fails without network access
+        logging.warning(f"Could not load tokenizer ({e}), estimating token counts from text length")
+        return lambda text: len(text) // 4 + 1
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def split_segment(segment, budget, count_tokens):
+    """Split an oversized segment at line boundaries into parts within the budget"""
+    parts = []
+    lines = []
+    tokens = 0
+    for line in segment.text.split("\n"):
+        line_tokens = count_tokens(line) + 1
+        if lines and tokens + line_tokens > budget:
+            parts.append("\n".join(lines))
+            lines = []
+            tokens = 0
+        # A single line above the budget is cut into pieces of roughly `budget` tokens
+        while line_tokens > budget:
+            cut = max(1, len(line) * budget // line_tokens)
+            parts.append(line[:cut])
+            line = line[cut:]
+            line_tokens = count_tokens(line) + 1
+        lines.append(line)
+        tokens += line_tokens
+    if lines:
+        parts.append("\n".join(lines))
+    return [
+        Segment(f"{segment.label} (part {number}/{len(parts)})", text)
+        for number, text in enumerate(parts, start=1)
+    ]
+
+
+def pack_segments(segments, budget, count_tokens):
+    """
+    Yield Packs of consecutive segments with at most `budget` input tokens each.
+
+    Works on a stream of segments, so CSV files do not have to be loaded at once.
+    """
+    separator_tokens = count_tokens(SEGMENT_SEPARATOR)
+    index = 0
+    current = []
+    current_tokens = 0
+
+    def make_pack():
+        return Pack(index, current, SEGMENT_SEPARATOR.join(s.text for s in current), current_tokens)
+
+    for segment in segments:
+        if not segment.text.strip():
+            continue  # Empty pages never need a request
+        tokens = count_tokens(segment.text)
+        parts = [(segment, tokens)]
+        if tokens > budget:
+            parts = [(part, count_tokens(part.text)) for part in split_segment(segment, budget, count_tokens)]
+        for part, part_tokens in parts:
+            if current and current_tokens + separator_tokens + part_tokens > budget:
+                yield make_pack()
+                index += 1
+                current = []
+                current_tokens = 0
+            if current:
+                current_tokens += separator_tokens
+            current.append(part)
+            current_tokens += part_tokens
+    if current:
+        yield make_pack()
+
+
+def pack_label(pack):
+    if len(pack.segments) == 1:
+        return pack.segments[0].label
+    return f"{pack.segments[0].label} to {pack.segments[-1].label}"
+
+
+def attribute_sources(chemicals, pack):
+    """
+    Set the "source" of every extracted chemical to the segment it was found in.
+
+    The CAS number is looked up first, then the chemical name; if neither occurs
+    literally in a single segment, the whole pack is given as source.
+    """
+    lowered = [segment.text.lower() for segment in pack.segments]
+    for chemical in chemicals:
+        source = None
+        for needle in (chemical.get("CAS"), chemical.get("chemical_name")):
+            if not needle or needle.upper() in ("NA", "N/A"):
+                continue
+            needle = needle.lower()
+            for segment, text in zip(pack.segments, lowered):
+                if needle in text:
+                    source = segment.label
+                    break
+            if source:
+                break
+        chemical["source"] = source or pack_label(pack)
+    return chemicals
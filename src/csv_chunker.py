@@ -0,0 +1,70 @@
+import csv
+import io
+from collections import namedtuple
+
+from chunk_packer import Segment
+
+# Single-pass streaming chunker for CSV files.
+# The file is read once with the csv module, so chunks follow CSV records
+# (quoted cells may span several physical lines) and memory use only depends
+# on the chunk size, not on the file size.
+
+# index: position of the chunk, start: index of its first record, rows: parsed records
+CsvChunk = namedtuple("CsvChunk", ["index", "start", "rows"])
+
+
+def iter_csv_chunks(csv_path, chunk_size, encoding='utf-8'):
+    """Yield CsvChunk tuples of up to `chunk_size` records, reading the file once"""
+    with open(csv_path, 'r', encoding=encoding, newline='') as csv_file:
+        rows = []
+        index = 0
+        start = 0
+        for row in csv.reader(csv_file):
+            rows.append(row)
+            if len(rows) == chunk_size:
+                yield CsvChunk(index, start, rows)
+                index += 1
+                start += len(rows)
+                rows = []
+        if rows:
+            yield CsvChunk(index, start, rows)
+
+
+def chunk_to_text(rows):
+    """Render records back to CSV text, quoting cells that contain commas, quotes or newlines"""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator='\n').writerows(rows)
+    return buffer.getvalue().rstrip('\n')
+
+
+def chunk_label(start, count):
+    # Records are numbered from 1 in logs and sources
+    return f"records {start + 1}-{start + count}" if count > 1 else f"record {start + 1}"
+
+
+def iter_csv_segments(csv_path, chunk_size, budget, count_tokens, encoding='utf-8'):
+    """
+    Yield chunk_packer.Segments of up to `chunk_size` records for token-budget packing.
+
+    Row groups above the token budget are split at record boundaries, so quoted
+    multi-line cells are never cut in half.
+    """
+    for chunk in iter_csv_chunks(csv_path, chunk_size, encoding):
+        text = chunk_to_text(chunk.rows)
+        if count_tokens(text) <= budget or len(chunk.rows) == 1:
+            yield Segment(chunk_label(chunk.start, len(chunk.rows)), text)
+            continue
+        rows = []
+        start = chunk.start
+        tokens = 0
+        for row in chunk.rows:
+            row_tokens = count_tokens(chunk_to_text([row])) + 1
+            if rows and tokens + row_tokens > budget:
+                yield Segment(chunk_label(start, len(rows)), chunk_to_text(rows))
+                start += len(rows)
+                rows = []
+                tokens = 0
+            rows.append(row)
+            tokens += row_tokens
+        if rows:
+            yield Segment(chunk_label(start, len(rows)), chunk_to_text(rows))
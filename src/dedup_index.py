@@ -0,0 +1,124 @@
+import logging
+import threading
+
+from pair_validation import MISSING, normalize_cas, normalize_missing
+
+# In-memory canonicalization and deduplication of extracted chemicals before they
+# are written to the graph. The processed files contain exact duplicates and
+# near-duplicates that differ only by whitespace, case, "N/A" vs "NA" or CAS
+# zero-padding. Every chemical is normalized and looked up in a hash index on
+# (normalized name, normalized CAS, regulation) shared by all files of a load,
+# so each distinct row is written once.
+#
+# Names are compared case-insensitively; the first spelling seen becomes the
+# name of the ChemicalName node, so case variants do not create separate nodes.
+# Concurrent loads register the spellings of all files in file order before the
+# workers start (see load_neo4j_data.py), so the chosen spelling does not depend
+# on thread timing.
+
+
+class DedupIndex:
+    """Hash index of the canonical chemicals of all files of one load, with write savings statistics"""
+    def __init__(self):
+        self._lock = threading.Lock()  # Shared by the loader's worker threads
+        self._keys = set()
+        self._names = {}  # casefolded name -> spelling used in the graph
+        self.seen = 0
+        self.invalid = 0
+        self.normalized = 0
+        self.duplicates_in_file = 0
+        self.duplicates_across_files = 0
+
+    def seed_names(self, names):
+        """Register spellings that take precedence over later ones, e.g. those already in the graph"""
+        with self._lock:
+            for name in names:
+                self._canonical_name(name)
+
+    def _canonical_name(self, name):
+        name = normalize_missing(name)
+        if name == MISSING:
+            return None
+        return self._names.setdefault(name.casefold(), name)
+
+    def canonicalize(self, chemical):
+        """
+        Return a normalized copy of a chemical: whitespace collapsed, missing values as None,
+        CAS dashes and zero-padding normalized, and the canonical spelling of the name.
+        """
+        with self._lock:
+            return self._canonicalize(chemical)
+
+    def _canonicalize(self, chemical):
+        name = self._canonical_name(chemical.get("chemical_name"))
+        cas = normalize_cas(chemical.get("CAS"))
+        cas = None if cas == MISSING else cas
+        regulation = " ".join((chemical.get("regulation") or "").split()) or None
+        canonical = dict(chemical, chemical_name=name, CAS=cas, regulation=regulation)
+        if (name, cas, regulation) != (chemical.get("chemical_name"), chemical.get("CAS"), chemical.get("regulation")):
+            self.normalized += 1
+        return canonical
+
+    def add(self, chemicals, across_files=True):
+        """
+        Canonicalize the chemicals of one file and return those not seen before in this load.
+
+        Args:
+            chemicals (iterable): Chemical dictionaries of one file.
+            across_files (bool): Also drop chemicals already returned for another file. Duplicates
+                across files are counted either way.
+
+        Returns:
+            list: The canonical chemicals that still need to be written.
+        """
+        return list(self.filter(chemicals, across_files))
+
+    def filter(self, chemicals, across_files=True):
+        """Streaming version of add(): yield the canonical chemicals of one file that still need to be written"""
+        file_keys = set()
+        for chemical in chemicals:
+            # The lock is only held per chemical, the consumer may write to the database in between
+            with self._lock:
+                self.seen += 1
+                canonical = self._canonicalize(chemical)
+                name, cas = canonical["chemical_name"], canonical["CAS"]
+                if not canonical["regulation"] or not (name or cas):
+                    self.invalid += 1
+                    keep = True  # The loader logs and skips it
+                else:
+                    key = (name.casefold() if name else None, cas, canonical["regulation"])
+                    if key in file_keys:
+                        self.duplicates_in_file += 1
+                        keep = False
+                    elif key in self._keys:
+                        self.duplicates_across_files += 1
+                        keep = not across_files
+                    else:
+                        self._keys.add(key)
+                        keep = True
+                    if keep:
+                        file_keys.add(key)
+            if keep:
+                yield canonical
+
+    def stats(self):
+        saved = self.duplicates_in_file + self.duplicates_across_files
+        return {
+            "seen": self.seen,
+            "unique": self.seen - saved - self.invalid,
+            "invalid": self.invalid,
+            "normalized": self.normalized,
+            "duplicates_in_file": self.duplicates_in_file,
+            "duplicates_across_files": self.duplicates_across_files,
+            "writes_saved": saved,
+            "writes_saved_share": saved / self.seen if self.seen else 0.0
+        }
+
+    def log_stats(self):
+        stats = self.stats()
+        logging.getLogger('chemical_database').info(
+            f"Dedup: {stats['seen']} chemicals, {stats['unique']} unique, {stats['normalized']} normalized, "
+            f"{stats['duplicates_in_file']} duplicates within files, "
+            f"{stats['duplicates_across_files']} duplicates across files, "
+            f"{stats['writes_saved']} writes saved ({stats['writes_saved_share']:.0%})"
+        )
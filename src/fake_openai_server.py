@@ -0,0 +1,232 @@
+import argparse
+import json
+import logging
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Minimal OpenAI-compatible server for exercising the extraction pipeline locally.
+# It implements POST /v1/chat/completions and answers with "name $ CAS" lines for
+# every CAS number found in the prompt. Latency and error rates are configurable
+# so rate limiting and retries can be tested without paying for API calls.
+#
+# The Batch API endpoints used by batch_extraction.py are implemented as well:
+# POST /v1/files, GET /v1/files/{id}/content, POST /v1/batches and
+# GET /v1/batches/{id}. A batch is processed in a background thread, one request
+# per `latency`; with an error rate, failed requests go to the batch's error file.
+#
+# Usage:
+#   python src/fake_openai_server.py --port 8089 --error-rate 0.1
+#   OPENAI_BASE_URL=http://127.0.0.1:8089/v1 python src/preprocess_pdfs.py
+#   OPENAI_BASE_URL=http://127.0.0.1:8089/v1 python src/batch_extraction.py --poll-interval 1
+
+CAS_PATTERN = re.compile(r"\b\d{2,7}-\d{2}-\d\b")
+
+
+def fake_completion(content):
+    """Build a plausible "name $ CAS" answer for the given prompt"""
+    # Only look at the text after the prompt, which always ends with a colon
+    text = content.rsplit("analyze:", 1)[-1] if "analyze:" in content else content
+    text = text.rsplit("improve:", 1)[-1]
+    lines = []
+    for line in text.splitlines():
+        if "$" in line:
+            # Validation pass: keep the pairs as they are
+            lines.append(line.strip())
+            continue
+        for cas in CAS_PATTERN.findall(line):
+            name = line.split(cas)[0].strip(" ,;:\t") or "NA"
+            lines.append(f"{name} $ {cas}")
+    return "\n".join(lines) if lines else "N/A,N/A"
+
+
+def completion_body(request):
+    """Chat completion answer to a request body"""
+    content = request["messages"][-1]["content"]
+    answer = fake_completion(content)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model", "fake"),
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": answer},
+            "finish_reason": "stop"
+        }],
+        "usage": {
+            "prompt_tokens": len(content) // 4,
+            "completion_tokens": len(answer) // 4,
+            "total_tokens": (len(content) + len(answer)) // 4
+        }
+    }
+
+
+def multipart_fields(content_type, body):
+    """Fields of a multipart/form-data body: name -> (filename, bytes)"""
+    boundary = re.search(r'boundary="?([^";]+)"?', content_type).group(1).encode()
+    fields = {}
+    for part in body.split(b"--" + boundary)[1:-1]:
+        headers, _, data = part.partition(b"\r\n\r\n")
+        disposition = headers.decode("utf-8", "replace")
+        name = re.search(r'name="([^"]*)"', disposition).group(1)
+        filename = re.search(r'filename="([^"]*)"', disposition)
+        fields[name] = (filename.group(1) if filename else None, data[:-2])  # Strip the CRLF before the boundary
+    return fields
+
+
+def run_batch(server, batch):
+    """Answer every request of a batch input file and store output and error files"""
+    batch["status"] = "in_progress"
+    batch["in_progress_at"] = int(time.time())
+    outputs, errors = [], []
+    for line in server.files[batch["input_file_id"]]["data"].decode("utf-8").splitlines():
+        if not line.strip():
+            continue
+        request = json.loads(line)
+        if server.latency:
+            time.sleep(server.latency)
+        result = {"id": f"batch_req_{uuid.uuid4().hex}", "custom_id": request["custom_id"]}
+        if random.random() < server.error_rate:
+            server.stats["errors"] += 1
+            result["response"] = {"status_code": 500, "request_id": uuid.uuid4().hex,
+                                  "body": {"error": {"message": "Injected error 500", "type": "fake_error"}}}
+            result["error"] = None
+            errors.append(result)
+        else:
+            result["response"] = {"status_code": 200, "request_id": uuid.uuid4().hex, "body": completion_body(request["body"])}
+            result["error"] = None
+            outputs.append(result)
+        batch["request_counts"]["completed" if "choices" in result["response"]["body"] else "failed"] += 1
+    for key, results in (("output_file_id", outputs), ("error_file_id", errors)):
+        if results:
+            batch[key] = server.add_file("\n".join(json.dumps(result) for result in results).encode("utf-8") + b"\n",
+                                         f"{batch['id']}_{key}.jsonl", "batch_output")
+    batch["status"] = "completed"
+    batch["completed_at"] = int(time.time())
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    """Request handler, configured through attributes on the server"""
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+    def _send_json(self, status, body):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length)
+        self.server.stats["requests"] += 1
+        path = self.path.rstrip("/")
+
+        if path.endswith("/files"):
+            fields = multipart_fields(self.headers.get("Content-Type", ""), body)
+            filename, data = fields["file"]
+            file_id = self.server.add_file(data, filename, fields.get("purpose", (None, b""))[1].decode())
+            self._send_json(200, self.server.file_object(file_id))
+            return
+        request = json.loads(body or b"{}")
+        if path.endswith("/batches"):
+            if request.get("input_file_id") not in self.server.files:
+                self._send_json(404, {"error": {"message": f"No such file: {request.get('input_file_id')}"}})
+                return
+            self.server.stats["batches"] += 1
+            batch = {
+                "id": f"batch_{uuid.uuid4().hex}",
+                "object": "batch",
+                "endpoint": request["endpoint"],
+                "input_file_id": request["input_file_id"],
+                "completion_window": request["completion_window"],
+                "status": "validating",
+                "created_at": int(time.time()),
+                "output_file_id": None,
+                "error_file_id": None,
+                "request_counts": {"total": 0, "completed": 0, "failed": 0}
+            }
+            batch["request_counts"]["total"] = sum(1 for line in self.server.files[batch["input_file_id"]]["data"].splitlines() if line.strip())
+            self.server.batches[batch["id"]] = batch
+            threading.Thread(target=run_batch, args=(self.server, batch), daemon=True).start()
+            self._send_json(200, batch)
+            return
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if path.endswith("/chat/completions"):
+            if random.random() < self.server.error_rate:
+                self.server.stats["errors"] += 1
+                status = random.choice([429, 500, 503])
+                self._send_json(status, {"error": {"message": f"Injected error {status}", "type": "fake_error"}})
+                return
+            self._send_json(200, completion_body(request))
+        else:
+            self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_GET(self):
+        path = self.path.split("?")[0].rstrip("/")
+        match = re.search(r"/files/([^/]+)/content$", path)
+        if match and match.group(1) in self.server.files:
+            data = self.server.files[match.group(1)]["data"]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+            return
+        match = re.search(r"/batches/([^/]+)$", path)
+        if match and match.group(1) in self.server.batches:
+            self._send_json(200, self.server.batches[match.group(1)])
+            return
+        self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+
+def make_server(host="127.0.0.1", port=8089, latency=0.0, error_rate=0.0):
+    """Create (but do not start) a fake server; port 0 picks a free port"""
+    server = ThreadingHTTPServer((host, port), FakeOpenAIHandler)
+    server.latency = latency
+    server.error_rate = error_rate
+    server.stats = {"requests": 0, "errors": 0, "batches": 0}
+    server.files = {}
+    server.batches = {}
+
+    def add_file(data, filename, purpose):
+        file_id = f"file-{uuid.uuid4().hex}"
+        server.files[file_id] = {"data": data, "filename": filename, "purpose": purpose, "created_at": int(time.time())}
+        return file_id
+
+    def file_object(file_id):
+        file = server.files[file_id]
+        return {"id": file_id, "object": "file", "bytes": len(file["data"]), "created_at": file["created_at"],
+                "filename": file["filename"], "purpose": file["purpose"], "status": "processed"}
+
+    server.add_file = add_file
+    server.file_object = file_object
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server for local testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to sleep before each response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 429/5xx")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    server = make_server(args.host, args.port, args.latency, args.error_rate)
+    logging.info(f"Fake OpenAI server listening on http://{args.host}:{server.server_port}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
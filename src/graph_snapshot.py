@@ -0,0 +1,363 @@
+import argparse
+import bisect
+import logging
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+# Compact, memory-mapped snapshot of the chemical graph for read serving without Neo4j.
+#
+# The graph has three node kinds (ChemicalName, Chemical, Regulation) and three
+# relationship kinds (name IS_NAME_OF cas, name IS_REGULATED regulation, cas
+# IS_REGULATED regulation). A snapshot stores:
+#   - one interned string table (offsets + UTF-8 blob) for all names, CAS numbers and regulations
+#   - per node kind, a sorted array of string ids, so a node is found by binary search
+#   - per relationship kind and direction, a CSR adjacency (offsets + target node ids)
+# All arrays are uint32 sections that are used in place through memoryviews of the
+# mapped file; opening a snapshot reads nothing but the header.
+#
+# Snapshots are built from the processed files (same canonicalization as the
+# loader) or from the database. SnapshotGraph answers the template queries of
+# question_templates.py and can stand in for Neo4jGraph in tests and offline demos.
+#
+# Usage:
+#   python src/graph_snapshot.py build --from-files data/processed/uploaded
+#   python src/graph_snapshot.py build --from-neo4j
+#   python src/graph_snapshot.py query --cas 75-45-6
+#   python src/graph_snapshot.py query --regulation montreal_2020
+
+DEFAULT_SNAPSHOT_PATH = os.path.join("data", "snapshot", "chemical_graph.snap")
+MAGIC = b"CURASNAP"
+FORMAT_VERSION = 1
+HEADER = struct.Struct("<8sII")  # magic, format version, number of sections
+SECTION = struct.Struct("<32sQQ")  # name, byte offset, byte length
+
+NODE_KINDS = ("name", "cas", "regulation")
+# Relationship kind -> (source node kind, target node kind), stored in both directions
+RELATIONSHIP_KINDS = {
+    "name_cas": ("name", "cas"),
+    "name_regulation": ("name", "regulation"),
+    "cas_regulation": ("cas", "regulation")
+}
+
+
+def _csr(pairs, source_count):
+    """Offsets and targets arrays of (source id, target id) pairs"""
+    pairs = sorted(set(pairs))
+    offsets = array("I", [0] * (source_count + 1))
+    for source, _ in pairs:
+        offsets[source + 1] += 1
+    for index in range(source_count):
+        offsets[index + 1] += offsets[index]
+    return offsets, array("I", (target for _, target in pairs))
+
+
+def build_snapshot(relationships, path=DEFAULT_SNAPSHOT_PATH):
+    """
+    Write a snapshot of a set of relationships.
+
+    Args:
+        relationships (iterable): (kind, source key, target key) tuples, as produced by
+            ChemicalDatabase.row_relationships.
+        path (str): Output file, replaced atomically.
+
+    Returns:
+        dict: Number of nodes per kind and relationships per kind.
+    """
+    edges = {kind: set() for kind in RELATIONSHIP_KINDS}
+    for kind, source, target in relationships:
+        edges[kind].add((source, target))
+
+    keys = {kind: set() for kind in NODE_KINDS}
+    for kind, pairs in edges.items():
+        source_kind, target_kind = RELATIONSHIP_KINDS[kind]
+        for source, target in pairs:
+            keys[source_kind].add(source)
+            keys[target_kind].add(target)
+
+    # Intern every string once, even if it is e.g. both a name and a regulation
+    strings = sorted(set().union(*keys.values()))
+    string_ids = {string: index for index, string in enumerate(strings)}
+    blob = bytearray()
+    string_offsets = array("I", [0])
+    for string in strings:
+        blob += string.encode("utf-8")
+        string_offsets.append(len(blob))
+
+    sections = {"strings.offsets": string_offsets.tobytes(), "strings.data": bytes(blob)}
+    node_ids = {}
+    for kind in NODE_KINDS:
+        ordered = sorted(keys[kind])
+        node_ids[kind] = {key: index for index, key in enumerate(ordered)}
+        sections[f"{kind}.nodes"] = array("I", (string_ids[key] for key in ordered)).tobytes()
+    for kind, pairs in edges.items():
+        source_kind, target_kind = RELATIONSHIP_KINDS[kind]
+        sources, targets = node_ids[source_kind], node_ids[target_kind]
+        forward = [(sources[source], targets[target]) for source, target in pairs]
+        for direction, direction_pairs, count in (
+            ("fwd", forward, len(sources)),
+            ("rev", [(target, source) for source, target in forward], len(targets))
+        ):
+            offsets, adjacency = _csr(direction_pairs, count)
+            sections[f"{kind}.{direction}.o"] = offsets.tobytes()
+            sections[f"{kind}.{direction}.t"] = adjacency.tobytes()
+
+    # Header, section table, then the sections, each aligned to 8 bytes
+    offset = HEADER.size + SECTION.size * len(sections)
+    table = []
+    for name, data in sections.items():
+        offset += -offset % 8
+        table.append((name, offset, len(data)))
+        offset += len(data)
+
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(sections)))
+        for name, section_offset, length in table:
+            f.write(SECTION.pack(name.encode("ascii"), section_offset, length))
+        for (name, section_offset, _), data in zip(table, sections.values()):
+            f.write(b"\0" * (section_offset - f.tell()))
+            f.write(data)
+    os.replace(tmp_path, path)
+
+    stats = {f"{kind}_nodes": len(node_ids[kind]) for kind in NODE_KINDS}
+    stats.update({f"{kind}_relationships": len(pairs) for kind, pairs in edges.items()})
+    return stats
+
+
+class _SortedKeys:
+    """Read-only sequence of the keys of one node kind, decoded on access (for bisect)"""
+    def __init__(self, snapshot, kind):
+        self._snapshot = snapshot
+        self._nodes = snapshot._sections[f"{kind}.nodes"]
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def __getitem__(self, index):
+        return self._snapshot._string(self._nodes[index])
+
+
+class GraphSnapshot:
+    """Read-only view of a snapshot file"""
+    def __init__(self, path=DEFAULT_SNAPSHOT_PATH):
+        if sys.byteorder != "little":
+            raise RuntimeError("Graph snapshots are only supported on little-endian machines")
+        self.path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+        magic, version, count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a graph snapshot of format version {FORMAT_VERSION}")
+        self._sections = {}
+        for index in range(count):
+            name, offset, length = SECTION.unpack_from(self._map, HEADER.size + index * SECTION.size)
+            section = self._view[offset:offset + length]
+            name = name.rstrip(b"\0").decode("ascii")
+            self._sections[name] = section if name == "strings.data" else section.cast("I")
+        self._keys = {kind: _SortedKeys(self, kind) for kind in NODE_KINDS}
+
+    def close(self):
+        # Views have to be released before the map can be closed
+        for section in getattr(self, "_sections", {}).values():
+            section.release()
+        self._sections = {}
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _string(self, string_id):
+        offsets = self._sections["strings.offsets"]
+        return bytes(self._sections["strings.data"][offsets[string_id]:offsets[string_id + 1]]).decode("utf-8")
+
+    def _node_id(self, kind, key):
+        keys = self._keys[kind]
+        index = bisect.bisect_left(keys, key)
+        return index if index < len(keys) and keys[index] == key else None
+
+    def _neighbours(self, relationship, direction, node_id):
+        offsets = self._sections[f"{relationship}.{direction}.o"]
+        return self._sections[f"{relationship}.{direction}.t"][offsets[node_id]:offsets[node_id + 1]]
+
+    def _related(self, kind, key, relationship, direction, target_kind):
+        node_id = self._node_id(kind, key)
+        if node_id is None:
+            return []
+        return [self._keys[target_kind][target] for target in self._neighbours(relationship, direction, node_id)]
+
+    def names_of_cas(self, cas):
+        return self._related("cas", cas, "name_cas", "rev", "name")
+
+    def cas_of_name(self, name):
+        return self._related("name", name, "name_cas", "fwd", "cas")
+
+    def regulations_of_cas(self, cas):
+        return self._related("cas", cas, "cas_regulation", "fwd", "regulation")
+
+    def regulations_of_name(self, name):
+        return self._related("name", name, "name_regulation", "fwd", "regulation")
+
+    def chemicals_of_regulation(self, regulation):
+        """
+        (name, cas) pairs regulated by a regulation, like the chemicals_by_regulation template.
+
+        cas is None for names whose CAS number is not regulated by it; name is None for
+        CAS numbers without a name regulated by it.
+        """
+        regulation_id = self._node_id("regulation", regulation)
+        if regulation_id is None:
+            return []
+        cas_ids = set(self._neighbours("cas_regulation", "rev", regulation_id))
+        named_cas = set()
+        chemicals = []
+        for name_id in self._neighbours("name_regulation", "rev", regulation_id):
+            name = self._keys["name"][name_id]
+            matches = [cas_id for cas_id in self._neighbours("name_cas", "fwd", name_id) if cas_id in cas_ids]
+            named_cas.update(matches)
+            chemicals.extend((name, self._keys["cas"][cas_id]) for cas_id in matches)
+            if not matches:
+                chemicals.append((name, None))
+        chemicals.extend((None, self._keys["cas"][cas_id]) for cas_id in sorted(cas_ids - named_cas))
+        return chemicals
+
+    def regulations(self):
+        return list(self._keys["regulation"])
+
+    def names(self):
+        return list(self._keys["name"])
+
+    def stats(self):
+        stats = {f"{kind}_nodes": len(self._keys[kind]) for kind in NODE_KINDS}
+        stats.update({f"{kind}_relationships": len(self._sections[f"{kind}.fwd.t"]) for kind in RELATIONSHIP_KINDS})
+        stats["bytes"] = len(self._map)
+        return stats
+
+
+class SnapshotGraph:
+    """
+    Stand-in for Neo4jGraph backed by a snapshot, for tests and offline demos.
+
+    Only the queries of question_templates.py are supported; anything else raises ValueError.
+    """
+    def __init__(self, snapshot):
+        from question_templates import REGULATION_NAMES_QUERY, TEMPLATES
+
+        self.snapshot = snapshot
+        self._handlers = {
+            " ".join(TEMPLATES["chemicals_by_regulation"].split()): lambda params: [
+                {"chemical_name": name, "cas": cas}
+                for name, cas in snapshot.chemicals_of_regulation(params["regulation"])
+            ],
+            " ".join(TEMPLATES["regulations_by_cas"].split()): lambda params: [
+                {"regulation": name} for name in sorted(set(snapshot.regulations_of_cas(params["cas"])))
+            ],
+            " ".join(TEMPLATES["names_by_cas"].split()): lambda params: [
+                {"name": name} for name in sorted(set(snapshot.names_of_cas(params["cas"])))
+            ],
+            " ".join(REGULATION_NAMES_QUERY.split()): lambda params: [
+                {"name": name} for name in snapshot.regulations()
+            ]
+        }
+
+    def query(self, query, params={}):
+        handler = self._handlers.get(" ".join(query.split()))
+        if handler is None:
+            raise ValueError("Query not supported by the offline graph snapshot")
+        rows = handler(params)
+        return rows[:params["limit"]] if "limit" in params else rows
+
+
+def relationships_from_files(json_folder):
+    """Relationships the loader would write for the processed files of a folder"""
+    from chemical_records import is_chemical_file, read_chemicals
+    from dedup_index import DedupIndex
+    from load_neo4j_data import ChemicalDatabase
+
+    index = DedupIndex()
+    relationships = set()
+    for file in sorted(os.listdir(json_folder)):
+        if is_chemical_file(file):
+            chemicals = index.filter(read_chemicals(os.path.join(json_folder, file)), across_files=False)
+            for row in ChemicalDatabase.rows_of(chemicals):
+                relationships |= ChemicalDatabase.row_relationships(row)
+    return relationships
+
+
+# Relationship kind -> query returning its (source, target) keys
+EXPORT_QUERIES = {
+    "name_cas": "MATCH (cn:ChemicalName)-[:IS_NAME_OF]->(c:Chemical) RETURN cn.name AS source, c.cas AS target",
+    "name_regulation": "MATCH (cn:ChemicalName)-[:IS_REGULATED]->(r:Regulation) RETURN cn.name AS source, r.name AS target",
+    "cas_regulation": "MATCH (c:Chemical)-[:IS_REGULATED]->(r:Regulation) RETURN c.cas AS source, r.name AS target"
+}
+
+
+def relationships_from_neo4j(uri, auth):
+    """All relationships of the chemical graph in the database"""
+    from neo4j import GraphDatabase
+
+    relationships = set()
+    with GraphDatabase.driver(uri, auth=auth) as driver:
+        with driver.session() as session:
+            for kind, query in EXPORT_QUERIES.items():
+                for record in session.run(query):
+                    if record["source"] is not None and record["target"] is not None:
+                        relationships.add((kind, record["source"], record["target"]))
+    return relationships
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build and query the offline chemical graph snapshot")
+    parser.add_argument("--path", default=os.getenv("GRAPH_SNAPSHOT", DEFAULT_SNAPSHOT_PATH))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="Build a snapshot")
+    source = build_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--from-files", metavar="FOLDER", help="Folder with processed .jsonl/.json files")
+    source.add_argument("--from-neo4j", action="store_true", help="Export the database configured in .env")
+    query_parser = subparsers.add_parser("query", help="Look up a CAS number, name or regulation")
+    lookup = query_parser.add_mutually_exclusive_group(required=True)
+    lookup.add_argument("--cas")
+    lookup.add_argument("--name")
+    lookup.add_argument("--regulation")
+    subparsers.add_parser("stats", help="Show node and relationship counts")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    if args.command == "build":
+        start = time.perf_counter()
+        if args.from_files:
+            relationships = relationships_from_files(args.from_files)
+        else:
+            from load_neo4j_data import Configuration
+            config = Configuration.load_environment()
+            relationships = relationships_from_neo4j(config["neo4j_uri"], config["neo4j_auth"])
+        stats = build_snapshot(relationships, args.path)
+        logging.info(f"Wrote snapshot {args.path} in {time.perf_counter() - start:.2f}s: {stats}")
+    else:
+        with GraphSnapshot(args.path) as snapshot:
+            if args.command == "stats":
+                print(snapshot.stats())
+            else:
+                start = time.perf_counter()
+                if args.cas:
+                    result = {"names": snapshot.names_of_cas(args.cas), "regulations": snapshot.regulations_of_cas(args.cas)}
+                elif args.name:
+                    result = {"cas": snapshot.cas_of_name(args.name), "regulations": snapshot.regulations_of_name(args.name)}
+                else:
+                    result = {"chemicals": snapshot.chemicals_of_regulation(args.regulation)}
+                elapsed = time.perf_counter() - start
+                print(result)
+                print(f"Answered in {elapsed * 1e6:.0f} µs")
@@ -0,0 +1,173 @@
+import argparse
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# Content-addressed on-disk cache for OpenAI chat completions.
+# Responses are stored in SQLite, keyed by a hash of model + system prompt +
+# human prompt + context + max_tokens + prompt version. Entries are evicted in
+# least-recently-used order once the cache grows beyond `max_bytes`.
+#
+# Usage:
+#   python src/llm_cache.py stats
+#   python src/llm_cache.py invalidate <prompt_version>
+#   python src/llm_cache.py clear
+
+DEFAULT_CACHE_PATH = os.path.join("data", "cache", "llm_cache.sqlite")
+
+
+def prompt_version(human_prompt, label=None):
+    """Version of a prompt: an explicit label, or a short hash of the prompt text"""
+    if label:
+        return label
+    return hashlib.sha256(human_prompt.encode("utf-8")).hexdigest()[:12]
+
+
+class LLMCache:
+    """Persistent cache of LLM responses with hit/miss statistics and LRU eviction"""
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=512 * 1024 * 1024, version_label=None):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.version_label = version_label  # Bumping the label forces fresh responses for every prompt
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # The connection is shared between threads
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                prompt_version TEXT NOT NULL,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                last_access REAL NOT NULL,
+                hit_count INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses (last_access)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_prompt_version ON responses (prompt_version)")
+        self._conn.commit()
+        self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def make_key(self, model, system_prompt, human_prompt, context, max_tokens):
+        """Hash all inputs that influence the response"""
+        payload = json.dumps(
+            [model, system_prompt, human_prompt, context, max_tokens, prompt_version(human_prompt, self.version_label)],
+            ensure_ascii=False
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, model, system_prompt, human_prompt, context, max_tokens):
+        """Return the cached response, or None on a miss"""
+        key = self.make_key(model, system_prompt, human_prompt, context, max_tokens)
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute(
+                "UPDATE responses SET last_access = ?, hit_count = hit_count + 1 WHERE key = ?",
+                (time.time(), key)
+            )
+            self._conn.commit()
+            return row[0]
+
+    def put(self, model, system_prompt, human_prompt, context, max_tokens, response):
+        """Store a successful response and evict old entries if the cache is too large"""
+        key = self.make_key(model, system_prompt, human_prompt, context, max_tokens)
+        size = len(response.encode("utf-8"))
+        now = time.time()
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, prompt_version, model, response, size, created, last_access) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, prompt_version(human_prompt, self.version_label), model, response, size, now, now)
+            )
+            self._conn.commit()
+            self._size += size - (previous[0] if previous else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        # Drop least recently used entries until the cache is at 90% of its limit
+        target = int(self.max_bytes * 0.9)
+        evicted = 0
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY last_access").fetchall():
+            if self._size <= target:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._size -= size
+            evicted += 1
+        self._conn.commit()
+        logging.info(f"Evicted {evicted} entries from LLM cache ({self._size} bytes remaining)")
+
+    def invalidate(self, version):
+        """Remove all responses produced with the given prompt version"""
+        with self._lock:
+            removed = self._conn.execute("DELETE FROM responses WHERE prompt_version = ?", (version,)).rowcount
+            self._conn.commit()
+            self._size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        logging.info(f"Invalidated {removed} cached responses for prompt version {version}")
+        return removed
+
+    def clear(self):
+        """Remove all cached responses"""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+            self._size = 0
+
+    def stats(self):
+        """Hit/miss counts of this session and size of the cache"""
+        with self._lock:
+            entries, total_hits = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(hit_count), 0) FROM responses"
+            ).fetchone()
+            versions = dict(self._conn.execute(
+                "SELECT prompt_version, COUNT(*) FROM responses GROUP BY prompt_version"
+            ).fetchall())
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": self._size,
+            "lifetime_hits": total_hits,
+            "prompt_versions": versions
+        }
+
+    def close(self):
+        self._conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and maintain the LLM response cache")
+    parser.add_argument("--path", default=os.getenv("LLM_CACHE_PATH", DEFAULT_CACHE_PATH))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Show cache statistics")
+    invalidate_parser = subparsers.add_parser("invalidate", help="Remove responses of a prompt version")
+    invalidate_parser.add_argument("version")
+    subparsers.add_parser("clear", help="Remove all cached responses")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    cache = LLMCache(args.path)
+    if args.command == "stats":
+        print(json.dumps(cache.stats(), indent=4))
+    elif args.command == "invalidate":
+        cache.invalidate(args.version)
+    elif args.command == "clear":
+        cache.clear()
+    cache.close()
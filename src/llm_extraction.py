@@ -0,0 +1,213 @@
+import logging
+
+from chunk_packer import Segment, pack_segments
+from pair_validation import EMPTY, attribute_repaired, validate_pair
+
+# Prompts, OpenAI query and response parsing shared by the preprocessing scripts and the
+# pipeline runner (see pipeline.py). Nothing here runs at import time; callers pass in
+# their OpenAI client and LLMCache. The prompt texts are part of the LLM cache key, so
+# changing them invalidates the cached responses of the changed prompt.
+
+# OpenAI model used for extraction and validation
+OPENAI_MODEL = "gpt-4.5-preview"
+
+# System prompts to set the context for OpenAI
+PDF_SYSTEM_PROMPT = "You are a useful, correct AI assistant helping to organize data from a PDF file and validate it."
+CSV_SYSTEM_PROMPT = "You are a useful, correct AI assistant helping to organize data from a CSV file and validate it."
+
+ERROR_PREFIX = "Error in API response"
+
+
+# Query the OpenAI API with a prompt and the text it applies to
+# Identical requests are served from the LLM cache if one is given
+def query_openai(client, cache, system_prompt, human_prompt, context, max_tokens, model=OPENAI_MODEL):
+    if cache:
+        cached = cache.get(model, system_prompt, human_prompt, context, max_tokens)
+        if cached is not None:
+            return cached
+
+    try:
+        # Call the OpenAI API with the prompt and message
+        response = client.chat.completions.create(
+            model=model,  # Specify the OpenAI model to use
+            messages=[
+                {"role": "system", "content": system_prompt},  # System prompt
+                {"role": "user", "content": human_prompt + context}  # User prompt
+            ],
+            max_tokens=max_tokens,  # Limit the response to a certain number of tokens
+        )
+        logging.debug(f"Raw API response: {response}")  # Log the raw response content
+
+        # Access the content field
+        content = response.choices[0].message.content
+        # Only successful responses are cached, errors are retried on the next run
+        if cache:
+            cache.put(model, system_prompt, human_prompt, context, max_tokens, content)
+        return content  # Return the content field from the API response
+    except Exception as e:
+        logging.error(f"{ERROR_PREFIX}: {e}")  # Log the error in case of API failure
+        return f"{ERROR_PREFIX}: {e}"  # Return the error message as the response
+
+# query_openai returns the error message instead of raising
+def is_error_response(response_content):
+    return response_content.startswith(ERROR_PREFIX)
+
+# Parse the Claude response and convert it into a DataFrame-friendly format
+# Pairs are normalised and checked locally (see pair_validation.py); with flag_repairs=True,
+# pairs that need the validation prompt are marked with a "repair" key
+def parse_gpt_response_to_json(response_content, regulation, chemicals_list, flag_repairs=True):
+    lines = response_content.strip().split('\n')  # Split response into lines
+    for line in lines:
+        if line:  # Ensure line is not empty
+             # Split by dollar signs and keep only the first two elements: Trade Name, CAS Number
+            parts = [element.strip() for element in line.split('$')][:2]
+            if len(parts) == 2:
+                chemical_name, cas, problem = validate_pair(parts[0], parts[1])
+                if problem == EMPTY:
+                    continue  # "N/A $ N/A" carries no data
+                chemical_entry = {
+                    "chemical_name": chemical_name,
+                    "CAS": cas,
+                    "regulation": regulation
+                }
+                if problem and flag_repairs:
+                    chemical_entry["repair"] = problem
+                chemicals_list.append(chemical_entry)
+
+    return chemicals_list  # Return the updated list
+
+# Texts of the validation requests for pairs that need repair, as few as the token budget allows
+def repair_texts(to_repair, count_tokens, token_budget=2000):
+    segments = [Segment(chemical.get("source", ""), f"{chemical['chemical_name']} $ {chemical['CAS']}") for chemical in to_repair]
+    return [pack.text for pack in pack_segments(segments, token_budget, count_tokens)]
+
+# Send all pairs of a document that failed local validation to the validation prompt
+# Pairs are batched into as few requests as the token budget allows, usually a single one per document
+# `query(text)` runs the validation prompt on a text; returns the final list and whether the repair succeeded
+def repair_pairs(chemicals_list, regulation, query, count_tokens, token_budget=2000):
+    valid = [chemical for chemical in chemicals_list if "repair" not in chemical]
+    to_repair = [chemical for chemical in chemicals_list if "repair" in chemical]
+    if not to_repair:
+        return valid, True
+
+    logging.info(f"Repairing {len(to_repair)} of {len(chemicals_list)} pairs of {regulation} with the validation prompt")
+    repaired = []
+    for text in repair_texts(to_repair, count_tokens, token_budget):
+        response_content = query(text)
+        if is_error_response(response_content):
+            # Keep the pairs as extracted; the caller retries the repair on the next run
+            logging.warning(f"Repair of {regulation} failed, keeping {len(to_repair)} pairs as extracted")
+            for chemical in to_repair:
+                del chemical["repair"]
+            return valid + to_repair, False
+        repaired = parse_gpt_response_to_json(response_content, regulation, repaired, flag_repairs=False)
+
+    return valid + attribute_repaired(repaired, to_repair), True
+
+# Extraction prompt for PDFs
+PDF_EXTRACTION_PROMPT = f"""Analyze the following text from a PDF report and extract pairs of "Chemical Trade Names" and "CAS Numbers".
+
+Present your findings in a structured format with each entry separated by dollar signs . Each entry should list the Chemical Trade Name and CAS Number.
+
+Chemical Names are natural words, such as "Fluoroacetamide", "1,1,1,2-Tetrachloroethane", "2,4,5-T and its salts and esters", "1,2-dibromoethane (EDB) " etc.
+CAS Numbers are unique identifiers for chemicals, such as "640-19-7", "13071-79-9", "630-20-6", etc. CAS Numbers never contain words.
+
+Format your response as: Chemical Trade Name $ CAS Number. Examples: 
+Mercury compounds $ 71-43-2
+Ethanol $ 64-17-5
+
+ALWAYS REMEMBER THE FOLLOWING RULES:
+1. If multiple variations exist (e.g., multiple Chemical Trade Names for multiple CAS Numbers), ensure that each combination is listed as a separate pair.
+2. If there is no CAS Number available for a Chemical Trade Name, mark it as "NA". Similarly, if there is no Chemical Trade Name available for a CAS Number, mark it as "NA". NEVER, IN ANY SCENARIO, HALLUCINATE DATA.
+3. The format MUST HAVE the two columns and ONLY the two columns. Be extremely accurate and ensure the format is consistent.
+4. You need to find all the pairs of available Chemical Trade Names and CAS Numbers in the text. DONT MISS ANY.
+5. If the entire text does not contain any Chemical Trade Names or CAS Numbers, respond with "N/A,N/A". Never write full-text answers explaining yourself.
+
+It is extremely important that you perform well on this job. Otherwise, I will lose my job and 1000 grandmothers will die!
+
+Here is the text to analyze:"""
+
+# Validation prompt for pairs of PDFs that need repair
+PDF_VALIDATION_PROMPT = """Analyze the following list that contains chemical names and their CAS numbers in the format:
+
+chemical_name $ CAS
+chemical_name $ CAS
+
+Your job is to go over the list, keep all valid combinations, and improve invalid combinations. Generally, all combinations are valid, and should therefore be kept. Only change combinations in any of these cases:
+
+CRITERIA FOR INVALID COMBINATIONS
+
+1. Grouped Chemicals: If the chemical name refer to multiple chemicals, generate pairs of "chemical_name $ CAS" for each individual chemical. 
+2. Entries containing "N/A": If only chemical_name is "N/A", fill in the missing chemical name from the CAS number. Vice versa, if only CAS number is "N/A", fill in the missing CAS number from the chemical name. If both chemical name and CAS number are "N/A", remove the entry.
+3. Garbled formulas: If the chemical name contains a chemical formula whose subscripts were scattered into separate letters and digits, remove the broken formula and keep the name.
+
+EXAMPLES OF INVALID COMBINATIONS
+
+"2,4,5-T and its salts and esters $ 93-76-5" --> invalid because it groups multiple chemicals together. Change to "2,4,5-T $ 93-76-5", “Sodium trichlorophenoxyacetate $ 88-85-7”, “Dimethylammonium trichlorophenoxyacetate $ 2008-39-1”, “Isooctyl 2,4,5-trichlorophenoxyacetate $ 25168-26-7”
+"Asbestos: Tremolite $ N/A" --> invalid because it is missing the CAS number. Change to "Asbestos: Tremolite $ 77536-68-6"        
+"N/A $ N/A" --> invalid because it does not contain any valid data. Remove the entry.
+"Nonylphenols C 6H (OH)C H 4 9 1 9 $ 25154-52-3" --> invalid because the formula is garbled. Change to "Nonylphenols $ 25154-52-3"
+
+ALWAYS REMEMBER THE FOLLOWING RULES:
+1. Only change invalid combinations. Keep all valid combinations. If you are unsure, keep the entry as it is.
+1. Each entry is placed in a new line and should be separated by dollar signs and formatted as: Chemical Name $ CAS Number. Never produce any other format, never produce free-text explaining yourself.
+2. NEVER, IN ANY SCENARIO, HALLUCINATE DATA. If you are unsure about an entry, keep it as it is.
+4. Be extremely accurate and ensure the format is consistent across all entries.
+5. Never, in any case, generate full-text answers explaining yourself. Only generate the pairs of Chemical Name and CAS Number.
+
+It is extremely important that you perform well on this job. Otherwise, I will lose my job and 1000 grandmothers will die!
+
+Here is the text to analyze and improve:"""
+
+# Extraction prompt for CSVs
+CSV_EXTRACTION_PROMPT = f"""Analyze the following CSV table and extract pairs of "Chemical Trade Names" and "CAS Numbers".
+
+Present your findings in a structured format with each entry separated by dollar signs . Each entry should list the Chemical Trade Name and CAS Number.
+
+Chemical Names are natural words, such as "Fluoroacetamide", "1,1,1,2-Tetrachloroethane", "2,4,5-T and its salts and esters", "1,2-dibromoethane (EDB) " etc.
+CAS Numbers are unique identifiers for chemicals, such as "640-19-7", "13071-79-9", "630-20-6", etc. CAS Numbers never contain words.
+
+Format your response as: Chemical Trade Name $ CAS Number. Examples: 
+Mercury compounds $ 71-43-2
+Ethanol $ 64-17-5
+
+ALWAYS REMEMBER THE FOLLOWING RULES:
+1. If multiple variations exist (e.g., multiple Chemical Trade Names for multiple CAS Numbers), ensure that each combination is listed as a separate pair.
+2. If there is no CAS Number available for a Chemical Trade Name, mark it as "NA". Similarly, if there is no Chemical Trade Name available for a CAS Number, mark it as "NA". NEVER, IN ANY SCENARIO, HALLUCINATE DATA. 
+3. The format MUST HAVE the two columns and ONLY the two columns. Be extremely accurate and ensure the format is consistent.
+4. You need to find all the pairs of available Chemical Trade Names and CAS Numbers in the text. DONT MISS ANY.
+5. If the entire text does not contain any Chemical Trade Names or CAS Numbers, respond with "N/A,N/A". 
+6. Never write full-text answers explaining yourself. Only provide the requested pairs. If you are unsure, only write N/A for both columns.
+
+It is extremely important that you perform well on this job. Otherwise, I will lose my job and 1000 grandmothers will die!
+
+Here is the text to analyze:"""
+
+# Validation prompt for pairs of CSVs that need repair
+CSV_VALIDATION_PROMPT = """Analyze the following list that contains chemical names and their CAS numbers in the format:
+
+chemical_name $ CAS
+chemical_name $ CAS
+
+Your job is to go over the list, keep all valid combinations, and improve invalid combinations. Generally, all combinations are valid, and should therefore be kept. Only change combinations in any of these cases:
+
+CRITERIA FOR INVALID COMBINATIONS
+
+1. Grouped Chemicals: If the chemical name refer to multiple chemicals, generate pairs of "chemical_name $ CAS" for each individual chemical. 
+2. Entries containing "N/A": If only chemical_name is "N/A", fill in the missing chemical name from the CAS number. Vice versa, if only CAS number is "N/A", fill in the missing CAS number from the chemical name. If both chemical name and CAS number are "N/A", remove the entry.
+
+EXAMPLES OF INVALID COMBINATIONS
+
+"2,4,5-T and its salts and esters $ 93-76-5" --> invalid because it groups multiple chemicals together. Change to "2,4,5-T $ 93-76-5", “Sodium trichlorophenoxyacetate $ 88-85-7”, “Dimethylammonium trichlorophenoxyacetate $ 2008-39-1”, “Isooctyl 2,4,5-trichlorophenoxyacetate $ 25168-26-7”
+"Asbestos: Tremolite $ N/A" --> invalid because it is missing the CAS number. Change to "Asbestos: Tremolite $ 77536-68-6"        
+"N/A $ N/A" --> invalid because it does not contain any valid data. Remove the entry.
+
+ALWAYS REMEMBER THE FOLLOWING RULES:
+1. Only change invalid combinations. Keep all valid combinations. If you are unsure, keep the entry as it is.
+1. Each entry is placed in a new line and should be separated by dollar signs and formatted as: Chemical Name $ CAS Number. Never produce any other format, never produce free-text explaining yourself.
+2. NEVER, IN ANY SCENARIO, HALLUCINATE DATA. If you are unsure about an entry, keep it as it is.
+4. Be extremely accurate and ensure the format is consistent across all entries.
+
+It is extremely important that you perform well on this job. Otherwise, I will lose my job and 1000 grandmothers will die!
+
+Here is the text to analyze and improve:"""
@@ -1,9 +1,16 @@
 import os
-import json
 import logging
+import random
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from neo4j import GraphDatabase
+from neo4j.exceptions import TransientError
 from dotenv import load_dotenv
 
+from chemical_records import is_chemical_file, read_chemicals
+from dedup_index import DedupIndex
+from manifest import GraphSyncState
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -25,6 +32,9 @@ class Configuration:
         neo4j_user = os.getenv("NEO4J_USERNAME")
         neo4j_password = os.getenv("NEO4J_PASSWORD")
         json_paths = os.getenv("JSON_OUTPUT_FOLDER")
+        batch_size = int(os.getenv("NEO4J_BATCH_SIZE", 1000))
+        load_workers = int(os.getenv("NEO4J_LOAD_WORKERS", 1))
+        load_mode = os.getenv("NEO4J_LOAD_MODE", "sync")
         
         if not all([neo4j_uri, neo4j_user, neo4j_password, json_paths]):
             raise ValueError("Missing required environment variables")
@@ -32,7 +42,10 @@ class Configuration:
         return {
             "neo4j_uri": neo4j_uri,
             "neo4j_auth": (neo4j_user, neo4j_password),
-            "json_paths": json_paths
+            "json_paths": json_paths,
+            "batch_size": batch_size,
+            "load_workers": load_workers,
+            "load_mode": load_mode
         }
     
     @staticmethod
@@ -46,29 +59,348 @@ class Configuration:
             raise ConnectionError(f"Failed to connect to Neo4j database: {e}")
 
 
+# Cypher statements of the batch loader, one per row shape (see ChemicalDatabase._group_rows)
+BATCH_QUERIES = {
+    "name_and_cas": """
+        UNWIND $rows AS row
+        MERGE (c:Chemical {cas: row.cas})
+        MERGE (cn:ChemicalName {name: row.name})
+        MERGE (r:Regulation {name: row.regulation})
+        MERGE (cn)-[:IS_NAME_OF]->(c)
+        MERGE (cn)-[:IS_REGULATED]->(r)
+        MERGE (c)-[:IS_REGULATED]->(r)
+    """,
+    "name_only": """
+        UNWIND $rows AS row
+        MERGE (cn:ChemicalName {name: row.name})
+        MERGE (r:Regulation {name: row.regulation})
+        MERGE (cn)-[:IS_REGULATED]->(r)
+    """,
+    "cas_only": """
+        UNWIND $rows AS row
+        MERGE (c:Chemical {cas: row.cas})
+        MERGE (r:Regulation {name: row.regulation})
+        MERGE (c)-[:IS_REGULATED]->(r)
+    """
+}
+
+
+# How rows are derived from the processed files; bumping it makes sync mode re-derive every file
+ROW_FORMAT = "canonical-1"
+
+
+# Statements retracting relationships whose supporting rows disappeared, one per relationship kind
+RETRACT_QUERIES = {
+    "name_cas": """
+        UNWIND $rows AS row
+        MATCH (:ChemicalName {name: row.source})-[rel:IS_NAME_OF]->(:Chemical {cas: row.target})
+        DELETE rel
+    """,
+    "name_regulation": """
+        UNWIND $rows AS row
+        MATCH (:ChemicalName {name: row.source})-[rel:IS_REGULATED]->(:Regulation {name: row.target})
+        DELETE rel
+    """,
+    "cas_regulation": """
+        UNWIND $rows AS row
+        MATCH (:Chemical {cas: row.source})-[rel:IS_REGULATED]->(:Regulation {name: row.target})
+        DELETE rel
+    """
+}
+
+# Statements removing nodes left without any relationship after a retraction
+PRUNE_QUERIES = {
+    "ChemicalName": "UNWIND $keys AS key MATCH (n:ChemicalName {name: key}) WHERE NOT (n)--() DELETE n",
+    "Chemical": "UNWIND $keys AS key MATCH (n:Chemical {cas: key}) WHERE NOT (n)--() DELETE n",
+    "Regulation": "UNWIND $keys AS key MATCH (n:Regulation {name: key}) WHERE NOT (n)--() DELETE n"
+}
+
+
+# Bumped after every load that changed the graph; app.py keys its schema, matcher, name index and
+# QA caches on it (node and relationship counts stay the same when a sync retracts and adds as many)
+LOAD_VERSION_QUERY = """
+    MERGE (v:LoadVersion {name: 'chemicals'})
+    SET v.id = coalesce(v.id, 0) + 1, v.committed_at = datetime()
+    RETURN v.id AS id
+"""
+
+
+# Uniqueness constraints back every MERGE key with an index; the full-text indexes serve name lookups
+SCHEMA_STATEMENTS = [
+    "CREATE CONSTRAINT chemical_cas_unique IF NOT EXISTS FOR (c:Chemical) REQUIRE c.cas IS UNIQUE",
+    "CREATE CONSTRAINT chemical_name_unique IF NOT EXISTS FOR (cn:ChemicalName) REQUIRE cn.name IS UNIQUE",
+    "CREATE CONSTRAINT regulation_name_unique IF NOT EXISTS FOR (r:Regulation) REQUIRE r.name IS UNIQUE",
+    "CREATE CONSTRAINT load_version_name_unique IF NOT EXISTS FOR (v:LoadVersion) REQUIRE v.name IS UNIQUE",
+    "CREATE FULLTEXT INDEX chemical_name_fulltext IF NOT EXISTS FOR (cn:ChemicalName) ON EACH [cn.name]",
+    "CREATE FULLTEXT INDEX regulation_name_fulltext IF NOT EXISTS FOR (r:Regulation) ON EACH [r.name]"
+]
+
+
 class ChemicalDatabase:
     """Class to manage Neo4j database operations for chemical data"""
-    def __init__(self, URI, AUTH):
-        self._driver = GraphDatabase.driver(URI, auth=AUTH)
+    def __init__(self, URI, AUTH, batch_size=1000, max_retry_time=30.0, conflict_retries=5):
+        # Managed transactions (execute_write) retry transient errors for up to max_retry_time seconds
+        self._driver = GraphDatabase.driver(URI, auth=AUTH, max_transaction_retry_time=max_retry_time)
+        self.batch_size = batch_size
+        # Extra attempts once the driver gives up, for heavy lock contention between concurrent loaders
+        self.conflict_retries = conflict_retries
 
     def close(self):
         """Close the database connection"""
         self._driver.close()
 
+    def ensure_schema(self, timeout=300):
+        """
+        Idempotently create the constraints and indexes of the chemical graph and wait until they are online.
+
+        Args:
+            timeout (int): Seconds to wait for index population.
+
+        Returns:
+            list: Name, type, state and population percentage of every index.
+        """
+        with self._driver.session() as session:
+            for statement in SCHEMA_STATEMENTS:
+                try:
+                    session.run(statement).consume()
+                except Exception as e:
+                    # Typically duplicate nodes from earlier loads; MERGE still works, just without the index
+                    logger.error(f"Failed to create schema element ({statement}): {e}")
+
+            session.run("CALL db.awaitIndexes($timeout)", timeout=timeout).consume()
+            indexes = session.run(
+                "SHOW INDEXES YIELD name, type, state, populationPercent, labelsOrTypes, properties"
+            ).data()
+
+        for index in indexes:
+            logger.info(
+                f"Index {index['name']} ({index['type']} on {index['labelsOrTypes']} {index['properties']}): "
+                f"{index['state']}, {index['populationPercent']:.0f}% populated"
+            )
+        return indexes
+
+    @staticmethod
+    def _validate(chemicals_data_json):
+        if not isinstance(chemicals_data_json, dict) or "chemicals" not in chemicals_data_json or not isinstance(chemicals_data_json["chemicals"], list):
+            raise ValueError("Invalid chemicals data format. Expected a dictionary with a 'chemicals' list.")
+
     def import_json(self, chemicals_data_json):
         """
         Inserts chemical data from a JSON-like structure into Neo4j.
 
+        Rows are grouped by shape and written in batches of `batch_size` with UNWIND,
+        one managed write transaction per batch.
+
         Args:
             chemicals_data_json (dict): A dictionary containing a "chemicals" key with a list of chemical dictionaries.
+
+        Returns:
+            int: The number of rows written.
         """
-        if not isinstance(chemicals_data_json, dict) or "chemicals" not in chemicals_data_json or not isinstance(chemicals_data_json["chemicals"], list):
-            raise ValueError("Invalid chemicals data format. Expected a dictionary with a 'chemicals' list.")
+        self._validate(chemicals_data_json)
+        return self.import_chemicals(chemicals_data_json["chemicals"])
+
+    def import_chemicals(self, chemicals):
+        """
+        Inserts a stream of chemical dictionaries into Neo4j with bounded memory.
+
+        Rows are buffered per shape and a buffer is written as soon as it holds `batch_size` rows.
+
+        Args:
+            chemicals (iterable): Chemical dictionaries, e.g. from chemical_records.read_chemicals.
+
+        Returns:
+            int: The number of rows written.
+        """
+        buffers = {shape: [] for shape in BATCH_QUERIES}
+        written = 0
+        with self._driver.session() as session:
+            for shape, row in self._iter_rows(chemicals):
+                buffers[shape].append(row)
+                if len(buffers[shape]) >= self.batch_size:
+                    written += self._flush(session, shape, buffers[shape])
+                    buffers[shape] = []
+            for shape, rows in buffers.items():
+                if rows:
+                    written += self._flush(session, shape, rows)
+        return written
+
+    def _flush(self, session, shape, rows):
+        # A fixed row order makes concurrent transactions take their node locks in the same order,
+        # which avoids most deadlocks between loaders
+        rows.sort(key=lambda row: (row["regulation"] or "", row["cas"] or "", row["name"] or ""))
+        self._execute_batch(session, BATCH_QUERIES[shape], rows)
+        return len(rows)
+
+    def _execute_batch(self, session, query, rows):
+        """
+        Write one batch, retrying deadlocks and lock timeouts the driver could not resolve.
+
+        Concurrent loaders MERGE the same Regulation and Chemical nodes, so transactions can
+        deadlock or time out waiting for locks. Both surface as TransientError.
+        """
+        for attempt in range(self.conflict_retries + 1):
+            try:
+                return session.execute_write(self._write_batch, query, rows)
+            except TransientError as e:
+                if attempt == self.conflict_retries:
+                    raise
+                delay = min(30.0, 2 ** attempt) * random.uniform(0.5, 1.5)
+                logger.warning(f"Lock conflict writing {len(rows)} rows ({e.code}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+    def import_json_per_row(self, chemicals_data_json):
+        """
+        Inserts chemical data with one auto-commit query per chemical.
+
+        This is the original loading path, kept for throughput comparisons (see benchmarks/bench_neo4j_import.py).
+        """
+        self._validate(chemicals_data_json)
 
         with self._driver.session() as session:
             for chemical in chemicals_data_json["chemicals"]:
                 self._insert_chemical(session, chemical)
 
+    @classmethod
+    def rows_of(cls, chemicals):
+        """
+        Rows a stream of chemicals produces in the graph, as a set of (shape, name, cas, regulation) tuples.
+
+        Args:
+            chemicals (iterable): Chemical dictionaries.
+        """
+        return {
+            (shape, row["name"] or "", row["cas"] or "", row["regulation"])
+            for shape, row in cls._iter_rows(chemicals)
+        }
+
+    @staticmethod
+    def row_relationships(row):
+        """Relationships a row creates, as (kind, source key, target key) tuples"""
+        shape, name, cas, regulation = row
+        if shape == "name_and_cas":
+            return {("name_cas", name, cas), ("name_regulation", name, regulation), ("cas_regulation", cas, regulation)}
+        if shape == "name_only":
+            return {("name_regulation", name, regulation)}
+        return {("cas_regulation", cas, regulation)}
+
+    def apply_delta(self, added, removed, retained):
+        """
+        Write added rows and retract the relationships of removed rows.
+
+        A relationship is only retracted if no retained row (of this or any other file) still creates it;
+        nodes left without relationships are deleted.
+
+        Args:
+            added (set): Rows to MERGE.
+            removed (set): Rows that disappeared.
+            retained (set): All rows that remain in the graph.
+
+        Returns:
+            tuple: Number of rows written and number of relationships retracted.
+        """
+        groups = {shape: [] for shape in BATCH_QUERIES}
+        for shape, name, cas, regulation in sorted(added):
+            groups[shape].append({"name": name or None, "cas": cas or None, "regulation": regulation})
+
+        supported = set()
+        for row in retained | added:
+            supported |= self.row_relationships(row)
+        retracted = set()
+        for row in removed:
+            retracted |= self.row_relationships(row) - supported
+        retract_groups = {kind: [] for kind in RETRACT_QUERIES}
+        for kind, source, target in sorted(retracted):
+            retract_groups[kind].append({"source": source, "target": target})
+
+        # Nodes touched by a retraction, checked for orphans afterwards
+        touched = {"ChemicalName": set(), "Chemical": set(), "Regulation": set()}
+        for kind, source, target in retracted:
+            touched["Chemical" if kind == "cas_regulation" else "ChemicalName"].add(source)
+            touched["Chemical" if kind == "name_cas" else "Regulation"].add(target)
+
+        written = 0
+        with self._driver.session() as session:
+            for shape, rows in groups.items():
+                for start in range(0, len(rows), self.batch_size):
+                    batch = rows[start:start + self.batch_size]
+                    self._execute_batch(session, BATCH_QUERIES[shape], batch)
+                    written += len(batch)
+            for kind, rows in retract_groups.items():
+                for start in range(0, len(rows), self.batch_size):
+                    self._execute_batch(session, RETRACT_QUERIES[kind], rows[start:start + self.batch_size])
+            for label, keys in touched.items():
+                if keys:
+                    session.execute_write(self._prune_nodes, PRUNE_QUERIES[label], sorted(keys))
+            if written or retracted:
+                self._commit_load_version(session)
+        return written, len(retracted)
+
+    def commit_load_version(self):
+        """Bump the load version of the graph and return it"""
+        with self._driver.session() as session:
+            return self._commit_load_version(session)
+
+    def _commit_load_version(self, session):
+        version = session.execute_write(self._write_load_version)
+        logger.info(f"Graph load version is now {version}")
+        return version
+
+    @staticmethod
+    def _write_load_version(tx):
+        return tx.run(LOAD_VERSION_QUERY).single()["id"]
+
+    @staticmethod
+    def _prune_nodes(tx, query, keys):
+        tx.run(query, keys=keys).consume()
+
+    @staticmethod
+    def _write_batch(tx, query, rows):
+        """Transaction function writing one batch of rows"""
+        tx.run(query, rows=rows).consume()
+
+    @staticmethod
+    def _row_shape(chemical):
+        """
+        Classify a chemical by the data it has: "name_and_cas", "name_only", "cas_only" or None.
+
+        Args:
+            chemical (dict): A dictionary representing a single chemical.
+        """
+        chemical_name = chemical.get("chemical_name")
+        cas = chemical.get("CAS")
+        if not chemical.get("regulation"):
+            return None
+        if chemical_name and cas and cas!="N/A" and cas!="NA":
+            return "name_and_cas"
+        if chemical_name:
+            return "name_only"
+        if cas:
+            return "cas_only"
+        return None
+
+    @classmethod
+    def _iter_rows(cls, chemicals):
+        """
+        Yield (shape, row) parameter pairs for the UNWIND queries.
+
+        Args:
+            chemicals (iterable): Chemical dictionaries.
+
+        Yields:
+            tuple: Shape name and a {"name", "cas", "regulation"} row.
+        """
+        for chemical in chemicals:
+            shape = cls._row_shape(chemical)
+            if shape is None:
+                logger.warning(f"Skipping chemical due to missing regulation or missing chemical name and CAS: {chemical}")
+                continue
+            yield shape, {
+                "name": chemical.get("chemical_name"),
+                "cas": chemical.get("CAS"),
+                "regulation": chemical.get("regulation")
+            }
+
     @staticmethod
     def _insert_chemical(session, chemical):
         """
@@ -117,41 +449,256 @@ class ChemicalDatabase:
             logger.warning(f"Skipping chemical due to missing chemical name and CAS: {chemical}")
 
     def upload_data(self, chemicals_data_json):   
-        """Upload chemical data to the database"""
+        """Upload chemical data to the database and return the number of rows written, or None on failure"""
+        try:
+            self._validate(chemicals_data_json)
+        except ValueError as e:
+            logger.error(f"An error occurred: {e}")
+            return None
+        return self.upload_chemicals(chemicals_data_json["chemicals"])
+
+    def upload_chemicals(self, chemicals):
+        """Upload a stream of chemicals, bump the load version and return the number of rows written, or None on failure"""
         try:
-            self.import_json(chemicals_data_json)
-            logger.info("Chemicals inserted successfully.")
+            start = time.perf_counter()
+            written = self.import_chemicals(chemicals)
+            if written:
+                self.commit_load_version()
+            elapsed = time.perf_counter() - start
+            logger.info(f"Chemicals inserted successfully: {written} rows in {elapsed:.2f}s ({written / elapsed if elapsed else 0:.0f} rows/s).")
+            return written
         except Exception as e:
             logger.error(f"An error occurred: {e}")
+            return None
 
 
 class FileProcessor:
     """Class to handle file operations and processing"""
-    def __init__(self, database):
-        """Initialize with database dependency injected"""
+    def __init__(self, database, workers=1, max_pending=None, index=None):
+        """
+        Initialize with database dependency injected.
+
+        Args:
+            database (ChemicalDatabase): Target database; its driver pool is shared by all workers.
+            workers (int): Number of files loaded concurrently.
+            max_pending (int): Files read and queued at most at once (default: 2 per worker).
+            index (DedupIndex): Canonicalization and dedup index shared by all files of the load.
+        """
         self.database = database
+        self.workers = max(1, workers)
+        self.max_pending = max_pending or 2 * self.workers
+        self.index = index or DedupIndex()
+
+    @staticmethod
+    def list_files(json_paths):
+        """Processed files of a folder, JSON Lines and legacy JSON"""
+        return [
+            os.path.join(json_paths, file)
+            for file in sorted(os.listdir(json_paths))
+            if is_chemical_file(file)
+        ]
     
     def process_jsons(self, json_paths):
-        """Process multiple JSON files and upload their data to the database"""
+        """Process multiple JSON files, upload their data to the database and log a summary"""
+        results = []
         try:
-            for file in os.listdir(json_paths):
-                if file.endswith(".json"):
-                    self.process_file(os.path.join(json_paths, file))
+            files = self.list_files(json_paths)
+            start = time.perf_counter()
+            if self.workers == 1:
+                results = [self.process_file(file_path) for file_path in files]
+            else:
+                results = self._process_concurrently(files)
+            self._log_summary(results, time.perf_counter() - start)
+            self.index.log_stats()
         except Exception as e:
             logger.error(f"Error processing files: {e}")
+        return results
+
+    def sync_jsons(self, json_paths):
+        """
+        Apply only the changes of new, modified and deleted JSON files to the database.
+
+        Files whose fingerprint matches the sync state are skipped without reading them.
+        With several workers, the deltas of the changed files are applied concurrently (see _sync_concurrently).
+        """
+        state = GraphSyncState(json_paths, version=ROW_FORMAT)
+        # Keep the spellings of names that are already in the graph
+        self.index.seed_names(row[1] for row in state.all_rows())
+        results = []
+        try:
+            files = self.list_files(json_paths)
+            start = time.perf_counter()
+            changes = []
+            for file_path in files:
+                fingerprint = state.fingerprint(file_path)
+                if not state.is_synced(file_path, fingerprint):
+                    changes.append((file_path, fingerprint))
+            unchanged = len(files) - len(changes)
+            # Files that were deleted since the last sync lose all their rows
+            changes.extend((file_path, None) for file_path in sorted(set(state.files) - set(files)))
+
+            if self.workers == 1 or len(changes) == 1:
+                results = [self.sync_file(file_path, fingerprint, state) for file_path, fingerprint in changes]
+            else:
+                results = self._sync_concurrently(changes, state)
+
+            if results:
+                self._log_summary(results, time.perf_counter() - start)
+            self.index.log_stats()
+            logger.info(f"Graph is in sync: {unchanged} unchanged files skipped, {len(results)} files synced")
+        except Exception as e:
+            logger.error(f"Error syncing files: {e}")
+        return results
+
+    def sync_file(self, file_path, fingerprint, state, loaded=frozenset()):
+        """
+        Sync one JSON file (fingerprint None: the file was deleted) and record it in the sync state.
+
+        `loaded` are rows of the file the caller already wrote to the graph (see pipeline.py).
+        """
+        start = time.perf_counter()
+        result = {"file": file_path, "ok": False, "rows": 0, "retracted": 0}
+        try:
+            rows = self._file_rows(file_path, fingerprint)
+            previous = state.rows(file_path)
+            other_rows = state.other_rows(file_path)
+            added = rows - previous
+            removed = previous - rows
+            # Rows another file or the caller already wrote are in the graph and need no write
+            result["rows"], result["retracted"] = self.database.apply_delta(
+                added - other_rows - loaded, removed, other_rows | (rows & (previous | loaded))
+            )
+            logger.info(
+                f"{len(added)} rows added ({len(added & other_rows)} already in the graph), "
+                f"{len(removed)} rows removed from {os.path.basename(file_path)}"
+            )
+
+            if fingerprint is None:
+                state.remove(file_path)
+            else:
+                state.update(file_path, fingerprint, rows)
+            result["ok"] = True
+        except Exception as e:
+            logger.error(f"Error syncing {file_path}: {e}")
+        result["seconds"] = time.perf_counter() - start
+        return result
+
+    def _file_rows(self, file_path, fingerprint):
+        """Rows the graph should have for a file; none for a deleted file (fingerprint None)"""
+        if fingerprint is None:
+            logger.info(f"Retracting deleted file: {file_path}")
+            return set()
+        logger.info(f"Syncing file: {file_path}")
+        # Every file keeps its own rows, so a pair stays in the graph while any file still has it
+        return self.database.rows_of(self.index.filter(read_chemicals(file_path), across_files=False))
+
+    def _sync_concurrently(self, changes, state):
+        """
+        Apply the deltas of several changed files with the worker pool and record them in the sync state.
+
+        Every delta is computed against the rows all files have once the sync is done, instead of the
+        state after the previous file: a relationship is only retracted if no file has it afterwards,
+        so no worker retracts what another one is writing. Rows are derived in file order in this
+        thread, and the state is only updated from here.
+        """
+        rows = {}
+        results = {}
+        for file_path, fingerprint in changes:
+            try:
+                rows[file_path] = self._file_rows(file_path, fingerprint)
+            except Exception as e:
+                logger.error(f"Error syncing {file_path}: {e}")
+                results[file_path] = {"file": file_path, "ok": False, "rows": 0, "retracted": 0, "seconds": 0.0}
+
+        in_graph = state.all_rows()
+        # Files that could not be read keep the rows of their last sync
+        final = set().union(*rows.values())
+        for file_path in state.files:
+            if file_path not in rows:
+                final |= state.rows(file_path)
+
+        def apply(file_path):
+            start = time.perf_counter()
+            result = {"file": file_path, "ok": False, "rows": 0, "retracted": 0}
+            try:
+                added, removed = rows[file_path] - in_graph, state.rows(file_path) - rows[file_path]
+                result["rows"], result["retracted"] = self.database.apply_delta(added, removed, final)
+                logger.info(f"{len(added)} rows added, {len(removed)} rows removed from {os.path.basename(file_path)}")
+                result["ok"] = True
+            except Exception as e:
+                logger.error(f"Error syncing {file_path}: {e}")
+            result["seconds"] = time.perf_counter() - start
+            return result
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="loader") as executor:
+            for result in executor.map(apply, list(rows)):
+                results[result["file"]] = result
+
+        for file_path, fingerprint in changes:
+            if not results[file_path]["ok"]:
+                continue  # Synced again on the next run
+            if fingerprint is None:
+                state.remove(file_path)
+            else:
+                state.update(file_path, fingerprint, rows[file_path])
+        return [results[file_path] for file_path, _ in changes]
+
+    def _process_concurrently(self, files):
+        # Register the spellings of all files in file order first, so a name gets the spelling of the
+        # first file that has it, as in a sequential load, and not of the first worker to reach it
+        for file_path in files:
+            try:
+                self.index.seed_names(chemical.get("chemical_name") for chemical in read_chemicals(file_path))
+            except Exception:
+                pass  # Reported by process_file
+
+        # Submit files as workers free up, so only `max_pending` files are in flight at once
+        results = []
+        pending = set()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="loader") as executor:
+            for file_path in files:
+                if len(pending) >= self.max_pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    results.extend(future.result() for future in done)
+                pending.add(executor.submit(self.process_file, file_path))
+            results.extend(future.result() for future in wait(pending)[0])
+        # Report in file order regardless of completion order
+        order = {file_path: index for index, file_path in enumerate(files)}
+        return sorted(results, key=lambda result: order[result["file"]])
+
+    @staticmethod
+    def _log_summary(results, elapsed):
+        if not results:
+            logger.info("No JSON files found to load")
+            return
+        logger.info("Load summary:")
+        for result in results:
+            status = "ok" if result["ok"] else "FAILED"
+            retracted = f", {result['retracted']} relationships retracted" if "retracted" in result else ""
+            logger.info(f"  {os.path.basename(result['file'])}: {status}, {result['rows']} rows{retracted} in {result['seconds']:.2f}s")
+        rows = sum(result["rows"] for result in results)
+        failed = sum(1 for result in results if not result["ok"])
+        logger.info(
+            f"Loaded {rows} rows from {len(results) - failed}/{len(results)} files in {elapsed:.2f}s "
+            f"({rows / elapsed if elapsed else 0:.0f} rows/s)"
+        )
     
     def process_file(self, file_path):
-        """Process a single JSON file"""
+        """Process a single JSON file and return its file name, status, row count and duration"""
+        start = time.perf_counter()
+        written = None
         try:
             logger.info(f"Processing file: {file_path}")
-            with open(file_path, 'r') as f:
-                chemicals_data_json = json.load(f)
-            
-            self.database.upload_data(chemicals_data_json)
-            return True
+            # JSON Lines files are streamed from disk to the database in batches
+            written = self.database.upload_chemicals(self.index.filter(read_chemicals(file_path)))
         except Exception as e:
             logger.error(f"Error processing {file_path}: {e}")
-            return False
+        return {
+            "file": file_path,
+            "ok": written is not None,
+            "rows": written or 0,
+            "seconds": time.perf_counter() - start
+        }
 
 
 def main():
@@ -164,12 +711,18 @@ def main():
         Configuration.verify_connectivity(config["neo4j_uri"], config["neo4j_auth"])
         
         # Create database connection
-        db = ChemicalDatabase(config["neo4j_uri"], config["neo4j_auth"])
+        db = ChemicalDatabase(config["neo4j_uri"], config["neo4j_auth"], batch_size=config["batch_size"])
         
         try:
+            # Make sure every MERGE is backed by an index before loading
+            db.ensure_schema()
+
             # Create file processor and process files
-            processor = FileProcessor(db)
-            processor.process_jsons(config["json_paths"])
+            processor = FileProcessor(db, workers=config["load_workers"])
+            if config["load_mode"] == "full":
+                processor.process_jsons(config["json_paths"])
+            else:
+                processor.sync_jsons(config["json_paths"])
         finally:
             # Ensure database connection is closed
             db.close()
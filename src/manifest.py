@@ -0,0 +1,259 @@
+import hashlib
+import json
+import logging
+import os
+import time
+
+# Bookkeeping for resumable, incremental preprocessing.
+# The manifest stores a content hash and the status of every input file, so
+# unchanged files are skipped on the next run. Each file in progress has an
+# append-only checkpoint with the chemicals of every completed page/chunk, so an
+# interrupted run resumes from the last completed unit.
+#
+# Everything lives in a hidden `.preprocess` folder inside the output folder,
+# so the loader (which only lists *.json files at the top level) ignores it.
+# The loader keeps its own sync state (what was last written to the graph) there too.
+
+STATE_FOLDER = ".preprocess"
+GRAPH_SYNC_FILE = "graph_sync.json"
+GRAPH_ROWS_FOLDER = "graph_rows"  # Rows of the synced files, one file per row-set digest
+
+
+def file_fingerprint(path, block_size=1024 * 1024):
+    """SHA-256 of the file content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cached_fingerprint(entry, path):
+    # Reuse the stored hash if size and mtime are unchanged
+    stat = os.stat(path)
+    if entry and entry.get("size") == stat.st_size and entry.get("mtime") == stat.st_mtime:
+        return entry["fingerprint"]
+    return file_fingerprint(path)
+
+
+def rows_digest(rows):
+    """Order-independent SHA-256 of a set of row tuples"""
+    payload = json.dumps(sorted(rows), ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _atomic_write_json(path, data):
+    # Write to a temporary file and rename, so a crash never leaves a half-written file behind
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+class Checkpoint:
+    """Append-only log of the completed units (pages or chunks) of one input file"""
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """Return {unit: chemicals} for all completed units"""
+        return dict(self.records())
+
+    def records(self):
+        """Yield (unit, chemicals) of the completed units one at a time"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line may be truncated if the process was killed while writing it
+                    logging.warning(f"Ignoring incomplete checkpoint record in {self.path}")
+                    continue
+                yield record["unit"], record["chemicals"]
+
+    def append(self, unit, chemicals):
+        """Record a completed unit; flushed to disk before returning"""
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps({"unit": unit, "chemicals": chemicals}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def remove(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Manifest:
+    """Content hashes and processing status of all input files of an output folder"""
+    def __init__(self, output_folder):
+        self.folder = os.path.join(output_folder, STATE_FOLDER)
+        if not os.path.exists(self.folder):
+            os.makedirs(self.folder)
+        self.path = os.path.join(self.folder, "manifest.json")
+        self.files = {}
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.files = json.load(f).get("files", {})
+
+    def save(self):
+        _atomic_write_json(self.path, {"files": self.files})
+
+    def fingerprint(self, input_path):
+        """Content hash of an input file; reuses the stored hash if size and mtime are unchanged"""
+        return _cached_fingerprint(self.files.get(input_path), input_path)
+
+    def is_complete(self, input_path, fingerprint, output_path):
+        """True if the file was fully processed with the same content and its output still exists"""
+        entry = self.files.get(input_path)
+        return (
+            entry is not None
+            and entry.get("status") == "complete"
+            and entry.get("fingerprint") == fingerprint
+            and os.path.exists(output_path)
+        )
+
+    def checkpoint(self, name):
+        return Checkpoint(os.path.join(self.folder, name + ".checkpoint.jsonl"))
+
+    def start(self, input_path, fingerprint, name, total_units=None, plan=None):
+        """
+        Mark a file as in progress and return its checkpoint.
+
+        `plan` describes how the file is split into units (e.g. the packing settings).
+        If the file content or the plan changed since the last run, the stale checkpoint is discarded.
+        """
+        checkpoint = self.checkpoint(name)
+        entry = self.files.get(input_path)
+        if entry is None or entry.get("fingerprint") != fingerprint or entry.get("plan") != plan:
+            checkpoint.remove()
+        stat = os.stat(input_path)
+        self.files[input_path] = {
+            "fingerprint": fingerprint,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "status": "in_progress",
+            "total_units": total_units,
+            "plan": plan,
+            "started_at": time.time()
+        }
+        self.save()
+        return checkpoint
+
+    def finish(self, input_path, name, output_path, total_units=None):
+        """Mark a file as complete and drop its checkpoint"""
+        entry = self.files[input_path]
+        if total_units is not None:
+            entry["total_units"] = total_units  # Streamed inputs only know their size at the end
+        entry["status"] = "complete"
+        entry["output"] = output_path
+        entry["completed_at"] = time.time()
+        self.save()
+        self.checkpoint(name).remove()
+
+
+class GraphSyncState:
+    """
+    Fingerprint, row-set digest and rows of every processed file as last written to the graph.
+
+    The stored rows are what allows the loader to compute removed pairs of a re-extracted file.
+    `version` identifies how rows are derived from a file; after a change every file is synced
+    again, even if its content did not change.
+
+    The state file only holds the digest of every file's rows; the rows are stored once per digest
+    in GRAPH_ROWS_FOLDER, so syncing one file does not rewrite the rows of all others.
+    """
+    def __init__(self, json_folder, version=None):
+        self.folder = os.path.join(json_folder, STATE_FOLDER)
+        self.rows_folder = os.path.join(self.folder, GRAPH_ROWS_FOLDER)
+        if not os.path.exists(self.rows_folder):
+            os.makedirs(self.rows_folder)
+        self.path = os.path.join(self.folder, GRAPH_SYNC_FILE)
+        self.version = version
+        self.files = {}
+        self.stale = False
+        self._rows = {}  # digest -> rows, loaded on first use
+        if os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.files = data.get("files", {})
+            self.stale = data.get("version") != version
+            # States written before the rows were stored separately
+            inline = [entry for entry in self.files.values() if "rows" in entry]
+            for entry in inline:
+                self._write_rows(entry["digest"], {tuple(row) for row in entry.pop("rows")})
+            if inline:
+                self.save()
+
+    def save(self):
+        _atomic_write_json(self.path, {"version": self.version, "files": self.files})
+
+    def _rows_path(self, digest):
+        return os.path.join(self.rows_folder, digest + ".json")
+
+    def _write_rows(self, digest, rows):
+        if not os.path.exists(self._rows_path(digest)):
+            _atomic_write_json(self._rows_path(digest), sorted(rows))
+        self._rows[digest] = frozenset(rows)
+
+    def _read_rows(self, digest):
+        if digest not in self._rows:
+            with open(self._rows_path(digest), 'r', encoding='utf-8') as f:
+                self._rows[digest] = frozenset(tuple(row) for row in json.load(f))
+        return self._rows[digest]
+
+    def _drop_unused_rows(self, digest):
+        # Row sets are shared by files with the same rows, so they are only deleted once no file uses them
+        if all(entry["digest"] != digest for entry in self.files.values()):
+            self._rows.pop(digest, None)
+            if os.path.exists(self._rows_path(digest)):
+                os.remove(self._rows_path(digest))
+
+    def fingerprint(self, json_path):
+        return _cached_fingerprint(self.files.get(json_path), json_path)
+
+    def is_synced(self, json_path, fingerprint):
+        entry = self.files.get(json_path)
+        return not self.stale and entry is not None and entry.get("fingerprint") == fingerprint
+
+    def rows(self, json_path):
+        """Rows of a file as last synced, as a set of tuples"""
+        entry = self.files.get(json_path)
+        return set(self._read_rows(entry["digest"])) if entry else set()
+
+    def other_rows(self, json_path):
+        """Rows of all other synced files"""
+        rows = set()
+        for path, entry in self.files.items():
+            if path != json_path:
+                rows.update(self._read_rows(entry["digest"]))
+        return rows
+
+    def all_rows(self):
+        return self.other_rows(None)
+
+    def update(self, json_path, fingerprint, rows):
+        """Record the rows now in the graph for a file and save the state"""
+        stat = os.stat(json_path)
+        digest = rows_digest(rows)
+        # The rows are written before the state that refers to them, so a crash never leaves a dangling digest
+        self._write_rows(digest, rows)
+        previous = self.files.get(json_path)
+        self.files[json_path] = {
+            "fingerprint": fingerprint,
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "digest": digest,
+            "regulations": sorted({row[3] for row in rows}),
+            "synced_at": time.time()
+        }
+        self.save()
+        if previous and previous["digest"] != digest:
+            self._drop_unused_rows(previous["digest"])
+
+    def remove(self, json_path):
+        previous = self.files.pop(json_path, None)
+        self.save()
+        if previous:
+            self._drop_unused_rows(previous["digest"])
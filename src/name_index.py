@@ -0,0 +1,285 @@
+import argparse
+import heapq
+import logging
+import os
+import re
+import unicodedata
+from collections import Counter
+
+from cas import CAS_PATTERN, is_valid_cas
+from pair_validation import MISSING, MISSING_CAS, MISSING_NAME, normalize_cas, normalize_missing
+
+# Fuzzy index of known chemical names and their CAS numbers.
+# The same chemical is extracted under many spellings ("CHF2Cl (HCFC-22)",
+# "HCFC-22", "hcfc 22"). Every name is indexed under normalized aliases (case,
+# accents and punctuation removed; the parts inside and outside parentheses
+# separately) in an inverted index of character trigrams. A lookup counts the
+# trigrams a query shares with each alias and ranks aliases by Jaccard
+# similarity, so only aliases sharing a trigram with the query are scored.
+#
+# Used to fill missing CAS numbers (and names) of extracted pairs locally before
+# they go to the validation prompt, and by app.py to resolve chemical names in
+# questions to their CAS number and synonyms before querying the graph.
+#
+# Usage:
+#   python src/name_index.py data/processed/uploaded "HCFC 22" "Freon 11"
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+DIGITS_PATTERN = re.compile(r"\d+")
+PARENTHESES = re.compile(r"\(([^()]*)\)")
+# Question words that never identify a chemical on their own
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "by", "cas", "chemical", "chemicals", "cover", "covered", "covers", "does",
+    "for", "have", "in", "is", "it", "its", "known", "list", "name", "names", "number", "of", "or", "regulated",
+    "regulation", "regulations", "show", "the", "under", "what", "which", "who", "with"
+}
+
+# Names of the graph with their CAS number, if any
+NAME_INDEX_QUERY = """
+MATCH (cn:ChemicalName)
+OPTIONAL MATCH (cn)-[:IS_NAME_OF]->(c:Chemical)
+RETURN cn.name AS name, c.cas AS cas
+"""
+
+
+def normalize_name(name):
+    """Lowercase ASCII tokens of a name: "Chloro-difluoromethane (HCFC–22)" -> "chloro difluoromethane hcfc 22" """
+    text = unicodedata.normalize("NFKD", name)
+    text = "".join(char for char in text if not unicodedata.combining(char)).casefold()
+    return " ".join(TOKEN_PATTERN.findall(text))
+
+
+def name_aliases(name):
+    """Normalized forms a name is found under: the whole name and its parts inside and outside parentheses"""
+    aliases = {normalize_name(name), normalize_name(PARENTHESES.sub(" ", name))}
+    aliases.update(normalize_name(part) for part in PARENTHESES.findall(name))
+    return {alias for alias in aliases if alias}
+
+
+def trigrams(key):
+    """Character trigrams of a normalized name, padded so short names and word boundaries count"""
+    padded = f"  {key} "
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+class NameIndex:
+    """Trigram index of chemical names for top-k similarity lookups and CAS resolution"""
+    def __init__(self):
+        self.names = []  # name id -> name as first seen
+        self._name_ids = {}
+        self._name_cas = []  # name id -> Counter of CAS numbers
+        self._cas_names = {}  # CAS number -> set of name ids
+        self._keys = {}  # alias -> alias id
+        self._key_names = []  # alias id -> set of name ids
+        self._key_sizes = []  # alias id -> number of trigrams
+        self._postings = {}  # trigram -> list of alias ids
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, cas=None):
+        """Add a name, optionally with a CAS number it is known to belong to"""
+        name = normalize_missing(name)
+        cas = normalize_cas(cas)
+        if name == MISSING:
+            return
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            name_id = self._name_ids[name] = len(self.names)
+            self.names.append(name)
+            self._name_cas.append(Counter())
+            for alias in name_aliases(name):
+                self._add_alias(alias, name_id)
+        if cas != MISSING and is_valid_cas(cas):
+            self._name_cas[name_id][cas] += 1
+            self._cas_names.setdefault(cas, set()).add(name_id)
+
+    def _add_alias(self, alias, name_id):
+        key_id = self._keys.get(alias)
+        if key_id is None:
+            key_id = self._keys[alias] = len(self._key_names)
+            self._key_names.append(set())
+            grams = trigrams(alias)
+            self._key_sizes.append(len(grams))
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(key_id)
+        self._key_names[key_id].add(name_id)
+
+    def add_chemicals(self, chemicals):
+        """Add the names (and CAS numbers) of chemical dictionaries"""
+        for chemical in chemicals:
+            self.add(chemical.get("chemical_name"), chemical.get("CAS"))
+
+    @classmethod
+    def from_files(cls, folder):
+        """Index of the names of all processed files of a folder"""
+        from chemical_records import is_chemical_file, read_chemicals
+
+        index = cls()
+        if os.path.isdir(folder):
+            for file in sorted(os.listdir(folder)):
+                if is_chemical_file(file):
+                    index.add_chemicals(read_chemicals(os.path.join(folder, file)))
+        return index
+
+    def _scores(self, key):
+        """name id -> best similarity of any of its aliases to a normalized query"""
+        scores = {}
+        key_id = self._keys.get(key)
+        if key_id is not None:
+            for name_id in self._key_names[key_id]:
+                scores[name_id] = 1.0
+        grams = trigrams(key)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self._postings.get(gram, ()))
+        for key_id, count in shared.items():
+            score = count / (len(grams) + self._key_sizes[key_id] - count)
+            for name_id in self._key_names[key_id]:
+                if score > scores.get(name_id, 0.0):
+                    scores[name_id] = score
+        return scores
+
+    def search(self, query, k=5, min_score=0.0):
+        """Top-k (name, score) pairs for a query, best first; score 1.0 is an exact match of an alias"""
+        key = normalize_name(query)
+        if not key:
+            return []
+        scores = self._scores(key)
+        best = heapq.nlargest(k, scores.items(), key=lambda item: (item[1], -item[0]))
+        return [(self.names[name_id], score) for name_id, score in best if score >= min_score]
+
+    def search_many(self, queries, k=5, min_score=0.0):
+        """search() for many queries at once; queries with the same normalized form are only scored once"""
+        results = {}
+        by_key = {}
+        for query in queries:
+            key = normalize_name(query)
+            if key not in by_key:
+                by_key[key] = self.search(query, k, min_score) if key else []
+            results[query] = by_key[key]
+        return results
+
+    def cas_of(self, name):
+        """CAS numbers recorded for a name, most frequent first"""
+        name_id = self._name_ids.get(normalize_missing(name))
+        return [cas for cas, _ in self._name_cas[name_id].most_common()] if name_id is not None else []
+
+    def names_of(self, cas):
+        """Names recorded for a CAS number"""
+        return sorted(self.names[name_id] for name_id in self._cas_names.get(normalize_cas(cas), ()))
+
+    def resolve_cas(self, name, min_score=0.9):
+        """
+        CAS number of a name, or None if it is unknown or ambiguous.
+
+        All names scoring at least `min_score` that have a CAS number must agree on the same one.
+        Numbers are significant ("HCFC-22" is not "HCFC-222"), so candidates must contain the same ones.
+        """
+        key = normalize_name(name)
+        if not key:
+            return None
+        digits = DIGITS_PATTERN.findall(key)
+        candidates = set()
+        for name_id, score in self._scores(key).items():
+            if score >= min_score and self._name_cas[name_id] and any(
+                DIGITS_PATTERN.findall(alias) == digits for alias in name_aliases(self.names[name_id])
+            ):
+                candidates.add(self._name_cas[name_id].most_common(1)[0][0])
+        return candidates.pop() if len(candidates) == 1 else None
+
+    def resolve_name(self, cas):
+        """Most frequent name recorded for a CAS number, or None"""
+        counts = Counter()
+        for name_id in self._cas_names.get(normalize_cas(cas), ()):
+            counts[self.names[name_id]] = self._name_cas[name_id][normalize_cas(cas)]
+        return min(counts, key=lambda name: (-counts[name], name)) if counts else None
+
+    def find_names(self, text, min_score=0.85, max_words=8):
+        """
+        Chemical names mentioned in free text, as (mention, name, score) tuples.
+
+        Every window of up to `max_words` words is looked up in one bulk query; the best
+        non-overlapping windows scoring at least `min_score` are returned in text order.
+        """
+        words = text.split()
+        windows = {}
+        for start in range(len(words)):
+            for end in range(start + 1, min(start + max_words, len(words)) + 1):
+                mention = " ".join(words[start:end]).strip(" ?!.,;:\"'")
+                tokens = normalize_name(mention).split()
+                # Windows of question words only, or of a bare CAS number, are not names
+                if not tokens or all(token in STOP_WORDS for token in tokens) or CAS_PATTERN.fullmatch(mention):
+                    continue
+                if len("".join(tokens)) >= 3:
+                    windows[(start, end)] = mention
+        hits = self.search_many(windows.values(), k=1, min_score=min_score)
+        ranked = sorted(
+            ((hits[mention][0][1], end - start, start, end, mention) for (start, end), mention in windows.items() if hits[mention]),
+            key=lambda item: (-item[0], -item[1], item[2])
+        )
+        taken = set()
+        found = []
+        for score, _, start, end, mention in ranked:
+            if taken.isdisjoint(range(start, end)):
+                taken.update(range(start, end))
+                found.append((start, mention, hits[mention][0][0], score))
+        return [(mention, name, score) for _, mention, name, score in sorted(found)]
+
+
+def question_hints(question, index, max_synonyms=5):
+    """
+    "<mention> is CAS <number>, also known as <synonyms>" hints for the chemical names in a question.
+
+    Used by app.py to add the CAS numbers and synonyms of mentioned chemicals to the question.
+    """
+    hints = []
+    for mention, name, score in index.find_names(question):
+        cas_numbers = index.cas_of(name)
+        if cas_numbers:
+            synonyms = [other for cas in cas_numbers for other in index.names_of(cas)
+                        if normalize_name(other) != normalize_name(mention)][:max_synonyms]
+            hint = f"{mention} is CAS {' or '.join(cas_numbers)}"
+            hints.append(hint + (f", also known as {', '.join(synonyms)}" if synonyms else ""))
+    return hints
+
+
+def resolve_pairs(chemicals, index, min_score=0.9):
+    """
+    Fill missing CAS numbers and names of extracted pairs from the index.
+
+    Pairs flagged for repair because only their CAS number (or only their name) is missing are
+    completed if the index resolves them unambiguously; their repair flag is removed, so they do
+    not go to the validation prompt. Returns the number of resolved pairs.
+    """
+    resolved = 0
+    for chemical in chemicals:
+        if chemical.get("repair") == MISSING_CAS:
+            cas = index.resolve_cas(chemical["chemical_name"], min_score)
+            if cas:
+                chemical["CAS"] = cas
+                del chemical["repair"]
+                resolved += 1
+        elif chemical.get("repair") == MISSING_NAME:
+            name = index.resolve_name(chemical["CAS"])
+            if name:
+                chemical["chemical_name"] = name
+                del chemical["repair"]
+                resolved += 1
+    return resolved
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Look up chemical names in the processed files")
+    parser.add_argument("folder", help="Folder with processed .jsonl/.json files")
+    parser.add_argument("queries", nargs="+")
+    parser.add_argument("-k", type=int, default=5)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    index = NameIndex.from_files(args.folder)
+    logging.info(f"Indexed {len(index)} names")
+    for query, hits in index.search_many(args.queries, k=args.k).items():
+        print(f"{query}: CAS {index.resolve_cas(query) or 'unresolved'}")
+        for name, score in hits:
+            print(f"  {score:.2f}  {name}  {', '.join(index.cas_of(name))}")
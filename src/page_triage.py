@@ -0,0 +1,114 @@
+import hashlib
+import json
+import logging
+import re
+import time
+
+from cas import find_cas_numbers
+
+# Local pre-filter that decides whether a page (or CSV record group) is worth an
+# LLM request. Tables of contents, preambles and signature pages usually contain
+# neither CAS numbers nor chemical names, and the extraction prompt just answers
+# "N/A,N/A" for them.
+#
+# Each segment gets a score from CAS numbers with a valid check digit and from
+# lexical chemical-name heuristics; segments below the threshold are skipped.
+# In audit mode a deterministic sample of the skipped segments is sent to the LLM
+# anyway and logged with the pairs found, which measures the recall of the filter.
+
+# Fragments of systematic and trivial chemical names, e.g. "1,1,1,2-Tetrachloroethane"
+CHEMICAL_FRAGMENTS = re.compile(
+    r"chlor|fluor|brom|iodo|methyl|ethyl|propyl|butyl|phenyl|benzen|benzo|toluen|xylen|nitro|sulfon|sulph|"
+    r"phosph|cyan|amino|hydroxy|oxide|chloride|fluoride|bromide|sulfate|nitrate|carbonate|acetat|acrylat|phthal|"
+    r"mercur|arsen|cadmi|chromi|asbest|thio|carbam|ethane|ethene|ethylene|propane|butane|phenol|dioxin|furan",
+    re.IGNORECASE
+)
+# Locants ("2,4,5-T") and molecular formulas ("CHF2Cl", "C2HFCl4")
+CHEMICAL_NOTATION = re.compile(r"^(?:\d+(?:,\d+)*-[A-Za-z]|(?:[A-Z][a-z]?\d*){2,}$)")
+FORMULA_DIGIT = re.compile(r"[A-Z][a-z]?\d")
+# Words that indicate lists of regulated substances
+CHEMICAL_KEYWORDS = {
+    "cas", "salts", "esters", "isomers", "hcfc", "hcfcs", "cfc", "cfcs", "hfc", "hfcs", "pfas", "pcb", "pcbs",
+    "pesticide", "pesticides", "mercury", "lead", "cadmium"
+}
+WORD_PATTERN = re.compile(r"[A-Za-z0-9][A-Za-z0-9,()'\-]+")
+
+
+def is_chemical_word(word):
+    """Lexical heuristic for words that look like (parts of) chemical names"""
+    word = word.strip(",()'-")
+    if word.lower() in CHEMICAL_KEYWORDS or CHEMICAL_FRAGMENTS.search(word):
+        return True
+    # Formulas need at least one element followed by a digit, so plain words like "Annex" do not match
+    return bool(CHEMICAL_NOTATION.match(word)) and (word[0].isdigit() or bool(FORMULA_DIGIT.search(word)))
+
+
+def score_text(text, cas_weight=3.0, word_weight=0.5, max_word_score=3.0):
+    """Relevance score of a text: valid CAS numbers count most, chemical-looking words a little"""
+    cas_numbers = find_cas_numbers(text)
+    hits = sum(1 for word in WORD_PATTERN.findall(text) if is_chemical_word(word))
+    return cas_weight * len(cas_numbers) + min(max_word_score, hits * word_weight)
+
+
+class PageTriage:
+    """Filters segments (chunk_packer.Segment) before they are packed into LLM requests"""
+    def __init__(self, threshold=1.0, audit_rate=0.0, audit_path=None):
+        self.threshold = threshold
+        self.audit_rate = audit_rate  # Fraction of skipped segments that are sent to the LLM anyway
+        self.audit_path = audit_path
+        self.kept = 0
+        self.skipped = 0
+        self.audited = {}  # name -> {label: score} of the audited segments of the current run
+
+    def _sampled(self, name, label):
+        # Deterministic sample, so a re-run audits the same pages and hits the LLM cache
+        digest = hashlib.sha256(f"{name}:{label}".encode("utf-8")).digest()
+        return int.from_bytes(digest[:4], "big") / 2 ** 32 < self.audit_rate
+
+    def filter(self, segments, name):
+        """Yield the segments that should go to the LLM"""
+        for segment in segments:
+            score = score_text(segment.text)
+            if score >= self.threshold:
+                self.kept += 1
+                yield segment
+            elif self.audit_rate and self._sampled(name, segment.label):
+                self.skipped += 1
+                self.audited.setdefault(name, {})[segment.label] = score
+                yield segment
+            else:
+                self.skipped += 1
+                logging.debug(f"Triage skipped {name} {segment.label} (score {score:.2f})")
+
+    def report_audit(self, name, chemicals):
+        """Write the pairs found on audited (would-be skipped) segments to the audit log"""
+        audited = self.audited.pop(name, {})
+        if not audited or not self.audit_path:
+            return
+        # Single pass, so `chemicals` can be a stream read back from the output file
+        found_by_label = {label: [] for label in audited}
+        for chemical in chemicals:
+            if chemical.get("source") in found_by_label:
+                found_by_label[chemical["source"]].append(chemical)
+        with open(self.audit_path, 'a', encoding='utf-8') as f:
+            for label, score in audited.items():
+                found = found_by_label[label]
+                if found:
+                    logging.warning(f"Triage would have missed {len(found)} pairs on {name} {label} (score {score:.2f})")
+                f.write(json.dumps({
+                    "file": name,
+                    "source": label,
+                    "score": score,
+                    "pairs_found": len(found),
+                    "pairs": [[c.get("chemical_name"), c.get("CAS")] for c in found],
+                    "audited_at": time.time()
+                }) + "\n")
+
+    def stats(self):
+        total = self.kept + self.skipped
+        return {
+            "kept": self.kept,
+            "skipped": self.skipped,
+            "skipped_share": self.skipped / total if total else 0.0,
+            "threshold": self.threshold
+        }
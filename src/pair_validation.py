@@ -0,0 +1,81 @@
+import re
+
+from cas import CAS_PATTERN, is_valid_cas
+
+# Local validation and normalisation of extracted "chemical_name $ CAS" pairs.
+# Most pairs returned by the extraction prompt are already well-formed, with a
+# CAS number that passes the check digit test. Only pairs that actually need
+# repair (missing or invalid CAS, missing name, grouped names) are sent to the
+# validation prompt, batched per document.
+
+MISSING = "N/A"
+MISSING_VALUES = {"", "na", "n/a", "n.a.", "n. a.", "-", "--", "none", "null", "unknown", "not available"}
+
+# Names that refer to a group of chemicals, e.g. "2,4,5-T and its salts and esters".
+# A class name with a single CAS number ("Mercury compounds $ 7439-97-6") is a valid pair.
+GROUPED_NAME = re.compile(
+    r"\b(?:and\s+)?(?:its|their)\s+(?:salts|esters|isomers|derivatives|compounds)\b"
+    r"|\bsalts\s+and\s+esters\b|\ball\s+isomers\b|\bmixtures?\s+of\b",
+    re.IGNORECASE
+)
+
+# Problems that need the validation prompt
+MISSING_CAS = "missing_cas"
+MISSING_NAME = "missing_name"
+INVALID_CAS = "invalid_cas"
+GROUPED = "grouped_name"
+GARBLED = "garbled_name"  # Formula with sub- and superscripts flattened into the name (table pairs, see table_extraction.py)
+EMPTY = "empty"
+
+
+def normalize_missing(value):
+    """Collapse whitespace and map all spellings of "not available" to N/A"""
+    value = " ".join((value or "").split()).strip("\"'")
+    return MISSING if value.lower() in MISSING_VALUES else value
+
+
+def normalize_cas(cas):
+    """Normalise dashes, spaces and zero-padding of a CAS number ("0000050-00-0" -> "50-00-0")"""
+    cas = normalize_missing(cas)
+    if cas == MISSING:
+        return cas
+    cas = re.sub(r"[‐-―−]", "-", cas).replace(" ", "")
+    match = CAS_PATTERN.fullmatch(cas)
+    if match and len(match.group(1)) > 2:
+        cas = f"{int(match.group(1)):02d}-{match.group(2)}-{match.group(3)}"
+    return cas
+
+
+def validate_pair(name, cas):
+    """
+    Normalise a pair and check whether it needs repair.
+
+    Returns (name, cas, problem); problem is None for pairs that can be used as they are.
+    """
+    name = normalize_missing(name)
+    cas = normalize_cas(cas)
+    if name == MISSING and cas == MISSING:
+        return name, cas, EMPTY
+    if cas != MISSING and not is_valid_cas(cas):
+        return name, cas, INVALID_CAS
+    if name == MISSING:
+        return name, cas, MISSING_NAME
+    if GROUPED_NAME.search(name):
+        return name, cas, GROUPED
+    if cas == MISSING:
+        return name, cas, MISSING_CAS
+    return name, cas, None
+
+
+def attribute_repaired(repaired, originals):
+    """Carry the source of the original pairs over to the repaired pairs with the same name or CAS"""
+    sources = {}
+    for chemical in originals:
+        for key in (chemical["chemical_name"].lower(), chemical["CAS"]):
+            if key != MISSING.lower() and key != MISSING and chemical.get("source"):
+                sources.setdefault(key, chemical["source"])
+    for chemical in repaired:
+        source = sources.get(chemical["chemical_name"].lower()) or sources.get(chemical["CAS"])
+        if source:
+            chemical["source"] = source
+    return repaired
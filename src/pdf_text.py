@@ -0,0 +1,328 @@
+import argparse
+import itertools
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from chunk_packer import Segment
+
+# Page text extraction for the PDF preprocessing.
+# Every worker (and every thread of the calling process) keeps the document it is working on open, so the xref table and
+# font resources of a large OJ/CELEX document are parsed once per worker instead
+# of once per page. With more than one worker, ranges of pages are extracted in a
+# process pool; pages are still yielded one at a time in page order, so triage
+# and packing start before the last page is extracted.
+#
+# Page texts are cached in SQLite by (file hash, page number). A document whose
+# pages are all cached is served without importing PyMuPDF at all.
+#
+# With `tables=True` the cells of the tables PyMuPDF detects on every page are
+# extracted (and cached) as well, for the table mode of table_extraction.py.
+# Table detection costs about 50 times as much as the page text, so it runs in
+# the pool workers too.
+#
+# Usage:
+#   python src/pdf_text.py stats
+#   python src/pdf_text.py extract data/raw/uploaded/montreal_2020.pdf --workers 4
+#   python src/pdf_text.py clear
+
+DEFAULT_TEXT_CACHE_PATH = os.path.join("data", "cache", "page_text.sqlite")
+
+# Page text with the tables detected on the page: [{"header": [...], "rows": [[cell, ...], ...]}, ...]
+# Cells are strings, or None for cells covered by a merged cell
+Page = namedtuple("Page", ["label", "text", "tables"])
+
+# Document opened by this thread (pool worker or a thread of the main process): path and document
+_local = threading.local()
+
+
+def open_document(path):
+    """The PyMuPDF document of a path, kept open for the next pages of the same file"""
+    if getattr(_local, "path", None) != path:
+        import fitz  # PyMuPDF for PDF handling
+
+        close_document()
+        _local.document = fitz.open(path)
+        _local.path = path
+    return _local.document
+
+
+def close_document():
+    if getattr(_local, "path", None) is not None:
+        _local.document.close()
+        _local.path = _local.document = None
+
+
+def _init_worker():
+    # A forked worker must not use the document its parent had open: both would share the file offset
+    global _local
+    _local = threading.local()
+
+
+def detect_tables(page):
+    """Header and data rows of the tables PyMuPDF finds on a page"""
+    tables = []
+    for table in page.find_tables().tables:
+        rows = table.extract()
+        if not table.header.external:
+            rows = rows[1:]  # The header is the first row of the table
+        tables.append({"header": table.header.names, "rows": rows})
+    return tables
+
+
+def extract_page_range(path, start, stop, tables=False):
+    """Texts (or (text, tables) tuples) of the pages start..stop-1; runs in pool workers"""
+    document = open_document(path)
+    pages = (document.load_page(page_number) for page_number in range(start, stop))
+    if tables:
+        return [(page.get_text(), detect_tables(page)) for page in pages]
+    return [page.get_text() for page in pages]
+
+
+def page_label(page_number):
+    return f"page {page_number + 1}"
+
+
+def page_number(label):
+    """Page number of a page label, also of the parts of a split page ("page 3 (part 1/2)")"""
+    return int(re.match(r"page (\d+)", label).group(1)) - 1
+
+
+class PageTextCache:
+    """SQLite cache of page texts, keyed by the content hash of the PDF and the page number"""
+    def __init__(self, path=DEFAULT_TEXT_CACHE_PATH):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()  # The connection is shared between threads
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                fingerprint TEXT PRIMARY KEY,
+                page_count INTEGER NOT NULL,
+                created REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                fingerprint TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                text TEXT NOT NULL,
+                PRIMARY KEY (fingerprint, page)
+            )
+        """)
+        # Detected tables are cached separately, so documents cached without them stay valid
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS table_documents (
+                fingerprint TEXT PRIMARY KEY,
+                page_count INTEGER NOT NULL,
+                created REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS page_tables (
+                fingerprint TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                tables TEXT NOT NULL,
+                PRIMARY KEY (fingerprint, page)
+            )
+        """)
+        self._conn.commit()
+
+    def page_count(self, fingerprint, tables=False):
+        """Number of pages of a fully cached document (with its tables if `tables`), or None"""
+        documents = "table_documents" if tables else "documents"
+        with self._lock:
+            row = self._conn.execute(f"SELECT page_count FROM {documents} WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def pages(self, fingerprint):
+        """Yield the texts of a fully cached document in page order"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT text FROM pages WHERE fingerprint = ? ORDER BY page", (fingerprint,)
+            ).fetchall()
+        for (text,) in rows:
+            yield text
+
+    def tables(self, fingerprint):
+        """Yield the detected tables of a document cached with its tables, in page order"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT tables FROM page_tables WHERE fingerprint = ? ORDER BY page", (fingerprint,)
+            ).fetchall()
+        for (tables,) in rows:
+            yield json.loads(tables)
+
+    def put_pages(self, fingerprint, first_page, texts, tables=None):
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages (fingerprint, page, text) VALUES (?, ?, ?)",
+                [(fingerprint, first_page + offset, text) for offset, text in enumerate(texts)]
+            )
+            if tables is not None:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO page_tables (fingerprint, page, tables) VALUES (?, ?, ?)",
+                    [(fingerprint, first_page + offset, json.dumps(page_tables)) for offset, page_tables in enumerate(tables)]
+                )
+            self._conn.commit()
+
+    def finish(self, fingerprint, page_count, tables=False):
+        """Mark a document as fully cached (with its tables if `tables`)"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (fingerprint, page_count, created) VALUES (?, ?, ?)",
+                (fingerprint, page_count, time.time())
+            )
+            if tables:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO table_documents (fingerprint, page_count, created) VALUES (?, ?, ?)",
+                    (fingerprint, page_count, time.time())
+                )
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            for table in ("pages", "documents", "page_tables", "table_documents"):
+                self._conn.execute(f"DELETE FROM {table}")
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            documents, = self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()
+            pages, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(LENGTH(text)), 0) FROM pages").fetchone()
+            table_documents, = self._conn.execute("SELECT COUNT(*) FROM table_documents").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "documents": documents, "pages": pages, "characters": size,
+                "table_documents": table_documents}
+
+    def close(self):
+        self._conn.close()
+
+
+class DocumentText:
+    """
+    Page texts of one PDF as a stream of chunk_packer.Segments (Pages if the extractor detects
+    tables); `page_count` is known up front
+    """
+    def __init__(self, extractor, path, fingerprint, page_count, cached):
+        self.extractor = extractor
+        self.path = path
+        self.fingerprint = fingerprint
+        self.page_count = page_count
+        self.cached = cached
+
+    def __iter__(self):
+        tables = self.extractor.tables
+        if self.cached:
+            pages = self.extractor.cache.pages(self.fingerprint)
+            if tables:
+                pages = zip(pages, self.extractor.cache.tables(self.fingerprint))
+        else:
+            pages = self.extractor._extract(self.path, self.fingerprint, self.page_count)
+        for page_number, page in enumerate(pages):
+            if tables:
+                yield Page(page_label(page_number), *page)
+            else:
+                yield Segment(page_label(page_number), page)
+
+
+class PageTextExtractor:
+    """
+    Extracts the page texts of PDFs, in a process pool if `workers` > 1.
+
+    Args:
+        workers (int): Processes extracting pages; 1 extracts in this process.
+        cache (PageTextCache): Optional cache of page texts; None always extracts.
+        pages_per_task (int): Pages per pool task. Each task reuses the document its worker has open.
+        tables (bool): Also detect the tables of every page; pages are then yielded as Pages.
+    """
+    def __init__(self, workers=1, cache=None, pages_per_task=8, tables=False):
+        self.workers = max(1, workers)
+        self.cache = cache
+        self.pages_per_task = pages_per_task
+        self.tables = tables
+        self._pool = None
+
+    def extract(self, path, fingerprint=None):
+        """DocumentText of a PDF; `fingerprint` (content hash, see manifest.py) enables the cache"""
+        if self.cache is not None and fingerprint is not None:
+            page_count = self.cache.page_count(fingerprint, self.tables)
+            if page_count is not None:
+                return DocumentText(self, path, fingerprint, page_count, cached=True)
+        return DocumentText(self, path, fingerprint, len(open_document(path)), cached=False)
+
+    def _ranges(self, page_count):
+        return [(start, min(start + self.pages_per_task, page_count)) for start in range(0, page_count, self.pages_per_task)]
+
+    def _extract(self, path, fingerprint, page_count):
+        ranges = self._ranges(page_count)
+        if self.workers == 1:
+            chunks = (extract_page_range(path, start, stop, self.tables) for start, stop in ranges)
+        else:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker)
+            # map() keeps the page order and hands out the ranges as workers become free
+            chunks = self._pool.map(extract_page_range, itertools.repeat(path), *zip(*ranges), itertools.repeat(self.tables)) if ranges else []
+        first_page = 0
+        for pages in chunks:
+            if self.cache is not None and fingerprint is not None:
+                if self.tables:
+                    self.cache.put_pages(fingerprint, first_page, [text for text, _ in pages], [tables for _, tables in pages])
+                else:
+                    self.cache.put_pages(fingerprint, first_page, pages)
+            first_page += len(pages)
+            yield from pages
+        if self.cache is not None and fingerprint is not None:
+            self.cache.finish(fingerprint, page_count, self.tables)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        close_document()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract PDF page texts and maintain the page text cache")
+    parser.add_argument("--path", default=os.getenv("PDF_TEXT_CACHE_PATH", DEFAULT_TEXT_CACHE_PATH))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="Show cache statistics")
+    subparsers.add_parser("clear", help="Remove all cached page texts")
+    extract_parser = subparsers.add_parser("extract", help="Extract (and cache) the pages of PDF files")
+    extract_parser.add_argument("files", nargs="+")
+    extract_parser.add_argument("--workers", type=int, default=int(os.getenv("PDF_TEXT_WORKERS", 1)))
+    extract_parser.add_argument("--tables", action="store_true", help="Also detect and cache the tables of every page")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    cache = PageTextCache(args.path)
+    if args.command == "stats":
+        print(json.dumps(cache.stats(), indent=4))
+    elif args.command == "clear":
+        cache.clear()
+    elif args.command == "extract":
+        from manifest import file_fingerprint
+
+        extractor = PageTextExtractor(args.workers, cache, tables=args.tables)
+        for file in args.files:
+            start = time.perf_counter()
+            document = extractor.extract(file, file_fingerprint(file))
+            characters = sum(len(segment.text) for segment in document)
+            logging.info(f"{file}: {document.page_count} pages, {characters} characters in {time.perf_counter() - start:.2f}s"
+                         f"{' (cached)' if document.cached else ''}")
+        extractor.close()
+    cache.close()
@@ -0,0 +1,605 @@
+import argparse
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+
+from chemical_records import ChemicalWriter, JSONL_SUFFIX, read_chemicals
+from chunk_packer import attribute_sources, get_token_counter, pack_segments
+from csv_chunker import iter_csv_segments
+from dedup_index import DedupIndex
+from llm_extraction import (
+    CSV_EXTRACTION_PROMPT, CSV_SYSTEM_PROMPT, CSV_VALIDATION_PROMPT, OPENAI_MODEL,
+    PDF_EXTRACTION_PROMPT, PDF_SYSTEM_PROMPT, PDF_VALIDATION_PROMPT,
+    is_error_response, parse_gpt_response_to_json, query_openai, repair_pairs
+)
+from manifest import GraphSyncState, Manifest, STATE_FOLDER
+from name_index import NameIndex, resolve_pairs
+from page_triage import PageTriage
+from pdf_text import DEFAULT_TEXT_CACHE_PATH, PageTextCache, PageTextExtractor
+from table_extraction import TableExtractor, in_page_order
+
+# End-to-end streaming pipeline: raw PDFs/CSVs -> LLM extraction -> parse/validate -> graph.
+# Instead of running preprocess_pdfs.py, preprocess_csvs.py and load_neo4j_data.py one after
+# another, the four stages run at the same time in thread pools connected by bounded queues:
+#
+#   files -> [extract] -> packs -> [llm] -> responses -> [parse] -> chemicals -> [load]
+#
+#   extract: PyMuPDF page text (see pdf_text.py) or streamed CSV record groups, triage and token-budget packing
+#   llm:     extraction prompt per pack (LLM cache first)
+#   parse:   local validation, name index, JSON Lines output and checkpoint, validation prompt
+#            for the pairs of a file that need repair once the file is complete
+#   load:    canonicalization, deduplication and batched UNWIND writes (see load_neo4j_data.py);
+#            once a file is complete, a sync of the file records its rows in the loader's sync state
+#            and writes whatever the streamed writes missed, and only then is the file marked complete
+#
+# A full queue blocks the stage that feeds it, so a slow stage throttles the stages before it
+# and memory stays bounded. Graph rows are written while later pages are still being extracted.
+# Output files, manifest and checkpoints are the same as those of the preprocessing scripts, so
+# both can be mixed and an interrupted pipeline run resumes like a script run.
+#
+# Usage:
+#   python src/pipeline.py --llm-workers 8 --load-workers 2
+#   python src/pipeline.py --no-load   # extraction only
+
+STOP = object()  # End of stream, one per worker of the receiving stage
+
+# kind -> (system prompt, extraction prompt, validation prompt)
+PROMPTS = {
+    "pdf": (PDF_SYSTEM_PROMPT, PDF_EXTRACTION_PROMPT, PDF_VALIDATION_PROMPT),
+    "csv": (CSV_SYSTEM_PROMPT, CSV_EXTRACTION_PROMPT, CSV_VALIDATION_PROMPT)
+}
+
+
+def input_plan(kind, token_budget, chunk_size, triage=None, tables=None):
+    """Checkpoint plan of an input file; the same as the preprocessing scripts', so checkpoints can be resumed by either"""
+    threshold = triage.threshold if triage else None
+    if kind == "pdf":
+        return f"pages:{token_budget}:{threshold}" + (":tables" if tables else "")
+    return f"records:{chunk_size}:{token_budget}:{threshold}"
+
+
+class FileJob:
+    """Progress of one input file through the pipeline"""
+    def __init__(self, path, kind, name, json_path):
+        self.path = path
+        self.kind = kind
+        self.name = name
+        self.json_path = json_path
+        self.lock = threading.Lock()
+        self.writer = None
+        self.checkpoint = None
+        self.to_repair = []  # Pairs that failed local validation, repaired once the file is complete
+        self.expected = None  # Number of packs, known once the extract stage reached the end of the file
+        self.ready = {}  # Chemicals of parsed packs waiting for an earlier pack (None: the request failed)
+        self.loaded = set()  # Graph rows of the file written by the load stage
+        self.next_order = 0  # First pack whose chemicals are not written yet
+        self.done = 0
+        self.failed = 0
+        self.finished = False
+        self.started = time.perf_counter()
+
+
+class PackJob:
+    """One LLM request; `chemicals` is already set for packs completed in an earlier run and for table pages (no pack)"""
+    def __init__(self, file, order, pack, chemicals=None):
+        self.file = file
+        self.order = order  # Position of the pack in the output file
+        self.pack = pack
+        self.chemicals = chemicals
+        self.response = None
+
+
+class FileEnd:
+    """Sent after the last pack of a file, so the parse stage can complete it, and after its last chemicals, so the load stage can sync it"""
+    def __init__(self, file, complete=False):
+        self.file = file
+        self.complete = complete  # All requests and the repair succeeded
+
+
+class Stage:
+    """
+    Pool of worker threads that take items from a bounded queue and put their results into the next.
+
+    `work(items)` is a generator over the results of a list of up to `max_batch` items. Putting a
+    result into a full queue blocks the worker; that time is counted as `blocked`.
+    """
+    def __init__(self, name, work, workers, inbox, outbox=None, max_batch=1):
+        self.name = name
+        self.work = work
+        self.workers = max(1, workers)
+        self.inbox = inbox
+        self.outbox = outbox
+        self.max_batch = max_batch
+        self.downstream = None  # Stage that receives the STOP markers when all workers are done
+        self.items_in = 0
+        self.items_out = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._running = 0
+        self._threads = []
+
+    def start(self):
+        self._running = self.workers
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._worker, name=f"{self.name}-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _next_items(self):
+        """Block for one item, then take what else is queued up to max_batch; None after STOP"""
+        item = self.inbox.get()
+        if item is STOP:
+            return None, True
+        items = [item]
+        while len(items) < self.max_batch:
+            try:
+                item = self.inbox.get_nowait()
+            except queue.Empty:
+                break
+            if item is STOP:
+                return items, True
+            items.append(item)
+        return items, False
+
+    def _worker(self):
+        stopped = False
+        while not stopped:
+            items, stopped = self._next_items()
+            if not items:
+                continue
+            start = time.perf_counter()
+            blocked = 0.0
+            produced = 0
+            try:
+                for result in self.work(items):
+                    if self.outbox is not None:
+                        put_start = time.perf_counter()
+                        self.outbox.put(result)
+                        blocked += time.perf_counter() - put_start
+                    produced += 1
+            except Exception:
+                logging.exception(f"Pipeline stage {self.name} failed on {len(items)} items")
+                with self._lock:
+                    self.errors += 1
+            with self._lock:
+                self.items_in += len(items)
+                self.items_out += produced
+                self.busy += time.perf_counter() - start - blocked
+                self.blocked += blocked
+        with self._lock:
+            self._running -= 1
+            last = self._running == 0
+        if last and self.downstream is not None:
+            for _ in range(self.downstream.workers):
+                self.downstream.inbox.put(STOP)
+
+
+class Pipeline:
+    """Runs the extract, llm, parse and load stages concurrently over the input files"""
+    def __init__(self, output_folder, client, cache=None, database=None, max_tokens=4000, token_budget=2000,
+                 chunk_size=15, triage=None, name_index=None, workers=None, queue_size=32, report_interval=10.0,
+                 text_extractor=None, tables=None):
+        """
+        Args:
+            output_folder (str): Folder for the JSON Lines output, manifest and checkpoints.
+            client (OpenAI): Synchronous OpenAI client; it is thread-safe and shared by the llm workers.
+            cache (LLMCache): Optional response cache shared with the preprocessing scripts.
+            database (ChemicalDatabase): Target database; None skips the load stage. Files are synced through the
+                loader's sync state (see load_neo4j_data.FileProcessor.sync_file), so a later sync run skips them.
+            workers (dict): Threads per stage ("extract", "llm", "parse", "load").
+            queue_size (int): Capacity of each queue between two stages.
+            report_interval (float): Seconds between progress logs.
+            text_extractor (PageTextExtractor): Source of the PDF page texts; defaults to in-thread extraction without cache.
+            tables (TableExtractor): Reads PDF pages with name/CAS tables without the LLM; the text extractor must detect tables.
+        """
+        self.output_folder = output_folder
+        self.client = client
+        self.cache = cache
+        self.database = database
+        self.max_tokens = max_tokens
+        self.token_budget = token_budget
+        self.chunk_size = chunk_size
+        self.triage = triage
+        self.name_index = name_index
+        self.workers = dict({"extract": 2, "llm": 8, "parse": 2, "load": 1}, **(workers or {}))
+        self.queue_size = queue_size
+        self.report_interval = report_interval
+        self.tables = tables
+        self.text_extractor = text_extractor or PageTextExtractor(tables=tables is not None)
+        self.count_tokens = get_token_counter(OPENAI_MODEL)
+        self.manifest = Manifest(output_folder)
+        self.dedup = DedupIndex()
+        self.loader = None
+        self.sync_state = None
+        if database:
+            from load_neo4j_data import ROW_FORMAT, FileProcessor
+
+            self.loader = FileProcessor(database, index=self.dedup)
+            self.sync_state = GraphSyncState(output_folder, version=ROW_FORMAT)
+            # Keep the spellings of names that are already in the graph
+            self.dedup.seed_names(row[1] for row in self.sync_state.all_rows())
+        self.rows_written = 0
+        self.files = []
+        self._manifest_lock = threading.Lock()  # Manifest and name index are not thread-safe
+        self._index_lock = threading.Lock()
+        self._rows_lock = threading.Lock()
+        self._sync_lock = threading.Lock()  # Sync state is not thread-safe and each delta depends on all other files
+
+    def _plan(self, kind):
+        return input_plan(kind, self.token_budget, self.chunk_size, self.triage, self.tables)
+
+    @staticmethod
+    def list_inputs(input_folders):
+        """(path, kind, regulation name) of the PDFs and CSVs of the input folders"""
+        inputs = []
+        for folder in input_folders:
+            for filename in sorted(os.listdir(folder)):
+                kind = os.path.splitext(filename)[1].lower().lstrip(".")
+                if kind in PROMPTS:
+                    # Same regulation names as the preprocessing scripts
+                    name = os.path.splitext(filename)[0].replace("+", "_").replace(",", "").replace(" ", "_")
+                    inputs.append((os.path.join(folder, filename), kind, name))
+        return inputs
+
+    # Extract stage: one input file -> PackJobs and a FileEnd
+    def _segments(self, job, fingerprint):
+        if job.kind == "pdf":
+            # Streamed page by page, in parallel and from the page text cache if configured (see pdf_text.py)
+            return self.text_extractor.extract(job.path, fingerprint)
+        return iter_csv_segments(job.path, self.chunk_size, self.token_budget, self.count_tokens)
+
+    def extract(self, jobs):
+        for job in jobs:
+            fingerprint = self.manifest.fingerprint(job.path)
+            with self._manifest_lock:
+                if self.manifest.is_complete(job.path, fingerprint, job.json_path):
+                    logging.info(f"Skipping unchanged file: {os.path.basename(job.path)}")
+                    continue
+
+            segments = self._segments(job, fingerprint)
+            table_chemicals = []  # Pairs of PDF pages read from their tables, see table_extraction.py
+            if job.kind == "pdf" and self.tables:
+                segments = self.tables.filter(segments, job.name, table_chemicals)
+            selected = self.triage.filter(segments, job.name) if self.triage else segments
+            # Streamed: the first packs are queried while later pages are still being extracted,
+            # so the number of packs is only known at the end of the file
+            packs = pack_segments(selected, self.token_budget, self.count_tokens)
+
+            with self._manifest_lock:
+                job.checkpoint = self.manifest.start(job.path, fingerprint, job.name, None, self._plan(job.kind))
+            completed = dict(job.checkpoint.records())
+            if completed:
+                logging.info(f"Resuming {job.name}: {len(completed)} requests already completed")
+            job.writer = ChemicalWriter(job.json_path, job.name)
+
+            count = 0
+            # Table pages are passed on in page order like packs completed in an earlier run, so they skip the LLM stage
+            for pack, chemicals in in_page_order(packs, table_chemicals):
+                yield PackJob(job, count, pack, chemicals if pack is None else completed.get(pack.index))
+                count += 1
+            if job.kind == "pdf" and self.tables:
+                self.tables.report(job.name)
+            with job.lock:
+                job.expected = count
+            yield FileEnd(job)
+
+    # LLM stage: extraction prompt for every pack that was not completed before
+    def query(self, items):
+        for item in items:
+            if isinstance(item, PackJob) and item.chemicals is None:
+                system_prompt, extraction_prompt, _ = PROMPTS[item.file.kind]
+                item.response = query_openai(self.client, self.cache, system_prompt, extraction_prompt,
+                                             item.pack.text, self.max_tokens)
+            yield item
+
+    # Parse stage: pairs of a response -> output file and load queue
+    def parse(self, items):
+        for item in items:
+            job = item.file
+            if isinstance(item, PackJob):
+                chemicals = item.chemicals
+                if chemicals is None:
+                    if is_error_response(item.response):
+                        chemicals = None  # Not checkpointed, retried on the next run
+                    else:
+                        chemicals = parse_gpt_response_to_json(item.response, job.name, [])
+                        attribute_sources(chemicals, item.pack)
+                        with job.lock:
+                            job.checkpoint.append(item.pack.index, chemicals)
+                written = self._write_in_order(job, item.order, chemicals)
+                if written:
+                    yield job, written
+            yield from self._finish(job)
+
+    def _write_in_order(self, job, order, chemicals):
+        """
+        Write the chemicals of a pack once all earlier packs of its file are written and return the usable pairs written.
+
+        Packs are parsed in completion order (several llm and parse workers, resumed runs); writing them in pack
+        order keeps the output the same on every run. The contiguous prefix is written right away.
+        """
+        written = []
+        with job.lock:
+            job.ready[order] = chemicals
+            while job.next_order in job.ready:
+                chemicals = job.ready.pop(job.next_order)
+                job.next_order += 1
+                if chemicals is None:
+                    job.failed += 1
+                valid = [chemical for chemical in chemicals or [] if "repair" not in chemical]
+                if self.name_index is not None:
+                    with self._index_lock:
+                        self.name_index.add_chemicals(valid)
+                job.to_repair.extend(chemical for chemical in chemicals or [] if "repair" in chemical)
+                job.writer.write(valid)
+                job.done += 1
+                written.extend(valid)
+        return written
+
+    def _finish(self, job):
+        """Repair and close a file once all of its packs are parsed; runs exactly once per file"""
+        with job.lock:
+            if job.finished or job.expected is None or job.done < job.expected:
+                return
+            job.finished = True
+
+        if self.name_index is not None and job.to_repair:
+            with self._index_lock:
+                resolved = resolve_pairs(job.to_repair, self.name_index)
+            logging.info(f"Resolved {resolved} of {len(job.to_repair)} pairs of {job.name} from the name index")
+        system_prompt, _, validation_prompt = PROMPTS[job.kind]
+        query = lambda text: query_openai(self.client, self.cache, system_prompt, validation_prompt, text, self.max_tokens)
+        repaired_list, repaired = repair_pairs(job.to_repair, job.name, query, self.count_tokens, self.token_budget)
+        job.writer.write(repaired_list)
+        job.writer.close()
+        if self.triage:
+            # Read back from the output once it is complete and closed, with the repaired pairs
+            self.triage.report_audit(job.name, read_chemicals(job.json_path))
+
+        complete = not job.failed and repaired
+        if not complete:
+            logging.warning(f"{job.failed} requests of {job.name} failed and will be retried on the next run")
+        logging.info(f"Processed {job.name}: {job.writer.count} pairs in {time.perf_counter() - job.started:.1f}s")
+        if not self.database:
+            if complete:
+                self._complete(job)
+            return
+        if repaired_list:
+            yield job, repaired_list
+        yield FileEnd(job, complete)
+
+    def _complete(self, job):
+        with self._manifest_lock:
+            self.manifest.finish(job.path, job.name, job.json_path, job.expected)
+
+    # Load stage: (file, chemicals) batches of any file -> graph; FileEnd -> sync of the complete file
+    def load(self, items):
+        batches = [item for item in items if not isinstance(item, FileEnd)]
+        if batches:
+            self._write_batches(batches)
+        for item in items:
+            if isinstance(item, FileEnd):
+                self._sync(item)
+        return iter(())
+
+    def _write_batches(self, batches):
+        chemicals = {}
+        for job, batch in batches:
+            chemicals.setdefault(job, []).extend(self.dedup.filter(batch, across_files=True))
+        written = self.database.upload_chemicals(itertools.chain.from_iterable(chemicals.values()))
+        if written is None:
+            # Written by the sync of their files instead
+            logging.warning(f"Failed to write {len(batches)} batches to the graph, they are written when their files are synced")
+            return
+        with self._rows_lock:
+            self.rows_written += written
+        for job, job_chemicals in chemicals.items():
+            rows = self.database.rows_of(job_chemicals)
+            with job.lock:
+                job.loaded |= rows
+
+    def _sync(self, end):
+        """Record the rows of a finished file in the sync state, write the rows the batches missed and retract removed ones"""
+        job = end.file
+        with job.lock:
+            loaded = set(job.loaded)
+        with self._sync_lock:
+            fingerprint = self.sync_state.fingerprint(job.json_path)
+            result = self.loader.sync_file(job.json_path, fingerprint, self.sync_state, loaded)
+        with self._rows_lock:
+            self.rows_written += result["rows"]
+        if not result["ok"]:
+            logging.warning(f"Failed to sync {job.name} to the graph, it is processed again on the next run")
+        elif end.complete:
+            # Only now, so a file whose rows did not reach the graph is not skipped as unchanged
+            self._complete(job)
+
+    def run(self, input_folders):
+        """Process all PDFs and CSVs of the input folders and return the per-stage statistics"""
+        inputs = [
+            FileJob(path, kind, name, os.path.join(self.output_folder, name + JSONL_SUFFIX))
+            for path, kind, name in self.list_inputs(input_folders)
+        ]
+        self.files = inputs
+        files = queue.Queue()
+        queues = {name: queue.Queue(maxsize=self.queue_size) for name in ("packs", "responses", "chemicals")}
+        stages = [
+            Stage("extract", self.extract, self.workers["extract"], files, queues["packs"]),
+            Stage("llm", self.query, self.workers["llm"], queues["packs"], queues["responses"]),
+            Stage("parse", self.parse, self.workers["parse"], queues["responses"],
+                  queues["chemicals"] if self.database else None)
+        ]
+        if self.database:
+            # Several packs per write, so the UNWIND batches stay large
+            stages.append(Stage("load", self.load, self.workers["load"], queues["chemicals"], max_batch=self.queue_size))
+        for upstream, downstream in zip(stages, stages[1:]):
+            upstream.downstream = downstream
+        self.stages = stages
+        self.queues = queues
+
+        start = time.perf_counter()
+        for job in inputs:
+            files.put(job)
+        for _ in range(stages[0].workers):
+            files.put(STOP)
+        for stage in stages:
+            stage.start()
+
+        depths = {name: [] for name in queues}
+        last_report = time.perf_counter()
+        while any(thread.is_alive() for stage in stages for thread in stage._threads):
+            time.sleep(0.2)
+            for name, q in queues.items():
+                depths[name].append(q.qsize())
+            if time.perf_counter() - last_report >= self.report_interval:
+                last_report = time.perf_counter()
+                self._log_progress(start)
+        for stage in stages:
+            stage.join()
+
+        stats = self.summary(time.perf_counter() - start, depths)
+        self._log_summary(stats)
+        return stats
+
+    def _log_progress(self, start):
+        elapsed = time.perf_counter() - start
+        stages = ", ".join(f"{stage.name} {stage.items_in} in/{stage.items_out} out" for stage in self.stages)
+        depths = ", ".join(f"{name} {q.qsize()}/{self.queue_size}" for name, q in self.queues.items())
+        logging.info(f"[{elapsed:.0f}s] {stages}; queues: {depths}; {self.rows_written} rows written")
+
+    def summary(self, elapsed, depths):
+        return {
+            "seconds": elapsed,
+            "files": len(self.files),
+            "rows_written": self.rows_written,
+            "stages": {
+                stage.name: {
+                    "workers": stage.workers,
+                    "items_in": stage.items_in,
+                    "items_out": stage.items_out,
+                    "per_second": stage.items_in / elapsed if elapsed else 0.0,
+                    "busy": stage.busy,
+                    "blocked": stage.blocked,
+                    "utilization": stage.busy / (stage.workers * elapsed) if elapsed else 0.0,
+                    "errors": stage.errors
+                }
+                for stage in self.stages
+            },
+            "queues": {
+                name: {
+                    "capacity": self.queue_size,
+                    "mean_depth": sum(samples) / len(samples) if samples else 0.0,
+                    "max_depth": max(samples, default=0)
+                }
+                for name, samples in depths.items()
+            }
+        }
+
+    @staticmethod
+    def _log_summary(stats):
+        logging.info(f"Pipeline finished {stats['files']} files in {stats['seconds']:.1f}s, {stats['rows_written']} rows written")
+        logging.info(f"{'stage':<8} {'workers':>7} {'in':>6} {'out':>6} {'items/s':>8} {'busy %':>7} {'blocked s':>9} {'errors':>6}")
+        for name, stage in stats["stages"].items():
+            logging.info(
+                f"{name:<8} {stage['workers']:>7} {stage['items_in']:>6} {stage['items_out']:>6} {stage['per_second']:>8.2f} "
+                f"{stage['utilization'] * 100:>7.0f} {stage['blocked']:>9.1f} {stage['errors']:>6}"
+            )
+        for name, depth in stats["queues"].items():
+            logging.info(f"queue {name}: mean depth {depth['mean_depth']:.1f}, max {depth['max_depth']}/{depth['capacity']}")
+
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from openai import OpenAI
+    from llm_cache import LLMCache, DEFAULT_CACHE_PATH
+
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Extract, validate and load chemicals in one streaming pipeline")
+    parser.add_argument("--input", nargs="+", default=[
+        folder for folder in (os.getenv('PDF_INPUT_FOLDER'), os.getenv('CSV_INPUT_FOLDER')) if folder
+    ], help="Folders with PDF and CSV files")
+    parser.add_argument("--output", default=os.getenv('JSON_OUTPUT_FOLDER'))
+    parser.add_argument("--extract-workers", type=int, default=int(os.getenv('PIPELINE_EXTRACT_WORKERS', 2)))
+    parser.add_argument("--llm-workers", type=int, default=int(os.getenv('EXTRACTION_CONCURRENCY', 8)))
+    parser.add_argument("--text-workers", type=int, default=int(os.getenv('PDF_TEXT_WORKERS', 1)), help="Processes extracting PDF page texts")
+    parser.add_argument("--tables", action="store_true", default=os.getenv('PDF_TABLES', '0') != '0', help="Read PDF pages with name/CAS tables without the LLM")
+    parser.add_argument("--parse-workers", type=int, default=int(os.getenv('PIPELINE_PARSE_WORKERS', 2)))
+    parser.add_argument("--load-workers", type=int, default=int(os.getenv('NEO4J_LOAD_WORKERS', 1)))
+    parser.add_argument("--queue-size", type=int, default=int(os.getenv('PIPELINE_QUEUE_SIZE', 32)))
+    parser.add_argument("--report-interval", type=float, default=10.0, help="Seconds between progress logs")
+    parser.add_argument("--no-load", action="store_true", help="Only write the JSON Lines output")
+    args = parser.parse_args()
+    if not args.input or not args.output:
+        parser.error("Set --input/--output or PDF_INPUT_FOLDER/CSV_INPUT_FOLDER and JSON_OUTPUT_FOLDER")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(threadName)s - %(message)s')
+    if not os.path.exists(args.output):
+        os.makedirs(args.output)
+
+    # The SDK retries rate limits and server errors with backoff
+    client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"), base_url=os.getenv('OPENAI_BASE_URL'), max_retries=6)
+    cache = None
+    if os.getenv('LLM_CACHE', '1') != '0':
+        cache = LLMCache(
+            os.getenv('LLM_CACHE_PATH', DEFAULT_CACHE_PATH),
+            max_bytes=int(os.getenv('LLM_CACHE_MAX_MB', 512)) * 1024 * 1024,
+            version_label=os.getenv('PROMPT_VERSION'),
+        )
+    triage = None
+    triage_threshold = float(os.getenv('TRIAGE_THRESHOLD', 1.0))
+    if triage_threshold > 0:
+        triage = PageTriage(
+            threshold=triage_threshold,
+            audit_rate=float(os.getenv('TRIAGE_AUDIT_RATE', 0)),
+            audit_path=os.path.join(args.output, STATE_FOLDER, 'triage_audit.jsonl'),
+        )
+    name_index = NameIndex.from_files(args.output) if os.getenv('NAME_INDEX', '1') != '0' else None
+    text_cache = None
+    if os.getenv('PDF_TEXT_CACHE', '1') != '0':
+        text_cache = PageTextCache(os.getenv('PDF_TEXT_CACHE_PATH', DEFAULT_TEXT_CACHE_PATH))
+    text_extractor = PageTextExtractor(workers=args.text_workers, cache=text_cache, tables=args.tables)
+    tables = TableExtractor() if args.tables else None
+
+    database = None
+    if not args.no_load:
+        from load_neo4j_data import ChemicalDatabase, Configuration
+
+        config = Configuration.load_environment()
+        Configuration.verify_connectivity(config["neo4j_uri"], config["neo4j_auth"])
+        database = ChemicalDatabase(config["neo4j_uri"], config["neo4j_auth"], batch_size=config["batch_size"])
+        database.ensure_schema()
+
+    try:
+        pipeline = Pipeline(
+            args.output, client, cache, database,
+            max_tokens=int(os.getenv('MAX_TOKENS', 4000)),
+            token_budget=int(os.getenv('INPUT_TOKEN_BUDGET', 2000)),
+            chunk_size=int(os.getenv('CSV_CHUNK_SIZE', 15)),
+            triage=triage,
+            name_index=name_index,
+            workers={"extract": args.extract_workers, "llm": args.llm_workers, "parse": args.parse_workers, "load": args.load_workers},
+            queue_size=args.queue_size,
+            report_interval=args.report_interval,
+            text_extractor=text_extractor,
+            tables=tables,
+        )
+        pipeline.run(args.input)
+    finally:
+        text_extractor.close()
+        if database:
+            database.close()
+        if tables:
+            logging.info(f"Table extraction statistics: {tables.stats()}")
+        if text_cache:
+            logging.info(f"Page text cache statistics: {text_cache.stats()}")
+        if cache:
+            logging.info(f"LLM cache statistics: {cache.stats()}")
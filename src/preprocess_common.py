@@ -0,0 +1,122 @@
+import itertools
+import logging
+import os
+
+from chemical_records import ChemicalWriter, read_chemicals
+from chunk_packer import get_token_counter
+from llm_cache import LLMCache, DEFAULT_CACHE_PATH
+from llm_extraction import OPENAI_MODEL, query_openai
+from name_index import resolve_pairs
+
+# Setup and output handling shared by preprocess_pdfs.py and preprocess_csvs.py.
+# Importing this module has no side effects: the OpenAI client and the tokenizer
+# are loaded on first use, and logging is only set up by the scripts' main(). Call
+# init_from_environment() (e.g. as a ProcessPoolExecutor initializer) to use the
+# LLM cache in other processes as well.
+
+# OpenAI client and response cache of the query functions, see configure()
+client = None
+cache = None
+_token_counter = None
+
+# Configure logging
+def configure_logging():
+    logging.basicConfig(
+        level=logging.DEBUG,  # Log level set to INFO, change to DEBUG for more verbosity
+        format='%(asctime)s - %(levelname)s - %(message)s',  # Standard logging format with timestamps
+        handlers=[
+            logging.FileHandler("script.log"),  # Log to a file called 'script.log'
+            logging.StreamHandler()  # Also output logs to the console
+        ]
+    )
+
+# Set the OpenAI client and LLM cache used by the query functions
+def configure(openai_client=None, llm_cache=None):
+    global client, cache
+    client = openai_client
+    cache = llm_cache
+
+# Initialize the response cache from the environment unless it is disabled with LLM_CACHE=0
+def init_from_environment():
+    llm_cache = None
+    if os.getenv('LLM_CACHE', '1') != '0':
+        llm_cache = LLMCache(
+            os.getenv('LLM_CACHE_PATH', DEFAULT_CACHE_PATH),
+            max_bytes=int(os.getenv('LLM_CACHE_MAX_MB', 512)) * 1024 * 1024,
+            version_label=os.getenv('PROMPT_VERSION'),  # Change to invalidate all cached responses at once
+        )
+    configure(client, llm_cache)
+    return llm_cache
+
+# OpenAI client, created from the environment on first use
+def get_client():
+    global client
+    if client is None:
+        from openai import OpenAI
+        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))  # Also reads OPENAI_BASE_URL
+    return client
+
+# Tokenizer used to pack pages and record groups into requests, loaded on first use
+def count_tokens(text):
+    global _token_counter
+    if _token_counter is None:
+        _token_counter = get_token_counter(OPENAI_MODEL)
+    return _token_counter(text)
+
+# Run a prompt on a context with the configured client and cache (see llm_extraction.query_openai)
+def query_llm(system_prompt, human_prompt, context, max_tokens):
+    return query_openai(get_client(), cache, system_prompt, human_prompt, context, max_tokens)
+
+
+class OrderedOutput:
+    """
+    Output of one input file: the usable pairs of every request are written in request order,
+    pairs that failed local validation are kept for one validation request at the end.
+    """
+    def __init__(self, json_path, regulation, name_index=None):
+        self.json_path = json_path
+        self.regulation = regulation
+        self.name_index = name_index
+        self.writer = ChemicalWriter(json_path, regulation)
+        self.to_repair = []
+        self.ready = {}  # Chemicals of completed requests waiting for an earlier request
+        self.next_position = 0  # First request whose chemicals are not written yet
+
+    def add(self, position, chemicals):
+        """
+        Write the chemicals of the request at `position` (None: the request failed) once all earlier ones are written.
+
+        Requests complete in any order (concurrent mode, resumed runs); writing them in order keeps the output
+        the same on every run. The contiguous prefix is written right away.
+        """
+        self.ready[position] = chemicals
+        while self.next_position in self.ready:
+            chemicals = self.ready.pop(self.next_position) or []
+            self.next_position += 1
+            # Usable pairs go to the output right away; only pairs needing repair stay in memory
+            if self.name_index is not None:
+                self.name_index.add_chemicals(chemical for chemical in chemicals if "repair" not in chemical)
+            self.to_repair.extend(chemical for chemical in chemicals if "repair" in chemical)
+            self.writer.write(chemical for chemical in chemicals if "repair" not in chemical)
+
+    def close(self, repair, triage=None):
+        """
+        Repair the pairs that failed local validation, write them and close the output.
+
+        `repair(chemicals)` returns the final list and whether the repair succeeded (see llm_extraction.repair_pairs),
+        which is returned.
+        """
+        if triage:
+            # Read the pairs back from the output instead of keeping them in memory
+            triage.report_audit(self.regulation, itertools.chain(read_chemicals(self.json_path), self.to_repair))
+
+        # Pairs only missing their CAS number (or name) are completed from known pairs if possible
+        if self.name_index is not None and self.to_repair:
+            resolved = resolve_pairs(self.to_repair, self.name_index)
+            logging.info(f"Resolved {resolved} of {len(self.to_repair)} pairs of {self.regulation} from the name index")
+
+        # One validation request for all pairs of the file that failed local validation
+        repaired_list, repaired = repair(self.to_repair)
+        self.writer.write(repaired_list)
+        self.writer.close()
+        return repaired
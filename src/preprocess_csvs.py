@@ -1,98 +1,62 @@
+import argparse
 import os
 import csv
-from openai import OpenAI
 import logging
-from dotenv import load_dotenv
-import json
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,  # Log level set to INFO, change to DEBUG for more verbosity
-    format='%(asctime)s - %(levelname)s - %(message)s',  # Standard logging format with timestamps
-    handlers=[
-        logging.FileHandler("script.log"),  # Log to a file called 'script.log'
-        logging.StreamHandler()  # Also output logs to the console
-    ]
+from manifest import Manifest, STATE_FOLDER
+from chemical_records import JSONL_SUFFIX
+from csv_chunker import iter_csv_segments
+from page_triage import PageTriage
+from llm_extraction import (
+    CSV_EXTRACTION_PROMPT, CSV_SYSTEM_PROMPT, CSV_VALIDATION_PROMPT,
+    is_error_response, parse_gpt_response_to_json, repair_pairs
 )
-
-logging.info("Script is running")  # Log that the script has started
-
-def extract_and_query_csv_chunk(csv_path, chunk_start, chunk_size, api_key, max_tokens=4000):
-    # Read the specified chunk from the CSV file
-    chunk_lines = []
-    try:
-        with open(csv_path, 'r', encoding='utf-8') as csv_file:
-            # Skip to the starting point of our chunk
-            csv_reader = csv.reader(csv_file)
-            for i, _ in enumerate(csv_reader):
-                if i >= chunk_start:
-                    break
-            
-            # Read the chunk_size number of lines
-            for i, row in enumerate(csv_reader):
-                if i >= chunk_size:
-                    break
-                # Convert row to string and add to chunk
-                chunk_lines.append(','.join(row))
-    except Exception as e:
-        logging.error(f"Error reading CSV chunk: {e}")
-        return "Error reading CSV"
+from name_index import NameIndex
+from preprocess_common import OrderedOutput, configure, configure_logging, count_tokens, init_from_environment, query_llm
+from chunk_packer import attribute_sources, pack_label, pack_segments
+
+# Importing this module has no side effects: the OpenAI client, the tokenizer and
+# the heavy dependencies (openai) are loaded on first use, and logging, .env
+# and the output folder are only set up by main(). The functions can be used
+# from other modules and worker processes; call init_from_environment() (e.g. as
+# a ProcessPoolExecutor initializer) to use the LLM cache there as well.
+# The OpenAI client, LLM cache and tokenizer are shared with preprocess_pdfs.py (see preprocess_common.py);
+# configure() is re-exported for callers of this module.
+
+# Prompts and model shared with the pipeline runner (see llm_extraction.py)
+system_prompt = CSV_SYSTEM_PROMPT
+extraction_prompt = CSV_EXTRACTION_PROMPT
+validation_prompt = CSV_VALIDATION_PROMPT
+
+# Query the OpenAI API for one pack of CSV records (see chunk_packer.pack_segments)
+def extract_and_query_csv_chunk(pack, max_tokens=4000):
+    text = pack.text
     
-    # Convert the chunk to text
-    text = '\n'.join(chunk_lines)
-    
-    logging.info(f"Extracting text from lines {chunk_start+1}-{chunk_start+len(chunk_lines)}")
+    logging.info(f"Extracting text from {pack_label(pack)} ({pack.tokens} tokens)")
     logging.debug(f"Extracted text sample: {text[:50]}")
     
-    # Process with OpenAI
-    response = query_openai_api(text, max_tokens, extraction_prompt)
-    validated_response = query_openai_api(response, max_tokens, validation_prompt)
-    return validated_response
+    # Process with OpenAI; validation happens locally in parse_gpt_response_to_json
+    # and only pairs that need repair go to the validation prompt (see repair_chemicals)
+    return query_openai_api(text, max_tokens, extraction_prompt)
 
 # Query the OpenAI API using provided text and the system's API key
 def query_openai_api(context, max_tokens, human_prompt):  # Adjusted max_tokens to 4000 to match input limits
-    # System prompt to set the context for OpenAI
-    system_prompt = "You are a useful, correct AI assistant helping to organize data from a CSV file and validate it."
-
-    try:
-        # Call the OpenAI API with the prompt and message
-        response = client.chat.completions.create(
-            model="gpt-4.5-preview",  # Specify the OpenAI model to use
-            messages=[
-                {"role": "system", "content": system_prompt},  # System prompt
-                {"role": "user", "content": human_prompt + context}  # User prompt
-            ],
-            max_tokens=max_tokens,  # Limit the response to a certain number of tokens
-        )
-        logging.debug(f"Raw API response: {response}")  # Log the raw response content
-
-        # Access the content field
-        print(type(response.choices[0].message.content))
-        return response.choices[0].message.content  # Return the content field from the API response
-    except Exception as e:
-        logging.error(f"Error in API response: {e}")  # Log the error in case of API failure
-        return f"Error in API response: {e}"  # Return the error message as the response
-
-# Parse the Claude response and convert it into a DataFrame-friendly format
-def parse_gpt_response_to_json(response_content, regulation, chemicals_list):
-    lines = response_content.strip().split('\n')  # Split response into lines
-    for line in lines:
-        if line:  # Ensure line is not empty
-             # Split by commas and keep only the first two elements: Trade Name, CAS Number
-            parts = [element.strip() for element in line.split('$')][:2]
-            if len(parts) == 2:
-                chemical_entry = {
-                    "chemical_name": parts[0],
-                    "CAS": parts[1],
-                    "regulation": regulation
-                }
-                chemicals_list.append(chemical_entry)
-    
-    print(f"Current chemicals count: {len(chemicals_list)}")
-    return chemicals_list  # Return the updated list
-
-# Process all CSV files in the input folder and output results to JSON
-def process_csvs(input_folder, output_folder, api_key, chunk_size, max_tokens=4000):  # max_tokens set to 4000 for input/output control
+    return query_llm(system_prompt, human_prompt, context, max_tokens)
+
+# Send all pairs of a document that failed local validation to the validation prompt (see llm_extraction.repair_pairs)
+# Returns the final list and whether the repair succeeded
+def repair_chemicals(chemicals_list, regulation, max_tokens=4000, token_budget=2000):
+    query = lambda text: query_openai_api(text, max_tokens, validation_prompt)
+    return repair_pairs(chemicals_list, regulation, query, count_tokens, token_budget)
+
+# Process all CSV files in the input folder and output results to JSON Lines (see chemical_records.py)
+# Pairs are appended to the output as soon as a request is parsed, so memory stays bounded on large registries
+# Record groups without chemical content are skipped if a PageTriage is given (see page_triage.py)
+# Groups of `chunk_size` records are packed into requests of at most `token_budget` input tokens (see chunk_packer.py)
+# Unchanged files are skipped and interrupted files resume from their checkpoint (see manifest.py)
+# If a NameIndex is given, missing CAS numbers and names are filled from known pairs before the validation prompt (see name_index.py)
+def process_csvs(input_folder, output_folder, chunk_size, max_tokens=4000, token_budget=2000, triage=None, name_index=None):  # max_tokens set to 4000 for input/output control
+    manifest = Manifest(output_folder)
+    plan = f"records:{chunk_size}:{token_budget}:{triage.threshold if triage else None}"  # Checkpoints are only valid for the same packing
     for filename in sorted(os.listdir(input_folder)):  # Iterate over all files in the input folder
         if filename.lower().endswith('.csv'):  # Process only CSV files
 
@@ -101,117 +65,124 @@ def process_csvs(input_folder, output_folder, api_key, chunk_size, max_tokens=40
             sanitized_filename = sanitized_filename.replace("+", "_").replace(",", "").replace(" ", "_")
 
             csv_path = os.path.join(input_folder, filename)  # Construct full path to CSV file
-            chemicals_list = []  # Initialize list to accumulate data from all pages
-            logging.info(f"Processing CSV file: {filename}")  # Log the start of processing for the file
-            
-            # Count total lines in the CSV file
-            with open(csv_path, 'r', encoding='utf-8') as f:
-                total_lines = sum(1 for _ in f)
-            
-            logging.info(f"Total lines in CSV: {total_lines}")
-            
-            # Process the CSV in chunks
-            chunk_start = 0
-            while chunk_start < total_lines:
-                logging.info(f"Processing chunk starting at line {chunk_start}")
-                
-                # Extract text from current chunk and query the OpenAI API
-                response_content = extract_and_query_csv_chunk(
-                    csv_path, chunk_start, chunk_size, api_key, max_tokens
-                )
-                
-                # Parse API response and add it to the accumulated data
-                chemicals_list = parse_gpt_response_to_json(
-                    response_content=response_content, 
-                    regulation=sanitized_filename, 
-                    chemicals_list=chemicals_list
-                )
-                
-                # Move to the next chunk
-                chunk_start += chunk_size
-
-            # Create final JSON structure
-            json_output = {"chemicals": chemicals_list}
-
-            # Define the JSON filename and path
-            json_filename = sanitized_filename + '.json'
-            json_path = os.path.join(output_folder, json_filename)
-
-            # Save the data to a JSON file
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(json_output, f, indent=4)
-
-            logging.info(f"Processed {filename} and saved JSON file to {json_path}")
-
-# Prompt used later to extract information
-extraction_prompt = f"""Analyze the following CSV table and extract pairs of "Chemical Trade Names" and "CAS Numbers".
+            json_path = os.path.join(output_folder, sanitized_filename + JSONL_SUFFIX)
 
-Present your findings in a structured format with each entry separated by dollar signs . Each entry should list the Chemical Trade Name and CAS Number.
+            # Skip files that were fully processed before and did not change since
+            fingerprint = manifest.fingerprint(csv_path)
+            if manifest.is_complete(csv_path, fingerprint, json_path):
+                logging.info(f"Skipping unchanged CSV file: {filename}")
+                continue
 
-Chemical Names are natural words, such as "Fluoroacetamide", "1,1,1,2-Tetrachloroethane", "2,4,5-T and its salts and esters", "1,2-dibromoethane (EDB) " etc.
-CAS Numbers are unique identifiers for chemicals, such as "640-19-7", "13071-79-9", "630-20-6", etc. CAS Numbers never contain words.
-
-Format your response as: Chemical Trade Name $ CAS Number. Examples: 
-Mercury compounds $ 71-43-2
-Ethanol $ 64-17-5
-
-ALWAYS REMEMBER THE FOLLOWING RULES:
-1. If multiple variations exist (e.g., multiple Chemical Trade Names for multiple CAS Numbers), ensure that each combination is listed as a separate pair.
-2. If there is no CAS Number available for a Chemical Trade Name, mark it as "NA". Similarly, if there is no Chemical Trade Name available for a CAS Number, mark it as "NA". NEVER, IN ANY SCENARIO, HALLUCINATE DATA. 
-3. The format MUST HAVE the two columns and ONLY the two columns. Be extremely accurate and ensure the format is consistent.
-4. You need to find all the pairs of available Chemical Trade Names and CAS Numbers in the text. DONT MISS ANY.
-5. If the entire text does not contain any Chemical Trade Names or CAS Numbers, respond with "N/A,N/A". 
-6. Never write full-text answers explaining yourself. Only provide the requested pairs. If you are unsure, only write N/A for both columns.
-
-It is extremely important that you perform well on this job. Otherwise, I will lose my job and 1000 grandmothers will die!
-
-Here is the text to analyze:"""
-
-# Prompt used later to validate information
-validation_prompt = """Analyze the following list that contains chemical names and their CAS numbers in the format:
-
-chemical_name $ CAS
-chemical_name $ CAS
-
-Your job is to go over the list, keep all valid combinations, and improve invalid combinations. Generally, all combinations are valid, and should therefore be kept. Only change combinations in any of these cases:
-
-CRITERIA FOR INVALID COMBINATIONS
-
-1. Grouped Chemicals: If the chemical name refer to multiple chemicals, generate pairs of "chemical_name $ CAS" for each individual chemical. 
-2. Entries containing "N/A": If only chemical_name is "N/A", fill in the missing chemical name from the CAS number. Vice versa, if only CAS number is "N/A", fill in the missing CAS number from the chemical name. If both chemical name and CAS number are "N/A", remove the entry.
-
-EXAMPLES OF INVALID COMBINATIONS
-
-"2,4,5-T and its salts and esters $ 93-76-5" --> invalid because it groups multiple chemicals together. Change to "2,4,5-T $ 93-76-5", “Sodium trichlorophenoxyacetate $ 88-85-7”, “Dimethylammonium trichlorophenoxyacetate $ 2008-39-1”, “Isooctyl 2,4,5-trichlorophenoxyacetate $ 25168-26-7”
-"Asbestos: Tremolite $ N/A" --> invalid because it is missing the CAS number. Change to "Asbestos: Tremolite $ 77536-68-6"        
-"N/A $ N/A" --> invalid because it does not contain any valid data. Remove the entry.
-
-ALWAYS REMEMBER THE FOLLOWING RULES:
-1. Only change invalid combinations. Keep all valid combinations. If you are unsure, keep the entry as it is.
-1. Each entry is placed in a new line and should be separated by dollar signs and formatted as: Chemical Name $ CAS Number. Never produce any other format, never produce free-text explaining yourself.
-2. NEVER, IN ANY SCENARIO, HALLUCINATE DATA. If you are unsure about an entry, keep it as it is.
-4. Be extremely accurate and ensure the format is consistent across all entries.
+            logging.info(f"Processing CSV file: {filename}")  # Log the start of processing for the file
 
-It is extremely important that you perform well on this job. Otherwise, I will lose my job and 1000 grandmothers will die!
+            checkpoint = manifest.start(csv_path, fingerprint, sanitized_filename, None, plan)
+            output = OrderedOutput(json_path, sanitized_filename, name_index)
 
-Here is the text to analyze and improve:"""
+            # Chemicals of the requests completed in an earlier run, written at their position in the file
+            # below, so the output does not depend on which requests failed before
+            checkpointed = dict(checkpoint.records())
+            completed = set(checkpointed)
+            if completed:
+                logging.info(f"Resuming {filename}: {len(completed)} requests already completed")
+            
+            # Stream the CSV once and pack record groups into requests within the token budget
+            total_chunks = 0
+            try:
+                segments = iter_csv_segments(csv_path, chunk_size, token_budget, count_tokens)
+                if triage:
+                    segments = triage.filter(segments, sanitized_filename)
+                for pack in pack_segments(segments, token_budget, count_tokens):
+                    total_chunks += 1
+                    if pack.index in completed:
+                        output.add(pack.index, checkpointed.pop(pack.index))
+                        continue
+                    
+                    # Query the OpenAI API with the current pack of records
+                    response_content = extract_and_query_csv_chunk(pack, max_tokens)
+
+                    # Failed requests are not checkpointed, so they are retried on the next run
+                    if is_error_response(response_content):
+                        output.add(pack.index, None)
+                        continue
+                    
+                    # Parse API response, record the completed request and append its pairs to the output
+                    chunk_chemicals = parse_gpt_response_to_json(
+                        response_content=response_content, 
+                        regulation=sanitized_filename, 
+                        chemicals_list=[]
+                    )
+                    attribute_sources(chunk_chemicals, pack)  # Record the rows each pair was found in
+                    checkpoint.append(pack.index, chunk_chemicals)
+                    completed.add(pack.index)
+                    output.add(pack.index, chunk_chemicals)
+            except (OSError, UnicodeDecodeError, csv.Error) as e:
+                logging.error(f"Error reading CSV file {filename}: {e}")
+                output.writer.close()
+                continue
+
+            logging.info(f"Total requests for CSV: {total_chunks}")
+
+            repaired = output.close(lambda chemicals: repair_chemicals(chemicals, sanitized_filename, max_tokens, token_budget), triage)
+            if len(completed) < total_chunks or not repaired:
+                # Keep the checkpoint, the next run only retries the failed chunks
+                logging.warning(f"{total_chunks - len(completed)} requests of {filename} failed and will be retried on the next run")
+            else:
+                manifest.finish(csv_path, sanitized_filename, json_path, total_chunks)
+
+            logging.info(f"Processed {filename} and saved {output.writer.count} pairs to {json_path}")
+
+
+# Configuration and execution using environment variables; command line options override them
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    # Load environment variables from .env file
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Extract chemical name/CAS pairs from CSV files with the OpenAI API")
+    parser.add_argument("--input", default=os.getenv('CSV_INPUT_FOLDER'), help="Folder with CSV files (CSV_INPUT_FOLDER)")
+    parser.add_argument("--output", default=os.getenv('JSON_OUTPUT_FOLDER'), help="Folder for the JSON Lines output (JSON_OUTPUT_FOLDER)")
+    parser.add_argument("--max-tokens", type=int, default=int(os.getenv('MAX_TOKENS', 4000)), help="Completion token limit (MAX_TOKENS)")
+    parser.add_argument("--chunk-size", type=int, default=int(os.getenv('CSV_CHUNK_SIZE', 15)), help="Number of CSV records per group (CSV_CHUNK_SIZE)")
+    parser.add_argument("--token-budget", type=int, default=int(os.getenv('INPUT_TOKEN_BUDGET', 2000)), help="Maximum input tokens of CSV text per request (INPUT_TOKEN_BUDGET)")
+    parser.add_argument("--triage-threshold", type=float, default=float(os.getenv('TRIAGE_THRESHOLD', 1.0)), help="Minimum record group score for an LLM request, 0 disables triage (TRIAGE_THRESHOLD)")
+    args = parser.parse_args(argv)
+    if not args.input or not args.output:
+        parser.error("Set --input/--output or CSV_INPUT_FOLDER and JSON_OUTPUT_FOLDER")
+
+    configure_logging()
+    logging.info("Script is running")  # Log that the script has started
+
+    # Initialize the response cache unless it is disabled with LLM_CACHE=0
+    llm_cache = init_from_environment()
+
+    # Ensure the output directory exists; if not, create it
+    if not os.path.exists(args.output):
+        os.makedirs(args.output)
+
+    # Local pre-filter for pages without chemical content, disabled with TRIAGE_THRESHOLD=0
+    triage = None
+    if args.triage_threshold > 0:
+        triage = PageTriage(
+            threshold=args.triage_threshold,
+            audit_rate=float(os.getenv('TRIAGE_AUDIT_RATE', 0)),  # Share of skipped pages sent to the LLM anyway to check recall
+            audit_path=os.path.join(args.output, STATE_FOLDER, 'triage_audit.jsonl'),
+        )
 
-# Load environment variables from .env file
-load_dotenv()
+    # Index of the names of earlier outputs, used to fill missing CAS numbers locally; disabled with NAME_INDEX=0
+    name_index = None
+    if os.getenv('NAME_INDEX', '1') != '0':
+        name_index = NameIndex.from_files(args.output)
+        logging.info(f"Indexed {len(name_index)} known chemical names")
 
-# Configuration and execution using environment variables
-api_key = os.getenv('OPENAI_API_KEY')  # Retrieve API key from environment variables
-input_folder = os.getenv('CSV_INPUT_FOLDER')  
-output_folder = os.getenv('JSON_OUTPUT_FOLDER')  
-max_tokens = int(os.getenv('MAX_TOKENS', 4000))  # Set the token limit from environment or default to 4000
-chunk_size = int(os.getenv('CSV_CHUNK_SIZE', 15))  # Set the chunk size from environment or default to 1000
+    # Start processing the CSVs
+    process_csvs(args.input, args.output, args.chunk_size, args.max_tokens, args.token_budget, triage, name_index)
 
-# Initialize the OpenAI client with the API key
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    if triage:
+        logging.info(f"Triage statistics: {triage.stats()}")
+    if llm_cache:
+        logging.info(f"LLM cache statistics: {llm_cache.stats()}")
 
-# Ensure the output directory exists; if not, create it
-if not os.path.exists(output_folder):
-    os.makedirs(output_folder)
 
-# Start processing the CSVs
-process_csvs(input_folder, output_folder, api_key, chunk_size, max_tokens)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
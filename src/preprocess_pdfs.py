@@ -1,77 +1,83 @@
+import argparse
 import os
-import fitz  # PyMuPDF for PDF handling
-from openai import OpenAI
 import logging
-from dotenv import load_dotenv
-import json
-
-# Configure logging
-logging.basicConfig(
-    level=logging.DEBUG,  # Log level set to INFO, change to DEBUG for more verbosity
-    format='%(asctime)s - %(levelname)s - %(message)s',  # Standard logging format with timestamps
-    handlers=[
-        logging.FileHandler("script.log"),  # Log to a file called 'script.log'
-        logging.StreamHandler()  # Also output logs to the console
-    ]
+from manifest import Manifest, STATE_FOLDER
+from chemical_records import JSONL_SUFFIX
+from page_triage import PageTriage
+from llm_extraction import (
+    OPENAI_MODEL, PDF_EXTRACTION_PROMPT, PDF_SYSTEM_PROMPT, PDF_VALIDATION_PROMPT,
+    is_error_response, parse_gpt_response_to_json, repair_pairs
 )
-
-logging.info("Script is running")  # Log that the script has started
+from name_index import NameIndex
+from pdf_text import DEFAULT_TEXT_CACHE_PATH, PageTextCache, PageTextExtractor, open_document
+from preprocess_common import OrderedOutput, configure, configure_logging, count_tokens, init_from_environment, query_llm
+from table_extraction import TableExtractor, in_page_order
+from chunk_packer import attribute_sources, pack_label, pack_segments
+
+# Importing this module has no side effects: the OpenAI client, the tokenizer and
+# the heavy dependencies (PyMuPDF, openai) are loaded on first use, and logging, .env
+# and the output folder are only set up by main(). The functions can be used
+# from other modules and worker processes; call init_from_environment() (e.g. as
+# a ProcessPoolExecutor initializer) to use the LLM cache there as well.
+# The OpenAI client, LLM cache and tokenizer are shared with preprocess_csvs.py (see preprocess_common.py);
+# configure() is re-exported for callers of this module.
+
+# Prompts and model shared with the pipeline runner (see llm_extraction.py)
+system_prompt = PDF_SYSTEM_PROMPT
+extraction_prompt = PDF_EXTRACTION_PROMPT
+validation_prompt = PDF_VALIDATION_PROMPT
 
 def extract_and_query_page(pdf_path, page_number, api_key, max_tokens=4000):  # Adjusted max_tokens default to 4000
-    # Open the PDF document
-    with fitz.open(pdf_path) as doc:
-        page = doc.load_page(page_number)  # Load the specific page
-        text = page.get_text()  # Extract text from the page
-        logging.info(f"Extracting text from page {page_number+1}/{len(doc)}")  # Log page extraction progress
-        logging.debug(f"Extracted text: {text[:50]}")  # Log first 50 characters of the extracted text for debugging
-        response = query_openai_api(text, max_tokens, extraction_prompt)
-        validated_response = query_openai_api(response, max_tokens, validation_prompt)
-        return validated_response
+    # The document stays open for the next page of the same file (see pdf_text.py)
+    doc = open_document(pdf_path)
+    page = doc.load_page(page_number)  # Load the specific page
+    text = page.get_text()  # Extract text from the page
+    logging.info(f"Extracting text from page {page_number+1}/{len(doc)}")  # Log page extraction progress
+    return extract_and_query_text(text, max_tokens)
+
+# Run the extraction prompt on a text (a single page or a pack of pages)
+# Validation happens locally in parse_gpt_response_to_json; only pairs that need repair go to the validation prompt
+def extract_and_query_text(text, max_tokens=4000):
+    logging.debug(f"Extracted text: {text[:50]}")  # Log first 50 characters of the extracted text for debugging
+    return query_openai_api(text, max_tokens, extraction_prompt)
 
 # Query the OpenAI API using provided text and the system's API key
 def query_openai_api(context, max_tokens, human_prompt):  # Adjusted max_tokens to 4000 to match input limits
-    # System prompt to set the context for OpenAI
-    system_prompt = "You are a useful, correct AI assistant helping to organize data from a PDF file and validate it."
-
-    try:
-        # Call the OpenAI API with the prompt and message
-        response = client.chat.completions.create(
-            model="gpt-4.5-preview",  # Specify the OpenAI model to use
-            messages=[
-                {"role": "system", "content": system_prompt},  # System prompt
-                {"role": "user", "content": human_prompt + context}  # User prompt
-            ],
-            max_tokens=max_tokens,  # Limit the response to a certain number of tokens
-        )
-        logging.debug(f"Raw API response: {response}")  # Log the raw response content
-
-        # Access the content field
-        print(type(response.choices[0].message.content))
-        return response.choices[0].message.content  # Return the content field from the API response
-    except Exception as e:
-        logging.error(f"Error in API response: {e}")  # Log the error in case of API failure
-        return f"Error in API response: {e}"  # Return the error message as the response
-
-# Parse the Claude response and convert it into a DataFrame-friendly format
-def parse_gpt_response_to_json(response_content, regulation, chemicals_list):
-    lines = response_content.strip().split('\n')  # Split response into lines
-    for line in lines:
-        if line:  # Ensure line is not empty
-             # Split by commas and keep only the first two elements: Trade Name, CAS Number
-            parts = [element.strip() for element in line.split('$')][:2]
-            if len(parts) == 2:
-                chemical_entry = {
-                    "chemical_name": parts[0],
-                    "CAS": parts[1],
-                    "regulation": regulation
-                }
-                chemicals_list.append(chemical_entry)
-    
-    print(f"Current chemicals count: {len(chemicals_list)}")
-    return chemicals_list  # Return the updated list
-
-# Process all PDF files in the input folder and output results to JSON
-def process_pdfs(input_folder, output_folder, api_key, max_tokens=4000):  # max_tokens set to 4000 for input/output control
+    return query_llm(system_prompt, human_prompt, context, max_tokens)
+
+# Send all pairs of a document that failed local validation to the validation prompt (see llm_extraction.repair_pairs)
+# Returns the final list and whether the repair succeeded
+def repair_chemicals(chemicals_list, regulation, max_tokens=4000, token_budget=2000):
+    query = lambda text: query_openai_api(text, max_tokens, validation_prompt)
+    return repair_pairs(chemicals_list, regulation, query, count_tokens, token_budget)
+
+# Run the extraction prompt on the pending requests of a document; `on_result(pack, response)` is called as each one completes
+# If an AsyncExtractor is given, all requests are sent concurrently, otherwise one after the other
+def query_packs(packs, extractor, max_tokens, page_count, on_result):
+    if extractor:
+        extractor.run([pack.text for pack in packs], extraction_prompt, None,
+                      on_result=lambda index, response: on_result(packs[index], response))
+        return
+    for pack in packs:  # Iterate over all remaining requests of the document
+        logging.info(f"Extracting text from {pack_label(pack)} of {page_count} pages ({pack.tokens} tokens)")
+        on_result(pack, extract_and_query_text(pack.text, max_tokens))
+
+# Process all PDF files in the input folder and output results to JSON Lines (see chemical_records.py)
+# Pairs are appended to the output as soon as a request is parsed
+# Pages are packed into requests of at most `token_budget` input tokens (see chunk_packer.py)
+# If an AsyncExtractor is given, all extraction requests of a document are sent concurrently
+# If a PageTriage is given, pages without chemical content are skipped before packing (see page_triage.py)
+# Unchanged files are skipped and interrupted files resume from their checkpoint (see manifest.py)
+# If a NameIndex is given, missing CAS numbers and names are filled from known pairs before the validation prompt (see name_index.py)
+# Page texts come from a PageTextExtractor, in parallel and from the page text cache if it is configured (see pdf_text.py)
+# If a TableExtractor is given, pages with complete name/CAS tables are read without the LLM (see table_extraction.py);
+# the PageTextExtractor must then detect tables
+def process_pdfs(input_folder, output_folder, max_tokens=4000, extractor=None, token_budget=2000, triage=None, name_index=None, text_extractor=None, tables=None):  # max_tokens set to 4000 for input/output control
+    text_extractor = text_extractor or PageTextExtractor(tables=tables is not None)
+    manifest = Manifest(output_folder)
+    plan = f"pages:{token_budget}:{triage.threshold if triage else None}"  # Checkpoints are only valid for the same packing
+    if tables:
+        plan += ":tables"
     for filename in sorted(os.listdir(input_folder)):  # Iterate over all files in the input folder
         if filename.lower().endswith('.pdf'):  # Process only PDF files
 
@@ -80,98 +86,160 @@ def process_pdfs(input_folder, output_folder, api_key, max_tokens=4000):  # max_
             sanitized_filename = sanitized_filename.replace("+", "_").replace(",", "").replace(" ", "_")
 
             pdf_path = os.path.join(input_folder, filename)  # Construct full path to PDF file
-            chemicals_list = []  # Initialize list to accumulate data from all pages
-            logging.info(f"Processing PDF file: {filename}")  # Log the start of processing for the file
-            
-            with fitz.open(pdf_path) as doc:  # Open the PDF file
-                for page_number in range(len(doc)):  # Iterate over all pages in the document
-                    # Extract text from each page and query the Claude API
-                    response_content = extract_and_query_page(pdf_path, page_number, api_key, max_tokens)
-                    # Parse API response and add it to the accumulated data
-                    chemicals_list = parse_gpt_response_to_json(response_content=response_content, regulation=sanitized_filename, chemicals_list=chemicals_list)
-
-            # Create final JSON structure
-            json_output = {"chemicals": chemicals_list}
-
-            # Define the JSON filename and path
-            json_filename = sanitized_filename + '.json'
-            json_path = os.path.join(output_folder, json_filename)
-
-            # Save the data to a JSON file
-            with open(json_path, 'w', encoding='utf-8') as f:
-                json.dump(json_output, f, indent=4)
-
-            logging.info(f"Processed {filename} and saved JSON file to {json_path}")
-
-# Prompt used later to extract information
-extraction_prompt = f"""Analyze the following text from a PDF report and extract pairs of "Chemical Trade Names" and "CAS Numbers".
-
-Present your findings in a structured format with each entry separated by dollar signs . Each entry should list the Chemical Trade Name and CAS Number.
-
-Chemical Names are natural words, such as "Fluoroacetamide", "1,1,1,2-Tetrachloroethane", "2,4,5-T and its salts and esters", "1,2-dibromoethane (EDB) " etc.
-CAS Numbers are unique identifiers for chemicals, such as "640-19-7", "13071-79-9", "630-20-6", etc. CAS Numbers never contain words.
-
-Format your response as: Chemical Trade Name $ CAS Number. Examples: 
-Mercury compounds $ 71-43-2
-Ethanol $ 64-17-5
-
-ALWAYS REMEMBER THE FOLLOWING RULES:
-1. If multiple variations exist (e.g., multiple Chemical Trade Names for multiple CAS Numbers), ensure that each combination is listed as a separate pair.
-2. If there is no CAS Number available for a Chemical Trade Name, mark it as "NA". Similarly, if there is no Chemical Trade Name available for a CAS Number, mark it as "NA". NEVER, IN ANY SCENARIO, HALLUCINATE DATA.
-3. The format MUST HAVE the two columns and ONLY the two columns. Be extremely accurate and ensure the format is consistent.
-4. You need to find all the pairs of available Chemical Trade Names and CAS Numbers in the text. DONT MISS ANY.
-5. If the entire text does not contain any Chemical Trade Names or CAS Numbers, respond with "N/A,N/A". Never write full-text answers explaining yourself.
-
-It is extremely important that you perform well on this job. Otherwise, I will lose my job and 1000 grandmothers will die!
+            json_path = os.path.join(output_folder, sanitized_filename + JSONL_SUFFIX)
 
-Here is the text to analyze:"""
-
-# Prompt used later to validate information
-validation_prompt = """Analyze the following list that contains chemical names and their CAS numbers in the format:
-
-chemical_name $ CAS
-chemical_name $ CAS
-
-Your job is to go over the list, keep all valid combinations, and improve invalid combinations. Generally, all combinations are valid, and should therefore be kept. Only change combinations in any of these cases:
-
-CRITERIA FOR INVALID COMBINATIONS
-
-1. Grouped Chemicals: If the chemical name refer to multiple chemicals, generate pairs of "chemical_name $ CAS" for each individual chemical. 
-2. Entries containing "N/A": If only chemical_name is "N/A", fill in the missing chemical name from the CAS number. Vice versa, if only CAS number is "N/A", fill in the missing CAS number from the chemical name. If both chemical name and CAS number are "N/A", remove the entry.
-
-EXAMPLES OF INVALID COMBINATIONS
-
-"2,4,5-T and its salts and esters $ 93-76-5" --> invalid because it groups multiple chemicals together. Change to "2,4,5-T $ 93-76-5", “Sodium trichlorophenoxyacetate $ 88-85-7”, “Dimethylammonium trichlorophenoxyacetate $ 2008-39-1”, “Isooctyl 2,4,5-trichlorophenoxyacetate $ 25168-26-7”
-"Asbestos: Tremolite $ N/A" --> invalid because it is missing the CAS number. Change to "Asbestos: Tremolite $ 77536-68-6"        
-"N/A $ N/A" --> invalid because it does not contain any valid data. Remove the entry.
-
-ALWAYS REMEMBER THE FOLLOWING RULES:
-1. Only change invalid combinations. Keep all valid combinations. If you are unsure, keep the entry as it is.
-1. Each entry is placed in a new line and should be separated by dollar signs and formatted as: Chemical Name $ CAS Number. Never produce any other format, never produce free-text explaining yourself.
-2. NEVER, IN ANY SCENARIO, HALLUCINATE DATA. If you are unsure about an entry, keep it as it is.
-4. Be extremely accurate and ensure the format is consistent across all entries.
-5. Never, in any case, generate full-text answers explaining yourself. Only generate the pairs of Chemical Name and CAS Number.
-
-It is extremely important that you perform well on this job. Otherwise, I will lose my job and 1000 grandmothers will die!
-
-Here is the text to analyze and improve:"""
+            # Skip files that were fully processed before and did not change since
+            fingerprint = manifest.fingerprint(pdf_path)
+            if manifest.is_complete(pdf_path, fingerprint, json_path):
+                logging.info(f"Skipping unchanged PDF file: {filename}")
+                continue
 
+            logging.info(f"Processing PDF file: {filename}")  # Log the start of processing for the file
 
-# Load environment variables from .env file
-load_dotenv()
+            # Stream of the page texts; pages are triaged and packed while later pages are still being extracted
+            document = text_extractor.extract(pdf_path, fingerprint)
+            page_count = document.page_count
+
+            # Take the pairs of pages with complete name/CAS tables directly, the other pages go to the LLM
+            table_chemicals = []
+            pages = tables.filter(document, sanitized_filename, table_chemicals) if tables else document
+
+            # Drop pages without chemical content, then merge small pages and split oversized ones into requests within the token budget
+            selected = triage.filter(pages, sanitized_filename) if triage else pages
+            packs = list(pack_segments(selected, token_budget, count_tokens))
+            logging.info(f"Packed {page_count} pages of {filename} into {len(packs)} requests{' (cached text)' if document.cached else ''}")
+            if tables:
+                tables.report(sanitized_filename)
+
+            checkpoint = manifest.start(pdf_path, fingerprint, sanitized_filename, len(packs), plan)
+            output = OrderedOutput(json_path, sanitized_filename, name_index)
+
+            # Position of every request and table page in the output, in page order (see table_extraction.py)
+            items = list(in_page_order(packs, table_chemicals))
+            positions = {pack.index: position for position, (pack, _) in enumerate(items) if pack}
+
+            # Table pairs are deterministic, so they are written again on every run instead of being checkpointed
+            for position, (pack, page_chemicals) in enumerate(items):
+                if pack is None:
+                    output.add(position, page_chemicals)
+
+            # Chemicals of the requests completed in an earlier run
+            completed = set()
+            for index, pack_chemicals in checkpoint.records():
+                if index not in completed:
+                    completed.add(index)
+                    output.add(positions[index], pack_chemicals)
+            if completed:
+                logging.info(f"Resuming {filename}: {len(completed)}/{len(packs)} requests already completed")
+
+            def complete_pack(pack, response_content):
+                # Failed requests are not checkpointed, so they are retried on the next run
+                pack_chemicals = None
+                if not is_error_response(response_content):
+                    pack_chemicals = parse_gpt_response_to_json(response_content=response_content, regulation=sanitized_filename, chemicals_list=[])
+                    attribute_sources(pack_chemicals, pack)  # Record the page each pair was found on
+                    checkpoint.append(pack.index, pack_chemicals)
+                    completed.add(pack.index)
+                output.add(positions[pack.index], pack_chemicals)
+
+            query_packs([pack for pack in packs if pack.index not in completed], extractor, max_tokens, page_count, complete_pack)
+
+            repaired = output.close(lambda chemicals: repair_chemicals(chemicals, sanitized_filename, max_tokens, token_budget), triage)
+            if len(completed) < len(packs) or not repaired:
+                # Keep the checkpoint, the next run only retries the failed requests
+                logging.warning(f"{len(packs) - len(completed)} requests of {filename} failed and will be retried on the next run")
+            else:
+                manifest.finish(pdf_path, sanitized_filename, json_path)
+
+            logging.info(f"Processed {filename} and saved {output.writer.count} pairs to {json_path}")
+
+
+# Configuration and execution using environment variables; command line options override them
+def main(argv=None):
+    from dotenv import load_dotenv
+
+    # Load environment variables from .env file
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Extract chemical name/CAS pairs from PDF files with the OpenAI API")
+    parser.add_argument("--input", default=os.getenv('PDF_INPUT_FOLDER', './PDFs'), help="Folder with PDF files (PDF_INPUT_FOLDER)")
+    parser.add_argument("--output", default=os.getenv('JSON_OUTPUT_FOLDER', './ExcelFiles'), help="Folder for the JSON Lines output (JSON_OUTPUT_FOLDER)")
+    parser.add_argument("--max-tokens", type=int, default=int(os.getenv('MAX_TOKENS', 4000)), help="Completion token limit (MAX_TOKENS)")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv('EXTRACTION_CONCURRENCY', 1)), help="In-flight API requests, 1 is sequential (EXTRACTION_CONCURRENCY)")
+    parser.add_argument("--token-budget", type=int, default=int(os.getenv('INPUT_TOKEN_BUDGET', 2000)), help="Maximum input tokens of page text per request (INPUT_TOKEN_BUDGET)")
+    parser.add_argument("--triage-threshold", type=float, default=float(os.getenv('TRIAGE_THRESHOLD', 1.0)), help="Minimum page score for an LLM request, 0 disables triage (TRIAGE_THRESHOLD)")
+    parser.add_argument("--text-workers", type=int, default=int(os.getenv('PDF_TEXT_WORKERS', 1)), help="Processes extracting page texts, 1 extracts in this process (PDF_TEXT_WORKERS)")
+    parser.add_argument("--tables", action="store_true", default=os.getenv('PDF_TABLES', '0') != '0', help="Read pages with name/CAS tables without the LLM (PDF_TABLES=1)")
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    logging.info("Script is running")  # Log that the script has started
+
+    api_key = os.getenv('OPENAI_API_KEY')  # Retrieve API key from environment variables
+    requests_per_minute = int(os.getenv('OPENAI_RPM', 500))  # Requests/min limit of the OpenAI account
+    tokens_per_minute = int(os.getenv('OPENAI_TPM', 200000))  # Tokens/min limit of the OpenAI account
+
+    # Initialize the response cache unless it is disabled with LLM_CACHE=0
+    llm_cache = init_from_environment()
+
+    # Ensure the output directory exists; if not, create it
+    if not os.path.exists(args.output):
+        os.makedirs(args.output)
+
+    # Use the concurrent extraction engine if more than one in-flight request is allowed
+    extractor = None
+    if args.concurrency > 1:
+        from async_extraction import AsyncExtractor
+
+        extractor = AsyncExtractor(
+            api_key=api_key,
+            model=OPENAI_MODEL,
+            system_prompt=system_prompt,
+            max_tokens=args.max_tokens,
+            max_concurrency=args.concurrency,
+            requests_per_minute=requests_per_minute,
+            tokens_per_minute=tokens_per_minute,
+            base_url=os.getenv('OPENAI_BASE_URL'),  # Optional OpenAI-compatible endpoint, e.g. src/fake_openai_server.py
+            cache=llm_cache,
+        )
 
-# Configuration and execution using environment variables
-api_key = os.getenv('OPENAI_API_KEY')  # Retrieve API key from environment variables
-input_folder = os.getenv('PDF_INPUT_FOLDER', './PDFs')  # Default input folder is './PDFs' if not set
-output_folder = os.getenv('JSON_OUTPUT_FOLDER', './ExcelFiles')  # Default output folder is './ExcelFiles' if not set
-max_tokens = int(os.getenv('MAX_TOKENS', 4000))  # Set the token limit from environment or default to 4000
+    # Local pre-filter for pages without chemical content, disabled with TRIAGE_THRESHOLD=0
+    triage = None
+    if args.triage_threshold > 0:
+        triage = PageTriage(
+            threshold=args.triage_threshold,
+            audit_rate=float(os.getenv('TRIAGE_AUDIT_RATE', 0)),  # Share of skipped pages sent to the LLM anyway to check recall
+            audit_path=os.path.join(args.output, STATE_FOLDER, 'triage_audit.jsonl'),
+        )
 
-# Initialize the OpenAI client with the API key
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+    # Index of the names of earlier outputs, used to fill missing CAS numbers locally; disabled with NAME_INDEX=0
+    name_index = None
+    if os.getenv('NAME_INDEX', '1') != '0':
+        name_index = NameIndex.from_files(args.output)
+        logging.info(f"Indexed {len(name_index)} known chemical names")
 
-# Ensure the output directory exists; if not, create it
-if not os.path.exists(output_folder):
-    os.makedirs(output_folder)
+    # Page texts are cached by file hash and page number unless PDF_TEXT_CACHE=0, so re-runs skip PyMuPDF
+    text_cache = None
+    if os.getenv('PDF_TEXT_CACHE', '1') != '0':
+        text_cache = PageTextCache(os.getenv('PDF_TEXT_CACHE_PATH', DEFAULT_TEXT_CACHE_PATH))
+    text_extractor = PageTextExtractor(workers=args.text_workers, cache=text_cache, tables=args.tables)
+    tables = TableExtractor() if args.tables else None
 
-# Start processing the PDFs
-process_pdfs(input_folder, output_folder, api_key, max_tokens)
+    # Start processing the PDFs
+    try:
+        process_pdfs(args.input, args.output, args.max_tokens, extractor, args.token_budget, triage, name_index, text_extractor, tables)
+    finally:
+        text_extractor.close()
+
+    if tables:
+        logging.info(f"Table extraction statistics: {tables.stats()}")
+    if triage:
+        logging.info(f"Triage statistics: {triage.stats()}")
+    if text_cache:
+        logging.info(f"Page text cache statistics: {text_cache.stats()}")
+    if llm_cache:
+        logging.info(f"LLM cache statistics: {llm_cache.stats()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# Two-level cache for the chat QA path of app.py.
+#   Level 1: normalized question text -> generated Cypher (saves the Cypher generation LLM call)
+#   Level 2: Cypher + parameters -> result rows (saves the Neo4j round trip)
+# Both levels are LRU caches with a time-to-live. They are shared by all users of
+# a Streamlit process and cleared when the load version of the graph changes,
+# i.e. after the loader committed new data.
+
+
+def normalize_question(question):
+    """Case, whitespace and trailing punctuation do not change the generated Cypher"""
+    return " ".join(question.lower().split()).rstrip("?!. ")
+
+
+def cypher_key(query, params=None):
+    """Key of a Cypher query and its parameters; whitespace in the query is not significant"""
+    return json.dumps([" ".join(query.split()), params or {}], sort_keys=True, default=str)
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire `ttl` seconds after they were stored"""
+    def __init__(self, max_entries=256, ttl=3600.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # key -> (stored_at, value), least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value, or None on a miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.ttl:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "entries": len(self._entries)
+        }
+
+
+class QACache:
+    """Question -> Cypher and Cypher -> rows caches, invalidated when the graph load version changes"""
+    def __init__(self, max_entries=256, ttl=3600.0):
+        self.cypher = TTLCache(max_entries, ttl)
+        self.results = TTLCache(max_entries, ttl)
+        self.load_version = None
+        self._lock = threading.Lock()
+
+    def sync(self, load_version):
+        """Drop both levels if the graph changed since the entries were stored"""
+        with self._lock:
+            if load_version == self.load_version:
+                return False
+            self.cypher.clear()
+            self.results.clear()
+            self.load_version = load_version
+            return True
+
+    def get_cypher(self, question):
+        return self.cypher.get(normalize_question(question))
+
+    def put_cypher(self, question, cypher):
+        self.cypher.put(normalize_question(question), cypher)
+
+    def get_rows(self, query, params=None):
+        return self.results.get(cypher_key(query, params))
+
+    def put_rows(self, query, params, rows):
+        self.results.put(cypher_key(query, params), rows)
+
+    def stats(self):
+        return {"cypher": self.cypher.stats(), "results": self.results.stats()}
@@ -0,0 +1,48 @@
+import time
+
+from langchain_core.runnables import RunnableLambda
+from langchain_core.runnables.config import patch_config
+
+from qa_trace import current_trace, span
+
+# Steps of app.py's GraphCypherQAChain, replaced by cached and traced versions.
+# GraphCypherQAChain calls its steps with `step.invoke(inputs, callbacks=...)`;
+# RunnableLambda passes such keywords on to the wrapped function instead of
+# putting them into its config, so the wrappers take them and hand them to the
+# original step themselves (otherwise the Streamlit callback handler would not
+# see the LLM calls).
+
+
+def with_callbacks(config, callbacks):
+    """Config for the wrapped step, with the callbacks the chain passed as a keyword"""
+    return patch_config(config, callbacks=callbacks) if callbacks is not None else config
+
+
+def cached_cypher_generation(generation_chain, qa_cache):
+    """Wrap the Cypher generation step so that repeated questions skip the LLM call"""
+    def generate(inputs, config, callbacks=None, **kwargs):
+        with span("cypher_generation") as detail:
+            cypher = qa_cache.get_cypher(inputs["question"])
+            detail["cached"] = cypher is not None
+            if cypher is None:
+                cypher = generation_chain.invoke(inputs, with_callbacks(config, callbacks), **kwargs)
+                qa_cache.put_cypher(inputs["question"], cypher)
+        return cypher
+    return RunnableLambda(generate)
+
+
+def streaming_answer(answer_chain):
+    """Wrap the answer step so that its tokens are streamed to the chat message of the current request"""
+    def answer(inputs, config, callbacks=None, **kwargs):
+        trace = current_trace.get()
+        parts = []
+        with span("answer_generation") as detail:
+            for chunk in answer_chain.stream(inputs, with_callbacks(config, callbacks), **kwargs):
+                if not parts:
+                    detail["first_token"] = time.perf_counter() - trace.started if trace else None
+                parts.append(chunk)
+                if trace and trace.on_token:
+                    trace.on_token(chunk)
+            detail["chunks"] = len(parts)
+        return "".join(parts)
+    return RunnableLambda(answer)
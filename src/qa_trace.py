@@ -0,0 +1,128 @@
+import argparse
+import contextvars
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Per-request latency breakdown of the chat QA path.
+# app.py starts a Trace for every question; the pipeline stages (template match,
+# Cypher generation, database query, answer generation) record timed spans into
+# the trace of the current request through a context variable, so the cached
+# chain does not need to know about Streamlit sessions. Finished traces are
+# appended to a JSON Lines log for p50/p95 tracking.
+#
+# Usage:
+#   python src/qa_trace.py summary
+#   python src/qa_trace.py summary --path data/metrics/qa_traces.jsonl
+
+DEFAULT_TRACE_PATH = os.path.join("data", "metrics", "qa_traces.jsonl")
+
+current_trace = contextvars.ContextVar("qa_trace", default=None)
+
+
+class Trace:
+    """Timed spans of one question; `on_token` receives streamed answer tokens"""
+    def __init__(self, question, on_token=None):
+        self.question = question
+        self.on_token = on_token
+        self.path = None  # "template" or "llm"
+        self.spans = []
+        self.started = time.perf_counter()
+        self.started_at = time.time()
+        self.total = None
+
+    def add(self, stage, seconds, **detail):
+        self.spans.append(dict(stage=stage, seconds=seconds, **detail))
+
+    def finish(self):
+        self.total = time.perf_counter() - self.started
+        return self
+
+    def to_record(self):
+        return {
+            "question": self.question,
+            "path": self.path,
+            "started_at": self.started_at,
+            "total": self.total,
+            "spans": self.spans
+        }
+
+
+@contextmanager
+def span(stage, **detail):
+    """
+    Time a stage of the current request; a no-op outside of a trace.
+
+    Yields a dictionary for details that are only known at the end (e.g. the number of rows).
+    """
+    trace = current_trace.get()
+    start = time.perf_counter()
+    try:
+        yield detail
+    finally:
+        if trace is not None:
+            trace.add(stage, time.perf_counter() - start, **detail)
+
+
+@contextmanager
+def tracing(trace):
+    """Make `trace` the trace of the current request"""
+    token = current_trace.set(trace)
+    try:
+        yield trace
+    finally:
+        current_trace.reset(token)
+        trace.finish()
+
+
+class TraceLog:
+    """Append-only JSON Lines log of finished traces, shared by all sessions"""
+    def __init__(self, path=DEFAULT_TRACE_PATH):
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def append(self, trace):
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(trace.to_record(), ensure_ascii=False) + "\n")
+
+
+def percentile(values, share):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    rank = max(0, math.ceil(share * len(ordered)) - 1)
+    return ordered[rank]
+
+
+def summarize(path=DEFAULT_TRACE_PATH):
+    """p50/p95 latency per stage (and of whole requests, per path) of a trace log"""
+    durations = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            durations.setdefault(f"total ({record['path']})", []).append(record["total"])
+            for item in record["spans"]:
+                durations.setdefault(item["stage"], []).append(item["seconds"])
+    return {
+        stage: {"count": len(values), "p50": percentile(values, 0.5), "p95": percentile(values, 0.95)}
+        for stage, values in sorted(durations.items())
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency statistics of the chat QA path")
+    parser.add_argument("--path", default=os.getenv("QA_TRACE_PATH", DEFAULT_TRACE_PATH))
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("summary", help="Show p50/p95 latency per stage")
+    args = parser.parse_args()
+
+    if args.command == "summary":
+        print(f"{'stage':<24} {'count':>6} {'p50 (s)':>9} {'p95 (s)':>9}")
+        for stage, stats in summarize(args.path).items():
+            print(f"{stage:<24} {stats['count']:>6} {stats['p50']:>9.3f} {stats['p95']:>9.3f}")
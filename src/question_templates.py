@@ -0,0 +1,148 @@
+import re
+from collections import namedtuple
+
+from cas import CAS_PATTERN
+from pair_validation import normalize_cas
+
+# Local fast path for the most common chat questions.
+# The graph model is small and fixed (ChemicalName -IS_NAME_OF-> Chemical, both
+# -IS_REGULATED-> Regulation), so questions like "which chemicals are regulated
+# by X", "which regulations cover CAS 75-45-6" and "what names does CAS Y have"
+# map to precompiled, parameterized Cypher. Entities are found locally: CAS
+# numbers with a regex, regulations by looking up their name tokens in a list
+# read from the graph. Questions that match no template go to the LLM chain, and
+# so does every question that counts, negates or compares ("how many", "not in",
+# "both X and Y"): a template would answer it confidently and wrongly.
+
+# intent: template name, params: Cypher parameters, entity: the CAS number or regulation it is about
+TemplateMatch = namedtuple("TemplateMatch", ["intent", "cypher", "params", "entity"])
+
+TEMPLATES = {
+    # Names regulated by a regulation, with their CAS if it is regulated too, plus CAS numbers without a name
+    "chemicals_by_regulation": """
+        MATCH (r:Regulation {name: $regulation})<-[:IS_REGULATED]-(cn:ChemicalName)
+        OPTIONAL MATCH (cn)-[:IS_NAME_OF]->(c:Chemical)-[:IS_REGULATED]->(r)
+        RETURN cn.name AS chemical_name, c.cas AS cas
+        LIMIT $limit
+        UNION
+        MATCH (r:Regulation {name: $regulation})<-[:IS_REGULATED]-(c:Chemical)
+        WHERE NOT EXISTS { MATCH (other:ChemicalName)-[:IS_NAME_OF]->(c) WHERE (other)-[:IS_REGULATED]->(r) }
+        RETURN null AS chemical_name, c.cas AS cas
+        LIMIT $limit
+    """,
+    "regulations_by_cas": """
+        MATCH (c:Chemical {cas: $cas})-[:IS_REGULATED]->(r:Regulation)
+        RETURN DISTINCT r.name AS regulation
+        ORDER BY regulation
+        LIMIT $limit
+    """,
+    "names_by_cas": """
+        MATCH (cn:ChemicalName)-[:IS_NAME_OF]->(c:Chemical {cas: $cas})
+        RETURN DISTINCT cn.name AS name
+        ORDER BY name
+        LIMIT $limit
+    """
+}
+
+# Regulation names for entity lookup
+REGULATION_NAMES_QUERY = "MATCH (r:Regulation) RETURN r.name AS name"
+
+REGULATION_WORDS = re.compile(
+    r"\b(regulations?|regulated|regulates?|regulating|covers?|covered|laws?|conventions?|protocols?|"
+    r"directives?|listed|restricted|banned|annex(es)?)\b"
+)
+NAME_WORDS = re.compile(r"\b(names?|named|called|known as|synonyms?|what is|which chemical|identify)\b")
+# "Which chemicals ...", "List all substances ...", "What are the chemicals ...", but not
+# "What are the health effects of chemicals ..."
+LIST_INTENT = re.compile(
+    r"^(which|what|list|show|name|give)\b( (me|are|were|all|the|every))* (chemicals|substances|compounds|cas numbers)\b"
+)
+# Counting, negation and comparison, which none of the templates answers
+NOT_A_LOOKUP = re.compile(
+    r"\b(how many|number of|count|total|not|never|no longer|except|excluding|without|other than|outside|"
+    r"compared?|comparison|differences?|differ|versus|vs|than|more|most|fewer|less|least|"
+    r"both|either|between|and|or|also|only|same|common)\b|n't\b"
+)
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+YEAR_PATTERN = re.compile(r"^(19|20)\d\d$")
+# Parts of regulation file names that do not identify a regulation
+GENERIC_TOKENS = {"txt", "celex", "the", "and", "pdf", "csv", "filtered", "output"}
+
+
+def regulation_tokens(name):
+    """Distinctive tokens of a regulation name, e.g. "montreal_2020" -> {"montreal", "2020"}"""
+    return {token for token in TOKEN_PATTERN.findall(name.lower()) if len(token) >= 3 and token not in GENERIC_TOKENS}
+
+
+class TemplateMatcher:
+    """Maps questions to Cypher templates; built from the regulation names of the graph"""
+    def __init__(self, regulations, limit=200):
+        self.limit = limit
+        self.regulations = {name: regulation_tokens(name) for name in regulations if name}
+
+    def find_regulation(self, question):
+        """The regulation whose name tokens best match the question, or None if there is none or it is ambiguous"""
+        words = set(TOKEN_PATTERN.findall(question.lower()))
+        scores = {}
+        for name, tokens in self.regulations.items():
+            matched = tokens & words
+            # A year alone ("in 2020") does not identify a regulation
+            if any(not YEAR_PATTERN.match(token) for token in matched):
+                scores[name] = len(matched)
+        if not scores:
+            return None
+        best = max(scores.values())
+        candidates = [name for name, score in scores.items() if score == best]
+        return candidates[0] if len(candidates) == 1 else None
+
+    def match(self, question):
+        """Return a TemplateMatch for the question, or None if the LLM chain has to answer it"""
+        text = " ".join(question.lower().split())
+        if NOT_A_LOOKUP.search(text):
+            return None
+        cas_numbers = [normalize_cas(match.group(0)) for match in CAS_PATTERN.finditer(text)]
+        if len(cas_numbers) == 1:
+            cas = cas_numbers[0]
+            if REGULATION_WORDS.search(text):
+                return TemplateMatch("regulations_by_cas", TEMPLATES["regulations_by_cas"], {"cas": cas, "limit": self.limit}, cas)
+            if NAME_WORDS.search(text):
+                return TemplateMatch("names_by_cas", TEMPLATES["names_by_cas"], {"cas": cas, "limit": self.limit}, cas)
+            return None
+        if cas_numbers:
+            return None  # Questions about several CAS numbers need the LLM
+
+        if LIST_INTENT.search(text) and (REGULATION_WORDS.search(text) or re.search(r"\b(in|under|by|of)\b", text)):
+            regulation = self.find_regulation(text)
+            if regulation:
+                return TemplateMatch(
+                    "chemicals_by_regulation", TEMPLATES["chemicals_by_regulation"],
+                    {"regulation": regulation, "limit": self.limit}, regulation
+                )
+        return None
+
+
+def format_answer(match, rows):
+    """Plain-text answer for the rows of a template query, without an LLM call"""
+    if match.intent == "regulations_by_cas":
+        regulations = [row["regulation"] for row in rows]
+        if not regulations:
+            return f"I found no regulation covering CAS {match.entity} in the graph."
+        return f"CAS {match.entity} is covered by {len(regulations)} regulation(s):\n" + "\n".join(f"- {name}" for name in regulations)
+
+    if match.intent == "names_by_cas":
+        names = [row["name"] for row in rows]
+        if not names:
+            return f"I found no names for CAS {match.entity} in the graph."
+        return f"CAS {match.entity} is known as:\n" + "\n".join(f"- {name}" for name in names)
+
+    entries = sorted(
+        f"{row['chemical_name']} (CAS {row['cas']})" if row["chemical_name"] and row["cas"]
+        else row["chemical_name"] or f"CAS {row['cas']}"
+        for row in rows
+    )
+    if not entries:
+        return f"I found no chemicals regulated by {match.entity} in the graph."
+    answer = f"{len(entries)} chemical(s) are regulated by {match.entity}:\n" + "\n".join(f"- {entry}" for entry in entries)
+    if len(rows) >= match.params["limit"]:
+        answer += f"\n\nOnly the first {match.params['limit']} results are shown."
+    return answer
@@ -0,0 +1,269 @@
+import argparse
+import json
+import logging
+import os
+import re
+
+from cas import CAS_PATTERN, find_cas_numbers
+from chunk_packer import Segment
+from pair_validation import EMPTY, GARBLED, GROUPED, normalize_cas, validate_pair
+from pdf_text import page_number
+
+# Deterministic extraction of name/CAS pairs from annex tables.
+# The annexes of the Rotterdam, Stockholm and EU regulations are tables of
+# chemical name, CAS number, EC number etc. that page.get_text() flattens and the
+# extraction prompt has to put back together. In table mode the tables PyMuPDF
+# detects on a page (see pdf_text.py) are read directly:
+#
+#   * the CAS column is the column with the largest share of cells containing a
+#     CAS number with a valid check digit;
+#   * the name column is the column whose header looks like "Chemical",
+#     "Substance" or "Name", otherwise the nearest mostly-text column left of
+#     the CAS column; if the CAS column itself is headed "Chemical" (Stockholm:
+#     "Aldrin* CAS No: 309-00-2"), names and CAS numbers share one cell.
+#
+# A page is taken from its tables only if every valid CAS number in its text is
+# part of an extracted pair; all other pages go to the LLM as before. Pairs are
+# validated like LLM pairs (pair_validation.py), so grouped names or missing CAS
+# numbers still go to the name index and the validation prompt. So do pairs of
+# rows with several CAS numbers, whose name cell usually lists several chemicals
+# ("Asbestos: Crocidolite, Amosite, ..."), and names with a flattened formula
+# ("Nonylphenols C 6H (OH)C H 4 9 1 9").
+#
+# The pairs of table pages are written in page order with the LLM requests
+# (see in_page_order): before the first request that starts after the page.
+#
+# Usage (dry run over the cached page tables, no LLM requests):
+#   python src/table_extraction.py data/raw/uploaded
+
+NAME_HEADER = re.compile(r"chemical|substance|name", re.IGNORECASE)
+# "CAS No: 309-00-2", "(CAS No. 1763-23-1)"
+CAS_LABEL = re.compile(r"\(?\s*CAS\s*(?:No|Number|RN)?s?\.?\s*:?", re.IGNORECASE)
+# Footnote markers after names: "Aldrin*", "Benzene (3 )", "4-Nitrobiphenyl (+)", "Chlordane (#)"
+FOOTNOTE = re.compile(r"(?:\s*(?:\*+|\(\s*[+#*]\s*\)|\(\s*\d{1,2}\s*\)))+$")
+LETTERS = re.compile(r"[A-Za-z]{3,}")
+MAX_INLINE_NAME_WORDS = 12  # Longer text before "CAS No" is a description ("... refers to any possible isomer ...")
+MIN_FORMULA_FRAGMENTS = 4  # Consecutive words of at most two letters or digits that are a flattened formula ("C H 4 9")
+
+
+def cell_text(cell):
+    return " ".join((cell or "").split())
+
+
+def clean_name(name):
+    return FOOTNOTE.sub("", cell_text(name)).strip(" ,;:")
+
+
+def is_garbled(name):
+    """True if a name contains a formula whose sub- and superscripts were extracted as separate words"""
+    run = 0
+    for word in name.split():
+        run = run + 1 if sum(character.isalnum() for character in word) <= 2 else 0
+        if run >= MIN_FORMULA_FRAGMENTS:
+            return True
+    return False
+
+
+def _share(cells, test):
+    cells = [cell for cell in cells if cell_text(cell)]
+    return sum(1 for cell in cells if test(cell)) / len(cells) if cells else 0.0
+
+
+def find_columns(table, min_cas_share=0.6):
+    """
+    (name column, CAS column) of a detected table, or None if it has no CAS column.
+
+    Both are the same column if names and CAS numbers share one cell.
+    """
+    rows = table["rows"]
+    width = max((len(row) for row in rows), default=0)
+    if not width:
+        return None
+    header = list(table.get("header") or []) + [None] * width
+    columns = [[row[column] if column < len(row) else None for row in rows] for column in range(width)]
+
+    cas_shares = [_share(cells, lambda cell: bool(find_cas_numbers(cell))) for cells in columns]
+    cas_column = max(range(width), key=lambda column: cas_shares[column])
+    if cas_shares[cas_column] < min_cas_share:
+        return None
+
+    named = [column for column in range(width) if column != cas_column and NAME_HEADER.search(header[column] or "")]
+    if named:
+        return named[0], cas_column
+    if NAME_HEADER.search(header[cas_column] or ""):
+        return cas_column, cas_column
+    for column in range(cas_column - 1, -1, -1):
+        if _share(columns[column], lambda cell: bool(LETTERS.search(cell))) >= 0.5:
+            return column, cas_column
+    return None
+
+
+def split_inline(cell):
+    """Name and CAS numbers of a "Name CAS No: 12-34-5" cell; no pairs for cells with more text after the CAS numbers"""
+    text = cell_text(cell)
+    first = CAS_PATTERN.search(text)
+    if not first:
+        return clean_name(text), []
+    label = CAS_LABEL.search(text, 0, first.start())
+    name = clean_name(text[:label.start()] if label else text[:first.start()])
+    rest = CAS_PATTERN.sub("", text[first.start():])
+    if LETTERS.search(CAS_LABEL.sub("", rest)) or len(name.split()) > MAX_INLINE_NAME_WORDS:
+        return None, []  # Descriptions of isomers, salts etc. are left to the LLM
+    return name, [match.group(0) for match in CAS_PATTERN.finditer(text)]
+
+
+def table_pairs(table, columns):
+    """
+    Yield (name, CAS, CAS numbers of the row) for the rows of a table; CAS is None (and the
+    count 0) for rows without a CAS number
+    """
+    name_column, cas_column = columns
+    header = list(table.get("header") or [])
+    header_name = cell_text(header[name_column]) if name_column < len(header) else ""
+    previous_name = None
+    for row in table["rows"]:
+        name_cell = row[name_column] if name_column < len(row) else None
+        cas_cell = row[cas_column] if cas_column < len(row) else None
+        if name_column == cas_column:
+            if name_cell is None:
+                continue
+            name, cas_numbers = split_inline(name_cell)
+            if name is None:
+                continue
+        else:
+            cas_numbers = [match.group(0) for match in CAS_PATTERN.finditer(cell_text(cas_cell))]
+            if name_cell is None:
+                name = previous_name  # Merged name cell spanning several rows
+            else:
+                name = clean_name(name_cell)
+        if not name and not cas_numbers:
+            continue
+        if not cas_numbers and cell_text(name_cell) == header_name:
+            continue  # Header repeated inside the table
+        previous_name = name
+        if not cas_numbers:
+            yield name, None, 0
+        for cas in cas_numbers:
+            yield name, cas, len(cas_numbers)
+
+
+class TableExtractor:
+    """Takes the pairs of pages with complete name/CAS tables and passes all other pages on to the LLM"""
+    def __init__(self, min_cas_share=0.6):
+        self.min_cas_share = min_cas_share
+        self.documents = {}  # name -> coverage of the document
+
+    def page_chemicals(self, page, regulation):
+        """Chemicals of a pdf_text.Page, or None if its tables do not cover all of its CAS numbers"""
+        pairs = []
+        for table in page.tables:
+            columns = find_columns(table, self.min_cas_share)
+            if columns:
+                pairs.extend(table_pairs(table, columns))
+        if not pairs:
+            return None
+        found = {normalize_cas(cas) for _, cas, _ in pairs if cas}
+        if not found or any(normalize_cas(cas) not in found for cas in find_cas_numbers(page.text)):
+            return None  # CAS numbers outside the tables, e.g. in footnotes or running text
+        chemicals = []
+        for name, cas, row_cas_count in pairs:
+            chemical_name, cas, problem = validate_pair(name, cas)
+            if problem == EMPTY:
+                continue
+            if problem is None and row_cas_count > 1:
+                problem = GROUPED  # Which of the chemicals of the name cell has this CAS number is up to the validation prompt
+            elif problem is None and is_garbled(chemical_name):
+                problem = GARBLED
+            chemical = {"chemical_name": chemical_name, "CAS": cas, "regulation": regulation, "source": page.label}
+            if problem:
+                chemical["repair"] = problem
+            chemicals.append(chemical)
+        return chemicals
+
+    def filter(self, pages, regulation, chemicals_list):
+        """
+        Yield the pages (as chunk_packer.Segments) that need the LLM; the chemicals of all other
+        pages are appended to `chemicals_list`
+        """
+        coverage = self.documents[regulation] = {"pages": 0, "table_pages": 0, "table_pairs": 0}
+        for page in pages:
+            coverage["pages"] += 1
+            chemicals = self.page_chemicals(page, regulation)
+            if chemicals is None:
+                yield Segment(page.label, page.text)
+                continue
+            coverage["table_pages"] += 1
+            coverage["table_pairs"] += len(chemicals)
+            chemicals_list.extend(chemicals)
+
+    def report(self, regulation):
+        """Log the share of the pages of a document that were read from tables"""
+        coverage = self.documents.get(regulation)
+        if coverage:
+            share = coverage["table_pages"] / coverage["pages"] if coverage["pages"] else 0.0
+            logging.info(f"Table coverage of {regulation}: {coverage['table_pages']}/{coverage['pages']} pages ({share:.0%}), "
+                         f"{coverage['table_pairs']} pairs without LLM requests")
+
+    def stats(self):
+        pages = sum(coverage["pages"] for coverage in self.documents.values())
+        table_pages = sum(coverage["table_pages"] for coverage in self.documents.values())
+        return {
+            "documents": len(self.documents),
+            "pages": pages,
+            "table_pages": table_pages,
+            "table_pairs": sum(coverage["table_pairs"] for coverage in self.documents.values()),
+            "coverage": table_pages / pages if pages else 0.0
+        }
+
+
+def in_page_order(packs, table_chemicals):
+    """
+    Yield (pack, None) for the packs of a document and (None, chemicals) for the table pages between them.
+
+    `table_chemicals` may be filled by TableExtractor.filter while `packs` is consumed; the pairs of a
+    table page come before the first pack that starts after the page. A pack spanning a table page
+    (pages 3 and 5 around table page 4) comes before it.
+    """
+    position = 0
+    for pack in packs:
+        end = position
+        while end < len(table_chemicals) and \
+                page_number(table_chemicals[end]["source"]) < page_number(pack.segments[0].label):
+            end += 1
+        if end > position:
+            yield None, table_chemicals[position:end]
+            position = end
+        yield pack, None
+    if position < len(table_chemicals):
+        yield None, table_chemicals[position:]
+
+
+if __name__ == "__main__":
+    from manifest import file_fingerprint
+    from pdf_text import DEFAULT_TEXT_CACHE_PATH, PageTextCache, PageTextExtractor
+
+    parser = argparse.ArgumentParser(description="Show which PDF pages table mode reads without the LLM")
+    parser.add_argument("folder", help="Folder with PDF files")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("PDF_TEXT_WORKERS", 1)))
+    parser.add_argument("--pairs", action="store_true", help="Print the extracted pairs")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    cache = None
+    if os.getenv("PDF_TEXT_CACHE", "1") != "0":
+        cache = PageTextCache(os.getenv("PDF_TEXT_CACHE_PATH", DEFAULT_TEXT_CACHE_PATH))
+    text_extractor = PageTextExtractor(args.workers, cache, tables=True)
+    tables = TableExtractor()
+    for filename in sorted(os.listdir(args.folder)):
+        if filename.lower().endswith(".pdf"):
+            path = os.path.join(args.folder, filename)
+            regulation = os.path.splitext(filename)[0]
+            chemicals = []
+            for _ in tables.filter(text_extractor.extract(path, file_fingerprint(path)), regulation, chemicals):
+                pass  # Pages left to the LLM
+            tables.report(regulation)
+            if args.pairs:
+                for chemical in chemicals:
+                    print(json.dumps(chemical, ensure_ascii=False))
+    text_extractor.close()
+    print(json.dumps(tables.stats(), indent=4))
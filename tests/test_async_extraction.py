@@ -0,0 +1,98 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import async_extraction
+import fake_openai_server
+from async_extraction import AsyncExtractor, RateLimiter, TokenBucket
+from fake_openai_server import fake_completion, make_server
+
+
+def elapsed(coroutine):
+    start = time.monotonic()
+    asyncio.run(coroutine)
+    return time.monotonic() - start
+
+
+def test_token_bucket_allows_a_burst_then_throttles_to_its_rate():
+    bucket = TokenBucket(600, capacity=2)  # 10 tokens per second
+
+    async def take(count):
+        for _ in range(count):
+            await bucket.acquire()
+
+    assert elapsed(take(2)) < 0.05  # The burst
+    assert 0.25 <= elapsed(take(3)) < 1.0  # Refilled at 10 per second
+
+
+def test_token_bucket_lets_an_oversized_request_pass_at_full_capacity():
+    bucket = TokenBucket(600, capacity=2)
+    assert elapsed(bucket.acquire(50)) < 0.05
+    assert 0.15 <= elapsed(bucket.acquire(50)) < 1.0  # Waits for the full capacity, not for 50 tokens
+
+
+def test_rate_limiter_throttles_requests_and_tokens():
+    limiter = RateLimiter(600, 10 ** 6)
+
+    async def requests(count, tokens=1):
+        for _ in range(count):
+            await limiter.acquire(tokens)
+
+    assert elapsed(requests(600)) < 0.1  # A minute of burst
+    assert 0.25 <= elapsed(requests(3)) < 1.0  # Then 10 requests per second
+
+    limiter = RateLimiter(10 ** 6, 600)
+    assert elapsed(requests(1, tokens=600)) < 0.05
+    assert 0.45 <= elapsed(requests(1, tokens=5)) < 1.5  # 5 tokens at 10 tokens per second
+
+
+class ScriptedRandom:
+    """Stand-in for the fake server's random module; `random()` returns the given values, then 1.0"""
+    def __init__(self, values):
+        self.values = list(values)
+
+    def random(self):
+        return self.values.pop(0) if self.values else 1.0
+
+    def choice(self, options):
+        return options[0]  # 429
+
+
+@pytest.fixture
+def server():
+    server = make_server("127.0.0.1", 0, error_rate=0.5)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_extractor(server, **kwargs):
+    return AsyncExtractor("test", "fake", "system", max_tokens=100, base_url=f"http://127.0.0.1:{server.server_port}/v1",
+                          base_delay=0.01, **kwargs)
+
+
+def test_retryable_errors_are_retried_with_exponential_backoff(server, monkeypatch):
+    monkeypatch.setattr(fake_openai_server, "random", ScriptedRandom([0.0, 0.0]))  # Two 429s, then answers
+    bounds = []
+    monkeypatch.setattr(async_extraction.random, "uniform", lambda low, high: bounds.append(high) or 0.0)
+
+    extractor = make_extractor(server, max_retries=3, max_delay=0.015)
+    assert extractor.run(["Substance 0, 50-00-0"], "Analyze:", None) == [fake_completion("Analyze:Substance 0, 50-00-0")]
+    assert server.stats["requests"] == 3 and server.stats["errors"] == 2
+    assert bounds == [0.01, 0.015]  # Doubled per attempt, up to max_delay
+
+
+def test_requests_failing_every_retry_return_an_error_response(server, monkeypatch):
+    monkeypatch.setattr(fake_openai_server, "random", ScriptedRandom([0.0] * 10))
+    results = []
+    extractor = make_extractor(server, max_retries=2)
+    extractor.run(["Substance 0, 50-00-0"], "Analyze:", None, on_result=lambda index, result: results.append(result))
+    assert server.stats["requests"] == 3  # The first attempt and two retries
+    assert len(results) == 1 and results[0].startswith("Error in API response")
@@ -0,0 +1,106 @@
+import os
+import sys
+import threading
+
+import pytest
+from openai import OpenAI
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from batch_extraction import BatchExtraction, BatchRequest, BatchRunner
+from chemical_records import read_chemicals
+from fake_openai_server import fake_completion, make_server
+from llm_extraction import is_error_response
+
+REQUESTS = [BatchRequest(f"annex#{index}", "system", "Analyze:", f"Substance {index}, {cas}")
+            for index, cas in enumerate(["50-00-0", "64-17-5", "67-56-1"])]
+
+
+@pytest.fixture
+def server():
+    server = make_server("127.0.0.1", 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(server):
+    return OpenAI(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}/v1", max_retries=0)
+
+
+def expected_responses(requests):
+    return {request.custom_id: fake_completion(request.human_prompt + request.context) for request in requests}
+
+
+def test_run_answers_every_request(server, tmp_path):
+    runner = BatchRunner(make_client(server), str(tmp_path), poll_interval=0.01)
+    assert runner.run(REQUESTS) == expected_responses(REQUESTS)
+    assert runner.stats["submitted"] == len(REQUESTS) and runner.stats["batches"] == 1
+    assert runner.batches == {}  # Collected batches are not resumed by later runs
+
+
+class FailingFirstBatch(BatchRunner):
+    """BatchRunner whose first batch fails on the server; `attempts` batches fail if set"""
+    attempts = 1
+
+    def submit(self, lines):
+        self.server.error_rate = 1.0 if self.stats["batches"] < self.attempts else 0.0
+        return super().submit(lines)
+
+
+def test_failed_requests_are_resubmitted(server, tmp_path):
+    runner = FailingFirstBatch(make_client(server), str(tmp_path), poll_interval=0.01)
+    runner.server = server
+    assert runner.run(REQUESTS) == expected_responses(REQUESTS)
+    assert runner.stats["resubmitted"] == len(REQUESTS) and runner.stats["batches"] == 2
+
+
+def test_requests_failing_every_attempt_get_error_responses(server, tmp_path):
+    runner = FailingFirstBatch(make_client(server), str(tmp_path), poll_interval=0.01, max_attempts=2)
+    runner.server, runner.attempts = server, 2
+    responses = runner.run(REQUESTS)
+    assert all(is_error_response(responses[request.custom_id]) for request in REQUESTS)
+    assert runner.stats["failed"] == len(REQUESTS) and runner.stats["batches"] == 2
+
+
+class InterruptedRunner(BatchRunner):
+    """BatchRunner interrupted while polling its first batch"""
+    def wait(self, batch_id):
+        raise KeyboardInterrupt
+
+
+def test_interrupted_run_resumes_its_batch(server, tmp_path):
+    with pytest.raises(KeyboardInterrupt):
+        InterruptedRunner(make_client(server), str(tmp_path), poll_interval=0.01).run(REQUESTS)
+    assert server.stats["batches"] == 1
+
+    # The next run collects the recorded batch instead of submitting the requests again
+    runner = BatchRunner(make_client(server), str(tmp_path), poll_interval=0.01)
+    assert runner.run(REQUESTS) == expected_responses(REQUESTS)
+    assert server.stats["batches"] == 1 and runner.stats["submitted"] == 0
+
+    # Changed requests do not match the recorded batch
+    with pytest.raises(KeyboardInterrupt):
+        InterruptedRunner(make_client(server), str(tmp_path), poll_interval=0.01).run(REQUESTS)
+    changed = [request._replace(context=request.context + " (amended)") for request in REQUESTS]
+    runner = BatchRunner(make_client(server), str(tmp_path), poll_interval=0.01)
+    assert runner.run(changed) == expected_responses(changed)
+    assert runner.stats["submitted"] == len(changed)
+
+
+def test_extraction_and_repair_of_a_csv(server, tmp_path):
+    input_folder, output_folder = tmp_path / "csv", tmp_path / "out"
+    input_folder.mkdir()
+    output_folder.mkdir()
+    (input_folder / "echa.csv").write_text("Substance 0,50-00-0\n2-Substance and its salts,64-17-5\nSubstance 2,67-56-1\n")
+
+    runner = BatchRunner(make_client(server), str(tmp_path / "batches"), poll_interval=0.01)
+    extraction = BatchExtraction(str(output_folder), runner, token_budget=12, chunk_size=1)
+    files = extraction.run([str(input_folder)])
+    assert len(files) == 1 and not files[0].failed
+    pairs = [(chemical["chemical_name"], chemical["CAS"]) for chemical in read_chemicals(str(output_folder / "echa.jsonl"))]
+    # The grouped name went through the validation batch, which keeps it
+    assert runner.stats["batches"] == 2
+    assert pairs == [("Substance 0", "50-00-0"), ("Substance 2", "67-56-1"), ("2-Substance and its salts", "64-17-5")]
+    assert extraction.manifest.is_complete(files[0].path, files[0].fingerprint, files[0].json_path)
@@ -0,0 +1,180 @@
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from chemical_records import ChemicalWriter
+from load_neo4j_data import BATCH_QUERIES, LOAD_VERSION_QUERY, RETRACT_QUERIES, ROW_FORMAT, ChemicalDatabase, FileProcessor
+from manifest import GRAPH_ROWS_FOLDER, GRAPH_SYNC_FILE, STATE_FOLDER, GraphSyncState, rows_digest
+
+# The load version must change on every delta, also one that keeps node and relationship counts.
+
+
+class RecordingDriver:
+    """Stand-in for the Neo4j driver recording the queries of every write transaction"""
+    def __init__(self):
+        self.queries = []
+        self.version = 0
+
+    def session(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def execute_write(self, transaction_function, *args):
+        return transaction_function(self, *args)
+
+    def run(self, query, **params):
+        self.queries.append(query)
+        if query == LOAD_VERSION_QUERY:
+            self.version += 1
+        return self
+
+    def consume(self):
+        pass
+
+    def single(self):
+        return {"id": self.version}
+
+    def close(self):
+        pass
+
+
+def make_database():
+    database = ChemicalDatabase("bolt://localhost:7687", None)  # Connects lazily, never used
+    database._driver.close()
+    database._driver = RecordingDriver()
+    return database
+
+
+def test_delta_with_unchanged_counts_bumps_the_load_version():
+    database = make_database()
+    old = ("name_and_cas", "Chlorodifluoromethane", "75-45-6", "montreal_2020")
+    new = ("name_and_cas", "HCFC-22", "75-45-6", "montreal_2020")
+    # Same number of nodes and relationships before and after
+    assert database.apply_delta({new}, {old}, set()) == (1, 2)
+    assert database._driver.version == 1
+
+    database.apply_delta(set(), set(), {new})
+    assert database._driver.version == 1  # Nothing changed
+
+
+def test_upload_bumps_the_load_version():
+    database = make_database()
+    chemicals = [{"chemical_name": "HCFC-22", "CAS": "75-45-6", "regulation": "montreal_2020"}]
+    assert database.upload_chemicals(chemicals) == 1
+    assert database._driver.queries[-1] == LOAD_VERSION_QUERY
+    assert database._driver.version == 1
+
+
+class GraphDriver(RecordingDriver):
+    """RecordingDriver that applies the batch and retract statements to a set of relationships"""
+    def __init__(self):
+        super().__init__()
+        self.relationships = set()
+        self._lock = threading.Lock()
+        self._shapes = {query: shape for shape, query in BATCH_QUERIES.items()}
+
+    def run(self, query, **params):
+        with self._lock:
+            super().run(query, **params)
+            if query in self._shapes:
+                for row in params["rows"]:
+                    row = (self._shapes[query], row["name"] or "", row["cas"] or "", row["regulation"])
+                    self.relationships |= ChemicalDatabase.row_relationships(row)
+            for kind, retract_query in RETRACT_QUERIES.items():
+                if query == retract_query:
+                    self.relationships -= {(kind, row["source"], row["target"]) for row in params["rows"]}
+        return self
+
+
+def write_file(folder, regulation, pairs):
+    with ChemicalWriter(str(folder / (regulation + ".jsonl")), regulation) as writer:
+        writer.write({"chemical_name": name, "CAS": cas, "regulation": regulation} for name, cas in pairs)
+
+
+def sync(folder, driver, workers):
+    database = make_database()
+    database._driver = driver
+    return FileProcessor(database, workers=workers).sync_jsons(str(folder))
+
+
+def test_concurrent_sync_matches_sequential_sync(tmp_path):
+    graphs = []
+    for workers in (1, 4):
+        folder = tmp_path / f"workers_{workers}"
+        folder.mkdir()
+        driver = GraphDriver()
+        write_file(folder, "montreal_2020", [("HCFC-22", "75-45-6"), ("Halon-1211", "353-59-3")])
+        write_file(folder, "stockholm_2023", [("Aldrin", "309-00-2")])
+        write_file(folder, "rotterdam_2023", [("Aldrin", "309-00-2")])
+        assert all(result["ok"] for result in sync(folder, driver, workers))
+
+        # Re-extraction: a pair moves from one file to another, a file is deleted
+        write_file(folder, "montreal_2020", [("Halon-1211", "353-59-3")])
+        write_file(folder, "stockholm_2023", [("Aldrin", "309-00-2"), ("HCFC-22", "75-45-6")])
+        os.remove(folder / "rotterdam_2023.jsonl")
+        results = sync(folder, driver, workers)
+        assert len(results) == 3 and all(result["ok"] for result in results)
+        graphs.append(driver.relationships)
+
+    assert graphs[0] == graphs[1]
+    # Retracted by one file, written by the other
+    assert ("name_cas", "HCFC-22", "75-45-6") in graphs[1]
+    assert ("name_regulation", "HCFC-22", "montreal_2020") not in graphs[1]
+    assert ("cas_regulation", "309-00-2", "rotterdam_2023") not in graphs[1]
+
+
+class SlowFirstWrite(GraphDriver):
+    """GraphDriver whose first write transaction is slow, so later files overtake the first one"""
+    def execute_write(self, transaction_function, *args):
+        if not self.queries:
+            time.sleep(0.2)
+        return super().execute_write(transaction_function, *args)
+
+
+def test_concurrent_full_load_keeps_the_spelling_of_the_first_file(tmp_path):
+    write_file(tmp_path, "montreal_2020", [("Halon-1211", "353-59-3"), ("HCFC-22", "75-45-6")])
+    write_file(tmp_path, "stockholm_2023", [("hcfc-22", "75-45-6")])
+    database = make_database()
+    database._driver = SlowFirstWrite()
+    database.batch_size = 1  # The name of the first file's second row is only read after its first write
+
+    assert all(result["ok"] for result in FileProcessor(database, workers=2).process_jsons(str(tmp_path)))
+    assert ("name_regulation", "HCFC-22", "stockholm_2023") in database._driver.relationships
+    assert not any(relationship[1] == "hcfc-22" for relationship in database._driver.relationships)
+
+
+def test_sync_state_keeps_rows_out_of_the_state_file(tmp_path):
+    write_file(tmp_path, "montreal_2020", [("HCFC-22", "75-45-6")])
+    write_file(tmp_path, "stockholm_2023", [("Aldrin", "309-00-2")])
+    sync(tmp_path, GraphDriver(), 1)
+    state_path = tmp_path / STATE_FOLDER / GRAPH_SYNC_FILE
+    rows_folder = tmp_path / STATE_FOLDER / GRAPH_ROWS_FOLDER
+    assert not any("rows" in entry for entry in json.loads(state_path.read_text())["files"].values())
+    stockholm_rows = GraphSyncState(str(tmp_path), version=ROW_FORMAT).rows(str(tmp_path / "stockholm_2023.jsonl"))
+    before = {path.name: path.stat().st_mtime_ns for path in rows_folder.iterdir()}
+
+    # Only the rows of the changed file are written; those of the deleted file are dropped
+    write_file(tmp_path, "montreal_2020", [("Chlorodifluoromethane", "75-45-6")])
+    os.remove(tmp_path / "stockholm_2023.jsonl")
+    sync(tmp_path, GraphDriver(), 1)
+    after = {path.name: path.stat().st_mtime_ns for path in rows_folder.iterdir()}
+    assert len(after) == 1 and not set(after) & set(before)
+
+    # States with the rows inline are migrated
+    state = json.loads(state_path.read_text())
+    entry = next(iter(state["files"].values()))
+    entry["rows"] = sorted(stockholm_rows)
+    entry["digest"] = rows_digest(stockholm_rows)
+    state_path.write_text(json.dumps(state))
+    state = GraphSyncState(str(tmp_path), version=ROW_FORMAT)
+    assert state.all_rows() == stockholm_rows
+    assert "rows" not in json.loads(state_path.read_text())["files"][str(tmp_path / "montreal_2020.jsonl")]
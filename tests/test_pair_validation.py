@@ -0,0 +1,21 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pair_validation import GROUPED, INVALID_CAS, MISSING_CAS, validate_pair
+
+
+@pytest.mark.parametrize("name, cas, problem", [
+    ("Mercury compounds", "71-43-2", None),  # The extraction prompt's own example
+    ("Ethanol", "64-17-5", None),
+    ("2,4,5-T and its salts and esters", "93-76-5", GROUPED),
+    ("Mercury and its compounds", "7439-97-6", GROUPED),
+    ("Hexachlorocyclohexane, all isomers", "608-73-1", GROUPED),
+    ("Ethanol", "64-17-6", INVALID_CAS),
+    ("Ethanol", "NA", MISSING_CAS),
+])
+def test_validate_pair(name, cas, problem):
+    assert validate_pair(name, cas)[2] == problem
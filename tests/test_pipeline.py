@@ -0,0 +1,132 @@
+import os
+import re
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fitz  # PyMuPDF for PDF handling
+from neo4j.exceptions import ServiceUnavailable
+
+from chemical_records import read_chemicals
+from fake_openai_server import fake_completion
+from load_neo4j_data import ROW_FORMAT, ChemicalDatabase, FileProcessor
+from manifest import GraphSyncState
+from pdf_text import Page
+from pipeline import Pipeline
+from table_extraction import TableExtractor
+from test_load_neo4j_data import RecordingDriver
+from test_preprocess_pdfs import TablePages
+
+PAIRS = [(f"Substance {page}", cas) for page, cas in enumerate(["50-00-0", "64-17-5", "67-56-1", "71-43-2", "75-09-2", "108-88-3"])]
+
+
+class ReversedClient:
+    """Synchronous OpenAI client stand-in answering the requests of later pages first"""
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, model, messages, max_tokens):
+        content = messages[-1]["content"]
+        page = int(re.search(r"Substance (\d+)", content).group(1))
+        time.sleep((len(PAIRS) - page) * 0.05)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=fake_completion(content)))])
+
+
+def write_pdf(path):
+    document = fitz.open()
+    for name, cas in PAIRS:
+        document.new_page().insert_text((56, 90), f"{name}, {cas}: restricted", fontsize=9)
+    document.save(path)
+    document.close()
+
+
+def run_pipeline(tmp_path, **kwargs):
+    input_folder, output_folder = tmp_path / "pdf", tmp_path / "out"
+    input_folder.mkdir(exist_ok=True)
+    output_folder.mkdir(exist_ok=True)
+    if not (input_folder / "annex.pdf").exists():
+        write_pdf(str(input_folder / "annex.pdf"))
+    # A budget of one or two pages per request, so the file needs several requests
+    pipeline = Pipeline(str(output_folder), ReversedClient(), token_budget=20,
+                        workers={"llm": len(PAIRS), "parse": 2}, report_interval=60, **kwargs)
+    stats = pipeline.run([str(input_folder)])
+    return pipeline, stats, str(output_folder / "annex.jsonl")
+
+
+def test_concurrent_results_are_written_in_page_order(tmp_path):
+    _, stats, json_path = run_pipeline(tmp_path)
+    assert stats["stages"]["parse"]["errors"] == 0
+    chemicals = list(read_chemicals(json_path))
+    assert [(chemical["chemical_name"], chemical["CAS"]) for chemical in chemicals] == PAIRS
+    assert [chemical["source"] for chemical in chemicals] == [f"page {page + 1}" for page in range(len(PAIRS))]
+
+
+def test_table_pages_are_written_in_page_order(tmp_path):
+    _, _, json_path = run_pipeline(tmp_path, text_extractor=TablePages({0, 1, 4}), tables=TableExtractor())
+    assert [(chemical["chemical_name"], chemical["CAS"]) for chemical in read_chemicals(json_path)] == PAIRS
+
+
+class SlowPages:
+    """PageTextExtractor stand-in recording how many pages were extracted"""
+    def __init__(self):
+        self.extracted = 0
+
+    def extract(self, path, fingerprint=None):
+        for page, (name, cas) in enumerate(PAIRS):
+            self.extracted += 1
+            yield Page(f"page {page + 1}", f"{name}, {cas}: restricted", [])
+
+
+def test_pdf_packs_are_queried_while_later_pages_are_extracted(tmp_path):
+    pages = SlowPages()
+    seen = []
+
+    class RecordingClient(ReversedClient):
+        def create(self, model, messages, max_tokens):
+            seen.append(pages.extracted)
+            return super().create(model, messages, max_tokens)
+
+    input_folder, output_folder = tmp_path / "pdf", tmp_path / "out"
+    input_folder.mkdir()
+    output_folder.mkdir()
+    write_pdf(str(input_folder / "annex.pdf"))
+    pipeline = Pipeline(str(output_folder), RecordingClient(), token_budget=20, workers={"llm": 1, "parse": 1},
+                        queue_size=1, report_interval=60, text_extractor=pages)
+    pipeline.run([str(input_folder)])
+    assert seen and seen[0] < len(PAIRS)  # The first request went out before the last page was read
+
+
+class FailingDriver(RecordingDriver):
+    """RecordingDriver whose write transactions fail while `failing` is set"""
+    def __init__(self):
+        super().__init__()
+        self.failing = True
+
+    def execute_write(self, transaction_function, *args):
+        if self.failing:
+            raise ServiceUnavailable("Connection refused")
+        return super().execute_write(transaction_function, *args)
+
+
+def test_files_are_synced_and_only_complete_once_loaded(tmp_path):
+    database = ChemicalDatabase("bolt://localhost:7687", None)  # Connects lazily, never used
+    database._driver.close()
+    database._driver = FailingDriver()
+
+    # The graph is down: the output is written, but the file is not complete
+    pipeline, _, json_path = run_pipeline(tmp_path, database=database)
+    assert len(list(read_chemicals(json_path))) == len(PAIRS)
+    assert pipeline.manifest.files[str(tmp_path / "pdf" / "annex.pdf")]["status"] == "in_progress"
+    assert not GraphSyncState(str(tmp_path / "out"), version=ROW_FORMAT).files
+
+    # The next run processes the file again (from its checkpoint) and syncs it
+    database._driver.failing = False
+    pipeline, _, json_path = run_pipeline(tmp_path, database=database)
+    assert pipeline.manifest.files[str(tmp_path / "pdf" / "annex.pdf")]["status"] == "complete"
+    state = GraphSyncState(str(tmp_path / "out"), version=ROW_FORMAT)
+    assert {(row[1], row[2]) for row in state.rows(json_path)} == set(PAIRS)
+
+    # The loader's sync mode sees the file as already synced
+    assert FileProcessor(database).sync_jsons(str(tmp_path / "out")) == []
@@ -0,0 +1,44 @@
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import preprocess_csvs
+from chemical_records import read_chemicals
+from fake_openai_server import fake_completion
+
+ROWS = [(f"Substance {record}", cas) for record, cas in enumerate(["50-00-0", "64-17-5", "67-56-1", "71-43-2", "75-09-2", "108-88-3"])]
+
+
+class FlakyClient:
+    """Synchronous OpenAI client stand-in failing the requests that mention one of `failing`"""
+    def __init__(self, failing=()):
+        self.failing = failing
+        self.chat = SimpleNamespace(completions=self)
+
+    def create(self, model, messages, max_tokens):
+        content = messages[-1]["content"]
+        if any(name in content for name in self.failing):
+            raise ConnectionError("Connection reset")
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=fake_completion(content)))])
+
+
+def run(input_folder, output_folder, client):
+    preprocess_csvs.configure(client)
+    preprocess_csvs.process_csvs(str(input_folder), str(output_folder), chunk_size=1, token_budget=8)
+    return [(chemical["chemical_name"], chemical["CAS"]) for chemical in read_chemicals(str(output_folder / "echa.jsonl"))]
+
+
+def test_resumed_output_is_in_record_order(tmp_path):
+    input_folder = tmp_path / "csv"
+    input_folder.mkdir()
+    (input_folder / "echa.csv").write_text("".join(f"{name},{cas}\n" for name, cas in ROWS))
+
+    expected = run(input_folder, tmp_path / "clean", FlakyClient())
+    assert expected == list(ROWS)
+
+    # Requests of the first records fail, the next run only retries them
+    (tmp_path / "resumed").mkdir()
+    assert run(input_folder, tmp_path / "resumed", FlakyClient(failing=("Substance 0", "Substance 1"))) == list(ROWS[2:])
+    assert run(input_folder, tmp_path / "resumed", FlakyClient()) == expected
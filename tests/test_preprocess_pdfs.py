@@ -0,0 +1,72 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import fitz  # PyMuPDF for PDF handling
+
+import preprocess_pdfs
+from chemical_records import read_chemicals
+from fake_openai_server import fake_completion
+from pdf_text import Page
+from table_extraction import TableExtractor
+
+PAIRS = [(f"Substance {page}", cas) for page, cas in enumerate(["50-00-0", "64-17-5", "67-56-1", "71-43-2", "75-09-2", "108-88-3"])]
+
+
+class ReversedExtractor:
+    """AsyncExtractor stand-in completing the requests last to first"""
+    def run(self, texts, prompt, max_tokens, on_result):
+        for index in reversed(range(len(texts))):
+            on_result(index, fake_completion(prompt + texts[index]))
+
+
+def write_pdf(path):
+    document = fitz.open()
+    for name, cas in PAIRS:
+        document.new_page().insert_text((56, 90), f"{name}, {cas}: restricted", fontsize=9)
+    document.save(path)
+    document.close()
+
+
+def test_concurrent_results_are_written_in_page_order(tmp_path):
+    input_folder, output_folder = tmp_path / "pdf", tmp_path / "out"
+    input_folder.mkdir()
+    output_folder.mkdir()
+    write_pdf(str(input_folder / "annex.pdf"))
+
+    # A budget of about one page per request, so every page is its own request
+    preprocess_pdfs.process_pdfs(str(input_folder), str(output_folder), extractor=ReversedExtractor(), token_budget=20)
+
+    chemicals = list(read_chemicals(str(output_folder / "annex.jsonl")))
+    assert [(chemical["chemical_name"], chemical["CAS"]) for chemical in chemicals] == PAIRS
+    assert [chemical["source"] for chemical in chemicals] == [f"page {page + 1}" for page in range(len(PAIRS))]
+
+
+class TablePages:
+    """PageTextExtractor stand-in with name/CAS tables on the pages in `table_pages`"""
+    def __init__(self, table_pages):
+        self.table_pages = table_pages
+        self.page_count = len(PAIRS)
+        self.cached = False
+
+    def extract(self, path, fingerprint=None):
+        return self
+
+    def __iter__(self):
+        for page, (name, cas) in enumerate(PAIRS):
+            tables = [{"header": ["Chemical", "CAS No"], "rows": [[name, cas]]}] if page in self.table_pages else []
+            yield Page(f"page {page + 1}", f"{name}, {cas}: restricted", tables)
+
+
+def test_table_pages_are_written_in_page_order(tmp_path):
+    input_folder, output_folder = tmp_path / "pdf", tmp_path / "out"
+    input_folder.mkdir()
+    output_folder.mkdir()
+    write_pdf(str(input_folder / "annex.pdf"))
+
+    preprocess_pdfs.process_pdfs(str(input_folder), str(output_folder), extractor=ReversedExtractor(), token_budget=12,
+                                 text_extractor=TablePages({0, 1, 4}), tables=TableExtractor())
+
+    chemicals = list(read_chemicals(str(output_folder / "annex.jsonl")))
+    assert [(chemical["chemical_name"], chemical["CAS"]) for chemical in chemicals] == PAIRS
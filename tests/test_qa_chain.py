@@ -0,0 +1,89 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.fake_chat_models import FakeListChatModel
+from langchain_neo4j import GraphCypherQAChain
+
+from qa_cache import QACache
+from qa_chain import cached_cypher_generation, streaming_answer
+from qa_trace import Trace, tracing
+
+# Smoke tests of the chain app.py builds, against a stub graph and a stub LLM.
+
+CYPHER = "MATCH (c:Chemical {cas: '75-45-6'})-[:IS_REGULATED]->(r:Regulation) RETURN r.name AS regulation"
+
+
+class StubGraph:
+    """Graph store answering every query with one row"""
+    def __init__(self):
+        self.queries = []
+
+    @property
+    def get_schema(self):
+        return "Node properties: Chemical {cas: STRING}, Regulation {name: STRING}"
+
+    @property
+    def get_structured_schema(self):
+        return {}
+
+    def query(self, query, params={}):
+        self.queries.append(query)
+        return [{"regulation": "montreal_2020"}]
+
+    def refresh_schema(self):
+        pass
+
+    def add_graph_documents(self, graph_documents, include_source=False):
+        pass
+
+
+class LLMStarts(BaseCallbackHandler):
+    def __init__(self):
+        self.count = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.count += 1
+
+
+def build_chain(responses, qa_cache):
+    # Same wiring as app.build_chain
+    chain = GraphCypherQAChain.from_llm(
+        FakeListChatModel(responses=responses), graph=StubGraph(), top_k=10, allow_dangerous_requests=True,
+        exclude_types=["LoadVersion"]
+    )
+    chain.cypher_generation_chain = cached_cypher_generation(chain.cypher_generation_chain, qa_cache)
+    chain.qa_chain = streaming_answer(chain.qa_chain)
+    return chain
+
+
+def test_cypher_generation_is_cached_and_sees_chain_callbacks():
+    qa_cache = QACache()
+    chain = build_chain([CYPHER, "Montreal Protocol.", "Montreal Protocol, again."], qa_cache)
+    handler = LLMStarts()
+    with tracing(Trace("Which regulations cover HCFC-22?")) as trace:
+        result = chain.invoke({"query": "Which regulations cover HCFC-22?"}, config={"callbacks": [handler]})
+    assert result["result"] == "Montreal Protocol."
+    assert chain.graph.queries == [CYPHER]
+    assert handler.count == 2  # Cypher generation and answer both reach the chain's callbacks
+    assert [item["stage"] for item in trace.spans] == ["cypher_generation", "answer_generation"]
+
+    # The repeated question takes its Cypher from the cache: only the answer calls the LLM
+    handler = LLMStarts()
+    result = chain.invoke({"query": "which regulations cover hcfc-22"}, config={"callbacks": [handler]})
+    assert result["result"] == "Montreal Protocol, again."
+    assert handler.count == 1
+
+
+def test_answer_is_streamed_to_the_current_trace():
+    chain = build_chain([CYPHER, "Montreal Protocol."], QACache())
+    tokens = []
+    with tracing(Trace("Which regulations cover HCFC-22?", on_token=tokens.append)) as trace:
+        result = chain.invoke({"query": "Which regulations cover HCFC-22?"})
+    assert result["result"] == "Montreal Protocol."
+    assert len(tokens) > 1 and "".join(tokens) == "Montreal Protocol."
+    answer_span = trace.spans[-1]
+    assert answer_span["stage"] == "answer_generation" and answer_span["chunks"] == len(tokens)
+    assert answer_span["first_token"] is not None
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from question_templates import TemplateMatcher
+
+MATCHER = TemplateMatcher(["stockholm_2023", "montreal_2020", "rotterdam_2023", "apple"])
+
+
+@pytest.mark.parametrize("question, intent, entity", [
+    ("Which chemicals are regulated by the Stockholm Convention?", "chemicals_by_regulation", "stockholm_2023"),
+    ("What are the chemicals listed in montreal_2020?", "chemicals_by_regulation", "montreal_2020"),
+    ("List all substances in the Rotterdam Convention", "chemicals_by_regulation", "rotterdam_2023"),
+    ("Which regulations cover CAS 75-45-6?", "regulations_by_cas", "75-45-6"),
+    ("What names does CAS 50-00-0 have?", "names_by_cas", "50-00-0"),
+])
+def test_lookups_are_answered_from_templates(question, intent, entity):
+    match = MATCHER.match(question)
+    assert (match.intent, match.entity) == (intent, entity)
+
+
+@pytest.mark.parametrize("question", [
+    # Counting
+    "How many chemicals are regulated by Apple?",
+    "What is the number of substances in the Stockholm Convention?",
+    # Negation
+    "Which chemicals are not in the Stockholm Convention?",
+    "Which regulations don't cover CAS 75-45-6?",
+    # Comparison
+    "Which chemicals are in both the Stockholm and Rotterdam conventions?",
+    "Which chemicals are regulated by montreal_2020 but not by the Stockholm Convention?",
+    "Which regulations cover more chemicals than CAS 75-45-6?",
+    # No list intent
+    "What are the health effects of chemicals in Apple products?",
+    "Are chemicals of the Stockholm Convention toxic?",
+])
+def test_other_questions_go_to_the_llm_chain(question):
+    assert MATCHER.match(question) is None
@@ -0,0 +1,37 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from pair_validation import GARBLED, GROUPED
+from pdf_text import Page
+from table_extraction import TableExtractor, is_garbled
+
+# Rows as PyMuPDF extracts them from the annex tables of CELEX_32012R0649
+ROWS = [
+    ["Aldrin (*)", "309-00-2", "206-215-8"],
+    ["Asbestos Fibres (+ ): Crocidolite (#) Amosite (#)", "12001-28-4\n12172-73-5", "—"],
+    ["Nonylphenols C 6H (OH)C H 4 9 1 9", "25154-52-3", "246-672-0"],
+]
+
+
+def page_of(rows):
+    text = "\n".join(cell for row in rows for cell in row)
+    return Page("page 1", text, [{"header": ["Chemical", "CAS No", "EC No"], "rows": rows}])
+
+
+def test_rows_with_several_cas_numbers_and_garbled_names_are_repaired():
+    chemicals = TableExtractor().page_chemicals(page_of(ROWS), "rotterdam")
+    pairs = {(chemical["chemical_name"], chemical["CAS"]): chemical.get("repair") for chemical in chemicals}
+    assert pairs == {
+        ("Aldrin", "309-00-2"): None,
+        ("Asbestos Fibres (+ ): Crocidolite (#) Amosite", "12001-28-4"): GROUPED,
+        ("Asbestos Fibres (+ ): Crocidolite (#) Amosite", "12172-73-5"): GROUPED,
+        ("Nonylphenols C 6H (OH)C H 4 9 1 9", "25154-52-3"): GARBLED,
+    }
+
+
+def test_is_garbled():
+    assert is_garbled("Tetrabromodiphenyl ether C H Br O 12 6 4")
+    assert not is_garbled("2,4,5-T and its salts and esters")
+    assert not is_garbled("CHF2Cl (HCFC-22)")